@@ -0,0 +1,237 @@
+# SPDX-FileCopyrightText: 2023-present David C Wang <dcwangmit01@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+
+"""
+Schwab Downloader Benchmark
+
+Runs the downloader end to end against the local stand-in site (see standin.py), in a scratch directory,
+and reports rows/sec, downloads/sec, the time spent per phase and the peak RSS of the browser processes.
+Arguments after "--" are passed to the downloader, to compare engines and options.
+
+Usage:
+  bench.py [options] [--] [<downloader-args>...]
+  bench.py (-h | --help)
+
+Options:
+  --latency=<seconds>           Delay of every page and API response  [default: 0.05].
+  --document-latency=<seconds>  Delay of every PDF download  [default: 0.2].
+  --transactions=<n>            History transactions per account  [default: 300].
+  --statements=<n>              Statements and tax forms per account  [default: 60].
+  --document-size=<bytes>       Size of every PDF  [default: 100000].
+  --json=<file>                 Also write the results to this JSON file.
+  --headed                      Show the browser.
+  --keep                        Keep the scratch directory with the downloads.
+  -h --help                     Show this screen.
+
+Examples:
+  bench.py
+  bench.py --json=baseline.json
+  bench.py -- --workers=3
+  bench.py --latency=0.2 -- --async --limits=navigation=3,download=6
+"""
+
+import asyncio
+import functools
+import inspect
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+from docopt import docopt
+from standin import StandInData, StandInSite
+
+
+class Metrics:
+    """Counters and timings collected from the instrumented downloader, from any thread or task."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.rows = 0
+        self.downloads = 0
+        self.seconds = defaultdict(float)
+
+    def instrument(self, cls, name, record):
+        """Wrap the method cls.name, sync or async, calling record(args, kwargs, result, seconds) after each call."""
+        method = getattr(cls, name)
+
+        def done(args, kwargs, result, start):
+            with self.lock:
+                record(args, kwargs, result, time.perf_counter() - start)
+
+        if inspect.iscoroutinefunction(method):
+
+            @functools.wraps(method)
+            async def wrapper(*args, **kwargs):
+                start, result = time.perf_counter(), None
+                try:
+                    result = await method(*args, **kwargs)
+                    return result
+                finally:
+                    done(args, kwargs, result, start)
+
+        else:
+
+            @functools.wraps(method)
+            def wrapper(*args, **kwargs):
+                start, result = time.perf_counter(), None
+                try:
+                    result = method(*args, **kwargs)
+                    return result
+                finally:
+                    done(args, kwargs, result, start)
+
+        setattr(cls, name, wrapper)
+
+    def instrument_engine(self, engine, base):
+        def add_rows(args, kwargs, result, seconds):
+            self.rows += len(result or [])
+
+        def add_download(args, kwargs, result, seconds):
+            self.downloads += 1
+
+        def add_time(key):
+            def record(args, kwargs, result, seconds):
+                self.seconds[key(args, kwargs)] += seconds
+
+            return record
+
+        self.instrument(engine, 'login', add_time(lambda args, kwargs: 'login'))
+        self.instrument(engine, 'load_accounts', add_time(lambda args, kwargs: 'accounts'))
+        self.instrument(engine, 'process_page', add_time(lambda args, kwargs: kwargs.get('phase', args[-1])))
+        self.instrument(engine, 'extract_table_rows', add_rows)
+        self.instrument(base, 'record_saved', add_download)
+
+
+class RssSampler:
+    """Samples the summed RSS of this process's Chromium descendants and keeps the peak."""
+
+    def __init__(self, interval=0.25):
+        self.interval = interval
+        self.peak = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True, name='rss')
+
+    def sample(self):
+        output = subprocess.run(['ps', '-A', '-o', 'pid=,ppid=,rss=,comm='], capture_output=True, text=True).stdout
+        children, processes = defaultdict(list), {}
+        for line in output.splitlines():
+            fields = line.split(None, 3)
+            if len(fields) == 4 and fields[2].isdigit():
+                pid, ppid, rss, command = int(fields[0]), int(fields[1]), int(fields[2]), fields[3]
+                children[ppid].append(pid)
+                processes[pid] = (rss, command)
+        total, stack = 0, list(children[os.getpid()])
+        while stack:
+            pid = stack.pop()
+            rss, command = processes[pid]
+            if 'chrom' in command.lower() or 'headless_shell' in command:
+                total += rss * 1024
+            stack.extend(children[pid])
+        return total
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.peak = max(self.peak, self.sample())
+            except Exception:
+                pass
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+
+def run_downloader(args):
+    from schwab_downloader.cli import SchwabDownloader
+
+    if args['--async']:
+        from schwab_downloader.async_engine import AsyncSchwabDownloader
+
+        asyncio.run(AsyncSchwabDownloader(args).run())
+        return
+
+    from playwright.sync_api import sync_playwright
+
+    with sync_playwright() as playwright:
+        SchwabDownloader(playwright, args).run()
+
+
+def report(results):
+    elapsed = results['elapsed']
+    print("\nBenchmark results")
+    print(f"  {'elapsed':<20} {elapsed:8.1f} s")
+    print(f"  {'rows read':<20} {results['rows']:8d}   {results['rows'] / elapsed:8.1f} rows/s")
+    print(f"  {'documents saved':<20} {results['downloads']:8d}   {results['downloads'] / elapsed:8.1f} downloads/s")
+    for step, seconds in results['seconds'].items():
+        print(f"  {step:<20} {seconds:8.1f} s")
+    print(f"  {'peak browser RSS':<20} {results['peak_rss'] / 1_000_000:8.1f} MB")
+    print("  Phase times are summed over workers and pages; RSS is summed over the Chromium processes.")
+
+
+def main():
+    args = docopt(__doc__)
+    data = StandInData(int(args['--transactions']), int(args['--statements']))
+    site = StandInSite(
+        latency=float(args['--latency']),
+        document_latency=float(args['--document-latency']),
+        document_size=int(args['--document-size']),
+        data=data,
+    ).start()
+    json_file = os.path.abspath(args['--json']) if args['--json'] else None
+
+    # The downloader saves into ./downloads of the working directory it is imported from
+    cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix='schwab-bench-')
+    os.chdir(workdir)
+    from schwab_downloader import cli
+    from schwab_downloader.async_engine import AsyncSchwabDownloader
+
+    argv = [f'--base-url={site.url}', '--id=bench', '--password=bench', '--no-session']
+    if not args['--headed']:
+        argv.append('--headless')
+    downloader_args = docopt(cli.__doc__, argv=argv + args['<downloader-args>'])
+
+    metrics = Metrics()
+    engine = AsyncSchwabDownloader if downloader_args['--async'] else cli.SchwabDownloader
+    metrics.instrument_engine(engine, cli.SchwabDownloader)
+    sampler = RssSampler()
+    sampler.start()
+    start = time.perf_counter()
+    try:
+        run_downloader(downloader_args)
+    finally:
+        elapsed = time.perf_counter() - start
+        sampler.stop()
+        site.stop()
+        os.chdir(cwd)
+
+    results = {
+        'args': args['<downloader-args>'],
+        'elapsed': elapsed,
+        'rows': metrics.rows,
+        'downloads': metrics.downloads,
+        'seconds': dict(metrics.seconds),
+        'peak_rss': sampler.peak,
+    }
+    report(results)
+    if json_file:
+        with open(json_file, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args['--keep']:
+        print(f"Downloads kept in {workdir}/downloads")
+    else:
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
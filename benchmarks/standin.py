@@ -0,0 +1,284 @@
+# SPDX-FileCopyrightText: 2023-present David C Wang <dcwangmit01@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+
+"""
+Schwab Stand-in Site
+
+A local, offline stand-in for the parts of schwab.com the downloader depends on: the login iframe, the
+accounts summary with its "More account details" dialogs, the history and statements searches with their
+paged tables, the transaction details modals and the statement PDFs.  The data is generated, not real.
+
+Usage:
+  standin.py [--port=<port>] [--latency=<seconds>] [--document-latency=<seconds>]
+    [--transactions=<n>] [--statements=<n>] [--document-size=<bytes>] [--seed=<n>]
+  standin.py (-h | --help)
+
+Options:
+  --port=<port>                 Port to listen on, 0 for any free port  [default: 8765].
+  --latency=<seconds>           Delay of every page and API response  [default: 0.05].
+  --document-latency=<seconds>  Delay of every PDF download  [default: 0.2].
+  --transactions=<n>            History transactions per account  [default: 300].
+  --statements=<n>              Statements and tax forms per account  [default: 60].
+  --document-size=<bytes>       Size of every PDF  [default: 100000].
+  --seed=<n>                    Seed of the generated data  [default: 1].
+  -h --help                     Show this screen.
+
+Examples:
+  standin.py --latency=0.2 --transactions=1000
+  schwab-downloader --base-url=http://127.0.0.1:8765 --id=demo --password=demo --no-session
+"""
+
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+from docopt import docopt
+
+STATIC_DIR = Path(__file__).parent / "static"
+
+SUMMARY_PATH = '/clientapps/accounts/summary/'
+
+ACCOUNTS = [
+    {'name': 'Individual Brokerage', 'number': '1234-5678', 'type': 'Brokerage', 'kind': 'brokerage'},
+    {'name': 'Roth Contributory IRA', 'number': '8765-4321', 'type': 'IRA', 'kind': 'brokerage'},
+    {'name': 'Household Checking', 'number': '440012345678 Schwab Bank', 'type': 'Checking', 'kind': 'bank'},
+]
+
+SECURITIES = ['VANGUARD TOTAL STOCK MARKET ETF', 'ISHARES CORE S&P 500 ETF', 'SCHWAB US DIVIDEND EQUITY ETF']
+PAYEES = ['PAYROLL ACME CORP', 'CITY UTILITIES', 'ATM WITHDRAWAL', 'TRANSFER TO BROKERAGE']
+
+PRESET_YEARS = {'Previous 4 Years': 4, 'Last 10 Years': 10}
+
+
+def make_pdf(title, size):
+    """A minimal valid one page PDF showing title, padded with a comment to about size bytes."""
+    title = title.replace('\\', '').replace('(', '').replace(')', '')
+    content = f"BT /F1 14 Tf 72 720 Td ({title}) Tj ET".encode()
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R"
+        b" /Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    pdf = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, 1):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n%s\nendobj\n" % (number, obj)
+    while len(pdf) < size - 200:
+        pdf += b"%" + b"0" * min(1000, size - 200 - len(pdf)) + b"\n"
+    xref = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    pdf += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(pdf)
+
+
+class StandInData:
+    """Generated accounts, transactions and documents, the same for the same seed."""
+
+    def __init__(self, transactions=300, statements=60, seed=1, today=None):
+        self.today = today or datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        self.accounts = ACCOUNTS
+        self.transactions = {}
+        self.documents = {}
+        self.documents_by_id = {}
+        for account in self.accounts:
+            rng = random.Random(f"{seed}:{account['number']}")
+            self.transactions[account['name']] = self.generate_transactions(rng, account, transactions)
+            self.documents[account['name']] = self.generate_documents(account, statements)
+            for document in self.documents[account['name']]:
+                self.documents_by_id[document['id']] = document
+
+    def generate_transactions(self, rng, account, count):
+        transactions = []
+        date = self.today
+        for number in range(count):
+            date -= timedelta(days=rng.randint(0, 4))
+            cents = rng.randint(100, 500000) / 100
+            if account['kind'] == 'bank':
+                kind = rng.choice(['Deposit', 'Withdrawal', 'Check'])
+                transactions.append(
+                    {
+                        'transactionDate': date.strftime('%Y-%m-%dT00:00:00'),
+                        'type': kind,
+                        'checkNumber': str(1000 + number) if kind == 'Check' else None,
+                        'description': 'CHECK PAID' if kind == 'Check' else rng.choice(PAYEES),
+                        'withdrawal': None if kind == 'Deposit' else cents,
+                        'deposit': cents if kind == 'Deposit' else None,
+                    }
+                )
+            else:
+                action = rng.choice(['Buy', 'Sell', 'Qualified Dividend', 'Reinvest Shares'])
+                quantity = rng.randint(1, 200) if action in ('Buy', 'Sell', 'Reinvest Shares') else None
+                transactions.append(
+                    {
+                        'transactionDate': date.strftime('%Y-%m-%dT00:00:00'),
+                        'action': action,
+                        'description': rng.choice(SECURITIES),
+                        'quantity': quantity,
+                        'price': round(cents / quantity, 2) if quantity else None,
+                        'fees': None,
+                        'amount': -cents if action in ('Buy', 'Reinvest Shares') else cents,
+                    }
+                )
+        return transactions
+
+    def generate_documents(self, account, count):
+        documents = []
+        month = self.today.replace(day=1)
+        for number in range(count):
+            month = (month - timedelta(days=1)).replace(day=1)
+            if month.month == 2 and account['kind'] == 'brokerage':
+                category, kind, name = 'Tax Forms', 'Tax Form', f"1099 Composite {month.year - 1}"
+            else:
+                category, kind, name = 'Statements', 'Statement', f"{account['type']} Statement"
+            documents.append(
+                {
+                    'id': f"{account['number'][:9].replace('-', '')}-{number}",
+                    'date': (month + timedelta(days=14)).strftime('%Y-%m-%dT00:00:00'),
+                    'category': category,
+                    'type': kind,
+                    'account': '...' + account['number'][:9][-4:],
+                    'name': name,
+                }
+            )
+        return documents
+
+    def in_range(self, records, date_key, query):
+        """Filter records the way the site's date range select does."""
+        preset = query.get('range', 'All')
+        if preset == 'custom':
+            start = datetime.strptime(query['from'], '%m/%d/%Y')
+            end = datetime.strptime(query['to'], '%m/%d/%Y')
+        elif preset in PRESET_YEARS:
+            start, end = self.today - timedelta(days=365 * PRESET_YEARS[preset]), self.today
+        else:
+            return records
+        return [record for record in records if start <= datetime.fromisoformat(record[date_key]) <= end]
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send(self, status, body=b'', content_type='text/html; charset=utf-8', headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, data):
+        self.send(200, json.dumps(data).encode(), 'application/json')
+
+    def client_page(self, page):
+        html = (STATIC_DIR / 'client.html').read_text().replace('{{page}}', page)
+        self.send(200, html.encode())
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        time.sleep(self.server.latency)
+        if urlparse(self.path).path == '/login':
+            self.send(303, headers={'Location': SUMMARY_PATH, 'Set-Cookie': 'standin-session=1; Path=/'})
+        else:
+            self.send(404)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        path, query = url.path, {key: values[0] for key, values in parse_qs(url.query).items()}
+        data = self.server.data
+
+        if path.startswith('/documents/'):
+            time.sleep(self.server.document_latency)
+            document = data.documents_by_id.get(path.rsplit('/', 1)[-1].removesuffix('.pdf'))
+            if not document:
+                return self.send(404)
+            pdf = make_pdf(f"{document['name']} {document['date'][:10]}", self.server.document_size)
+            disposition = f'attachment; filename="{document["id"]}.pdf"'
+            return self.send(200, pdf, 'application/pdf', {'Content-Disposition': disposition})
+
+        time.sleep(self.server.latency)
+        if path == '/':
+            self.send(200, (STATIC_DIR / 'login.html').read_bytes())
+        elif path == '/login-frame':
+            self.send(200, (STATIC_DIR / 'frame.html').read_bytes())
+        elif path.startswith('/static/') and (STATIC_DIR / path.removeprefix('/static/')).is_file():
+            content_type = 'text/css' if path.endswith('.css') else 'text/javascript'
+            self.send(200, (STATIC_DIR / path.removeprefix('/static/')).read_bytes(), content_type)
+        elif path == SUMMARY_PATH:
+            self.client_page('summary')
+        elif path.lower() == '/app/accounts/history/':
+            self.client_page('history')
+        elif path.lower() == '/app/accounts/statements/':
+            self.client_page('statements')
+        elif path == '/api/accounts':
+            self.send_json({'accounts': [dict(account, companies=None) for account in data.accounts]})
+        elif path == '/api/history/transactions':
+            records = data.transactions.get(query.get('account'), [])
+            self.send_json({'transactions': data.in_range(records, 'transactionDate', query)})
+        elif path == '/api/statements/documents':
+            types = query.get('types', '').split(',')
+            records = [doc for doc in data.documents.get(query.get('account'), []) if doc['category'] in types]
+            self.send_json({'documents': data.in_range(records, 'date', query)})
+        else:
+            self.send(404, b'Not found')
+
+
+class StandInSite:
+    """Serves the stand-in site from a background thread."""
+
+    def __init__(self, port=0, latency=0.05, document_latency=0.2, document_size=100_000, data=None):
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), StandInHandler)
+        self.server.daemon_threads = True
+        self.server.latency = latency
+        self.server.document_latency = document_latency
+        self.server.document_size = document_size
+        self.server.data = data or StandInData()
+        self.thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True, name='standin')
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    args = docopt(__doc__)
+    data = StandInData(int(args['--transactions']), int(args['--statements']), int(args['--seed']))
+    site = StandInSite(
+        int(args['--port']),
+        float(args['--latency']),
+        float(args['--document-latency']),
+        int(args['--document-size']),
+        data,
+    )
+    print(f"Serving the stand-in site at {site.url}")
+    try:
+        site.server.serve_forever()
+    except KeyboardInterrupt:
+        site.stop()
+
+
+if __name__ == '__main__':
+    main()
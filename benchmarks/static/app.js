@@ -0,0 +1,223 @@
+// Client side of the stand-in site: the accounts summary, and the history and statements searches.
+
+const app = document.getElementById('app');
+
+const element = html => {
+    const template = document.createElement('template');
+    template.innerHTML = html.trim();
+    return template.content.firstElementChild;
+};
+const escape = value => String(value ?? '').replace(/[&<>"]/g, c => ({'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;'})[c]);
+const usDate = iso => { const [y, m, d] = iso.slice(0, 10).split('-'); return `${m}/${d}/${y}`; };
+const money = value => value == null ? '' :
+    (value < 0 ? '-' : '') + '$' + Math.abs(value).toLocaleString('en-US', {minimumFractionDigits: 2, maximumFractionDigits: 2});
+const getJSON = url => fetch(url).then(response => response.json());
+
+document.addEventListener('keydown', event => {
+    if (event.key === 'Escape') document.querySelectorAll('.modal').forEach(modal => modal.remove());
+});
+
+function showModal(html) {
+    document.querySelectorAll('.modal').forEach(modal => modal.remove());
+    document.body.append(element(`<div class="modal" role="dialog">${html}</div>`));
+}
+
+// Accounts summary
+
+async function summary() {
+    const {accounts} = await getJSON('/api/accounts');
+    app.append(element('<h1>Accounts</h1>'));
+    for (const account of accounts) {
+        const row = element(`<div class="account"><span>${escape(account.name)}</span>
+            <button aria-label="More account details overlay for ${escape(account.name)}">More</button></div>`);
+        row.querySelector('button').onclick = () => setTimeout(() => showDetails(account), 50);
+        app.append(row);
+    }
+}
+
+function showDetails(account) {
+    const items = [['Name', account.name], ['Account Number', account.number], ['Type', account.type]];
+    if (account.companies) items.push(['Companies', account.companies]);
+    showModal(`<div class="modal-content" id="accountdetailsoverlay-modal-body">${items.map(([label, value]) =>
+        `<sdps-list-label-value-item><span>${escape(label)}</span><div slot="value">${escape(value)}</div></sdps-list-label-value-item>`
+    ).join('')}</div>`);
+}
+
+// Searches
+
+function accountSelector(accounts, state) {
+    const selector = element(`<div class="sdps-account-selector" tabindex="0">
+        <span class="current">${escape(state.account)}</span><div class="menu" hidden></div></div>`);
+    const menu = selector.querySelector('.menu');
+    for (const account of accounts) {
+        const link = element(`<a href="javascript:void(0)"><span>${escape(account.name)}</span></a>`);
+        link.onclick = event => {
+            event.stopPropagation();
+            menu.hidden = true;
+            state.account = account.name;
+            selector.querySelector('.current').textContent = account.name;
+        };
+        menu.append(link);
+    }
+    selector.onclick = () => { menu.hidden = !menu.hidden; };
+    return selector;
+}
+
+function searchForm(accounts, state, docTypes, search) {
+    const form = element(`<div class="search-form">
+        <select id="date-range-select-id">
+            <option>All</option><option>Previous 4 Years</option><option>Last 10 Years</option>
+            <option value="custom">Custom</option>
+        </select>
+        <span class="custom-range" hidden>
+            <input id="fromDate" aria-label="From date" placeholder="MM/DD/YYYY">
+            <input id="toDate" aria-label="To date" placeholder="MM/DD/YYYY">
+        </span>
+        <span class="doc-types"></span>
+        <button class="search">Search</button>
+    </div>`);
+    form.prepend(accountSelector(accounts, state));
+    const range = form.querySelector('#date-range-select-id');
+    range.onchange = () => { form.querySelector('.custom-range').hidden = range.value !== 'custom'; };
+    for (const [type, pressed] of docTypes) {
+        const toggle = element(`<button aria-pressed="${pressed}">${escape(type)}</button>`);
+        toggle.onclick = () => setTimeout(() => {
+            toggle.setAttribute('aria-pressed', String(toggle.getAttribute('aria-pressed') !== 'true'));
+        }, 20);
+        form.querySelector('.doc-types').append(toggle);
+    }
+    form.querySelector('.search').onclick = () => {
+        const query = new URLSearchParams({account: state.account, range: range.value});
+        if (range.value === 'custom') {
+            query.set('from', form.querySelector('#fromDate').value);
+            query.set('to', form.querySelector('#toDate').value);
+        }
+        const types = Array.from(form.querySelectorAll('.doc-types button'))
+            .filter(toggle => toggle.getAttribute('aria-pressed') === 'true').map(toggle => toggle.textContent);
+        query.set('types', types.join(','));
+        search(query);
+    };
+    return form;
+}
+
+function resultsTable(headings, renderRow, noResults) {
+    const results = element(`<div class="results">
+        <label>Results per page <select aria-label="Results per page">
+            <option>25</option><option>50</option><option>100</option>
+        </select></label>
+        <table><thead><tr>${headings.map(heading => `<th>${heading}</th>`).join('')}</tr></thead><tbody></tbody></table>
+        <p class="no-results" data-testid="no-results" hidden>${noResults}</p>
+        <nav aria-label="pagination"></nav>
+    </div>`);
+    const table = {records: [], page: 1, size: 25};
+    const pageSize = results.querySelector('select');
+    pageSize.onchange = () => { table.size = parseInt(pageSize.value, 10); table.page = 1; render(); };
+
+    function pageLink(label, page, attributes = '') {
+        const link = element(`<a href="javascript:void(0)" ${attributes}>${label}</a>`);
+        link.onclick = () => { table.page = page; setTimeout(render, 30); };
+        return link;
+    }
+
+    function render() {
+        const pages = Math.max(1, Math.ceil(table.records.length / table.size));
+        const rows = table.records.slice((table.page - 1) * table.size, table.page * table.size);
+        const tbody = results.querySelector('tbody');
+        tbody.replaceChildren(...rows.map(renderRow));
+        results.querySelector('.no-results').hidden = table.records.length > 0;
+
+        // Previous, the first and last pages, two pages either side of the current one, and Next
+        const pager = results.querySelector('nav[aria-label="pagination"]');
+        pager.replaceChildren();
+        const previous = pageLink('Previous', table.page - 1, 'aria-label="Previous"');
+        previous.hidden = table.page === 1;
+        pager.append(previous);
+        const numbers = new Set([1, pages]);
+        for (let page = table.page - 2; page <= table.page + 2; page++) if (page >= 1 && page <= pages) numbers.add(page);
+        for (const page of Array.from(numbers).sort((a, b) => a - b)) {
+            pager.append(pageLink(String(page), page, page === table.page ? 'aria-current="page"' : ''));
+        }
+        const next = pageLink('Next', table.page + 1, 'aria-label="Next"');
+        next.hidden = table.page === pages;
+        pager.append(next);
+    }
+
+    results.show = records => { table.records = records; table.page = 1; render(); };
+    results.clear = () => { results.querySelector('tbody').replaceChildren(); };
+    return results;
+}
+
+function detailsButton(text, details) {
+    const button = element(`<button class="details">${escape(text)}</button>`);
+    button.onclick = () => setTimeout(() => showModal(`<div class="modal-content">
+        <h2>Transaction Details</h2>
+        <dl>${Object.entries(details).map(([key, value]) => `<dt>${escape(key)}</dt><dd>${escape(value)}</dd>`).join('')}</dl>
+        <button id="print-icon-button">Print</button>
+    </div>`), 50);
+    return button;
+}
+
+function historyRow(record) {
+    const row = document.createElement('tr');
+    const cell = content => {
+        const td = document.createElement('td');
+        content instanceof Node ? td.append(content) : td.textContent = content;
+        row.append(td);
+    };
+    cell(usDate(record.transactionDate));
+    if ('checkNumber' in record) {
+        cell(record.type);
+        cell(record.checkNumber ?? '');
+        cell(detailsButton(record.description, record));
+        cell(money(record.withdrawal));
+        cell(money(record.deposit));
+        cell('');
+    } else {
+        cell(record.action);
+        cell(detailsButton(record.description, record));
+        cell(record.quantity ?? '');
+        cell(money(record.price));
+        cell(money(record.fees));
+        cell(money(record.amount));
+    }
+    return row;
+}
+
+function statementsRow(record) {
+    const row = element(`<table><tr>
+        <td>${usDate(record.date)}</td><td>${escape(record.type)}</td><td>${escape(record.account)}</td>
+        <td>${escape(record.name)}</td><td><button data-url="/documents/${record.id}.pdf">PDF</button></td>
+    </tr></table>`).querySelector('tr');
+    row.querySelector('button').onclick = event => {
+        const link = document.createElement('a');
+        link.href = event.target.dataset.url;
+        link.download = `${record.id}.pdf`;
+        link.click();
+    };
+    return row;
+}
+
+async function searchPage(title, api, key, headings, renderRow, docTypes) {
+    const {accounts} = await getJSON('/api/accounts');
+    const state = {account: accounts[0].name};
+    const results = resultsTable(headings, renderRow, `No ${title} Found`);
+    const search = async query => {
+        results.clear();
+        const data = await getJSON(`${api}?${query}`);
+        results.show(data[key]);
+    };
+    app.append(element(`<h1>${title}</h1>`), searchForm(accounts, state, docTypes, search), results);
+}
+
+const pages = {
+    summary,
+    history: () => searchPage(
+        'Transactions', '/api/history/transactions', 'transactions',
+        ['Date', 'Action', 'Description', 'Quantity', 'Price', 'Fees', 'Amount'], historyRow, []),
+    statements: () => searchPage(
+        'Documents', '/api/statements/documents', 'documents',
+        ['Date', 'Type', 'Account', 'Document', ''], statementsRow,
+        [['Statements', 'true'], ['Tax Forms', 'false'], ['Letters', 'false']]),
+};
+
+pages[document.body.dataset.page]();
@@ -0,0 +1,843 @@
+# SPDX-FileCopyrightText: 2023-present David C Wang <dcwangmit01@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+
+"""Asyncio engine built on playwright.async_api.
+
+Runs the same flow as the sync SchwabDownloader, but navigation, table extraction, downloads and PDF
+renders run as tasks under a concurrency limit per kind of work, so e.g. a download can finish saving
+while the next page of the table loads and several accounts are worked on at once.
+"""
+
+import asyncio
+import json
+import os
+from collections import defaultdict
+
+from playwright.async_api import async_playwright
+from playwright_stealth import Stealth
+
+from schwab_downloader.cli import (
+    ACCOUNT_DETAILS_JS,
+    CUSTOM_RANGE_JS,
+    DETAIL_LABELS,
+    DETAIL_VALUE_XPATH,
+    DETAILS_BODY_SELECTOR,
+    FROM_DATE_SELECTOR,
+    GO_TO_PAGE_JS,
+    MORE_BUTTON_SELECTOR,
+    MORE_BUTTON_XPATH,
+    PAGE_NUMBERS_JS,
+    PAGE_SIZE_SELECTOR,
+    PAGE_SIZES_JS,
+    PAGER_SELECTOR,
+    PRINT_LINK_SELECTOR,
+    SEARCH_BUTTON_XPATH,
+    SECONDARY_NAV_SELECTOR,
+    TABLE_ROWS_JS,
+    TO_DATE_SELECTOR,
+    SchwabDownloader,
+)
+from schwab_downloader.fetch import session_headers, stream_document
+from schwab_downloader.filters import WorkFilter
+from schwab_downloader.history_api import is_history_response
+from schwab_downloader.memory import RecycleNeeded
+from schwab_downloader.paging import largest_page_size, restore_steps, seek_steps
+from schwab_downloader.pipeline import with_retries_async
+from schwab_downloader.profiles import load_profiles, profile_args
+from schwab_downloader.render import PDF_OPTIONS, SNAPSHOT_JS, check_denied, denied_listener, snapshot_document
+from schwab_downloader.rows import table_row_floor
+from schwab_downloader.waits import TABLE_CHANGED_JS, AsyncWaiter
+
+DEFAULT_LIMITS = {
+    'navigation': 2,  # Pages working through accounts at the same time
+    'extract': 2,  # In-page table extractions
+    'download': 4,  # Downloads being saved to disk
+    'render': 1,  # page.pdf() renders, which are CPU heavy
+}
+
+
+class Scheduler:
+    """Runs coroutines as tasks, bounded by a concurrency limit per kind of work.
+
+    Work handed off with submit() is also bounded by a backlog per kind: once that many tasks of a kind are
+    waiting for a slot, submitting more waits, so a fast producer can't pile up downloads or snapshots.
+    """
+
+    def __init__(self, limits=None, backlog=8):
+        self.limits = dict(DEFAULT_LIMITS, **(limits or {}))
+        self.semaphores = {kind: asyncio.Semaphore(limit) for kind, limit in self.limits.items()}
+        self.backlogs = {kind: asyncio.Semaphore(limit + backlog) for kind, limit in self.limits.items()}
+        self.tasks = set()
+        self.errors = []
+
+    @staticmethod
+    def parse_limits(spec):
+        """Parse "navigation=3,download=6" into {kind: limit}."""
+        limits = {}
+        for part in (spec or "").split(","):
+            if "=" not in part:
+                continue
+            kind, limit = part.split("=", 1)
+            kind = kind.strip()
+            if kind not in DEFAULT_LIMITS:
+                raise ValueError(f"Unknown kind of work in --limits: {kind}")
+            limits[kind] = max(1, int(limit))
+        return limits
+
+    async def run(self, kind, coro):
+        """Await a coroutine once a slot of its kind is free."""
+        async with self.semaphores[kind]:
+            return await coro
+
+    def spawn(self, kind, coro):
+        """Run a coroutine in the background under its kind's limit."""
+        task = asyncio.create_task(self.run(kind, coro))
+        self.tasks.add(task)
+        task.add_done_callback(self._done)
+        return task
+
+    async def submit(self, kind, coro):
+        """spawn() once the kind's backlog has room."""
+        backlog = self.backlogs[kind]
+        await backlog.acquire()
+        task = self.spawn(kind, coro)
+        task.add_done_callback(lambda task: backlog.release())
+        return task
+
+    def _done(self, task):
+        self.tasks.discard(task)
+        if not task.cancelled() and task.exception():
+            self.errors.append(task.exception())
+
+    async def join(self):
+        """Wait for all background tasks, including ones spawned while waiting."""
+        while self.tasks:
+            await asyncio.gather(*list(self.tasks), return_exceptions=True)
+
+
+async def dispose_async(handles):
+    for handle in handles:
+        try:
+            await handle.dispose()
+        except Exception:
+            pass  # Already gone with its page
+
+
+class AsyncSchwabDownloader(SchwabDownloader):
+    """SchwabDownloader on playwright.async_api.
+
+    Parsing, caching and file naming are inherited; every browser interaction is a coroutine that takes
+    the page to work on, since several pages of the same context are in flight at once.
+    """
+
+    def __init__(self, args, coordinator=None, name=None):
+        super().__init__(None, args, coordinator, name)
+        self.waiter = AsyncWaiter(floors=self.waiter.floors, jitter=self.waiter.jitter, governor=self.governor)
+        self.scheduler = Scheduler(Scheduler.parse_limits(args.get('--limits')), self.pipeline_depth)
+        self.history_responses = {}  # Captured history API responses per page
+        self.render_queue = None  # Idle render pages, opened with the first modal snapshot
+        self.render_lock = asyncio.Lock()
+        self.page_operations = defaultdict(int)  # Result pages and saves per page since it was opened
+        self.owns_browser = False  # With --profiles the browser is shared, and closed by run_profiles()
+        self.attention = asyncio.Lock()  # Held while a human completes a login, shared by all profiles
+
+    async def launch_browser(self, storage_state=None):
+        if not self.browser:
+            self.browser = await self.start_browser()
+            self.owns_browser = True
+        self.context = await self.browser.new_context(storage_state=storage_state)
+        if self.blocker.enabled:
+            await self.context.route("**/*", self.blocker.handle_async)
+            self.context.on("response", self.blocker.on_response)
+        self.context.on("response", self.governor.on_response)
+
+    async def start_browser(self):
+        remote_debug = self.args.get('--remote-debug', False)
+
+        if remote_debug:
+            print("🚀 Launching Chromium with CDP debugging on port 9222")
+            print("📱 You can connect to this browser at: http://localhost:9222")
+            await self.playwright.chromium.launch(
+                headless=False,
+                args=[
+                    '--remote-debugging-port=9222',
+                    '--remote-debugging-address=0.0.0.0',
+                    '--disable-web-security',
+                    '--disable-features=VizDisplayCompositor',
+                    self.browser_switch,
+                ],
+            )
+            return await self.playwright.chromium.connect_over_cdp("http://localhost:9222")
+        return await self.playwright.chromium.launch(
+            headless=bool(self.args.get('--headless')), args=[self.browser_switch]
+        )
+
+    async def new_page(self):
+        page = await self.context.new_page()
+        await Stealth().apply_stealth_async(page)
+        return page
+
+    async def save_session(self):
+        if self.session_store:
+            self.session_store.save(await self.context.storage_state())
+
+    async def resume_session(self):
+        self.page = await self.new_page()
+        await self.page.goto(self.summary_url)
+        try:
+            await self.waiter.for_selector('session-check', self.page, SECONDARY_NAV_SELECTOR, timeout=10000)
+            if self.page.url.startswith(self.summary_url):
+                self.log("Reusing saved session")
+                return True
+        except Exception:
+            pass
+        self.log("Saved session has expired, logging in")
+        await self.page.close()
+        return False
+
+    async def login(self):
+        self.page = await self.new_page()
+        await self.page.goto(self.login_url)
+
+        frame = self.page.frame_locator("iframe[title=\"log in form\"]")
+
+        if self.id:
+            await frame.get_by_role("textbox", name="Login ID").fill(self.id)
+
+        if self.password:
+            await frame.get_by_role("textbox", name="Password").fill(self.password)
+
+        await frame.get_by_label("Remember Login ID").check()
+
+        await self.waiter.pause('login-form')
+
+        if self.id and self.password:
+            login_page_url = self.page.url
+            await frame.get_by_role("button", name="Log in").click()
+            await self.leave_login_page(login_page_url)
+
+        if not self.page.url.startswith(self.summary_url):
+            # A human has to step in; with --profiles, logins queue here so only one needs them at a time
+            async with self.attention:
+                await self.page.bring_to_front()
+                prompt = self.login_prompt(await self.page.title())
+                if prompt:
+                    self.log(prompt)
+                self.log("Waiting for verification...")
+                await self.waiter.for_url('login-verify', self.page, self.summary_url, timeout=0)
+
+        self.log("Verification completed! Continuing...")
+        await self.waiter.for_selector('login-ready', self.page, SECONDARY_NAV_SELECTOR)
+
+    async def leave_login_page(self, login_page_url):
+        try:
+            await self.waiter.for_url('login-submit', self.page, lambda url: url != login_page_url)
+        except Exception:
+            pass  # Still on the form, e.g. the password was rejected; waiting for the summary page takes over
+
+    async def navigate_to_statements(self, page):
+        statements_link = await page.query_selector(f'{SECONDARY_NAV_SELECTOR} a[href*="Statements"]')
+        if statements_link:
+            await statements_link.click()
+            await page.wait_for_url(f'{self.client_url}/app/Accounts/Statements/#/', timeout=0)
+        else:
+            await page.get_by_label("secondary level").get_by_role("link", name="Statements & Tax Forms").click()
+            await page.wait_for_url(f'{self.client_url}/app/accounts/statements/#/', timeout=0)
+        await self.waiter.for_selector('navigate-statements', page, '.sdps-account-selector')
+
+    async def navigate_to_history(self, page):
+        if self.history_source == 'api' and page not in self.history_responses:
+            responses = self.history_responses[page] = []
+            page.on("response", lambda response: is_history_response(response) and responses.append(response))
+        await page.get_by_label("secondary level").get_by_role("link", name="Transaction History").click()
+        await page.wait_for_url(f'{self.client_url}/app/accounts/history/#/', timeout=0)
+        await self.waiter.for_selector('navigate-history', page, '.sdps-account-selector')
+
+    async def load_accounts(self):
+        if not self.refresh_cache and self.load_accounts_from_cache():
+            return
+
+        print("Loading accounts from web...")
+        await self.load_accounts_from_web()
+        self.save_accounts_to_cache()
+
+    async def load_accounts_from_web(self):
+        self.accounts = {}
+
+        await self.page.wait_for_selector(MORE_BUTTON_XPATH, timeout=30000)
+        try:
+            dialogs = await self.evaluate_account_dialogs()
+        except Exception as e:
+            print("Reading the account details dialogs in one pass failed, reading them one by one:", e)
+            dialogs = await self.read_account_dialogs()
+        self.accounts_from_dialogs(dialogs)
+
+    async def evaluate_account_dialogs(self):
+        dialogs, start = [], 0
+        while start is not None:
+            result = await self.page.evaluate(ACCOUNT_DETAILS_JS, [MORE_BUTTON_SELECTOR, DETAILS_BODY_SELECTOR, start])
+            dialogs += result['accounts']
+            start = result['next']
+            if start is not None:
+                await self.close_account_dialog()
+        return dialogs
+
+    async def close_account_dialog(self):
+        await self.page.keyboard.press("Escape")
+        await self.waiter.for_selector('account-details-close', self.page, DETAILS_BODY_SELECTOR, state="hidden")
+
+    async def read_account_dialogs(self):
+        dialogs = []
+        more_buttons = await self.page.query_selector_all(MORE_BUTTON_XPATH)
+        for more_button in more_buttons:
+            await more_button.click()
+            await self.waiter.for_selector(
+                'account-details', self.page, f"{DETAILS_BODY_SELECTOR} sdps-list-label-value-item"
+            )
+            dialog = await self.page.query_selector(DETAILS_BODY_SELECTOR)
+
+            details = {}
+            for label in DETAIL_LABELS:
+                item = await dialog.query_selector(DETAIL_VALUE_XPATH.format(label))
+                if item:
+                    details[label] = (await item.inner_text()).strip()
+                    await item.dispose()
+            await dialog.dispose()
+            dialogs.append(details)
+
+            await self.close_account_dialog()
+        await dispose_async(more_buttons)
+        return dialogs
+
+    async def select_account(self, page, account):
+        await page.click('.sdps-account-selector')
+        option = f"xpath=//a[.//span[contains(text(), '{account['name']}')]]"
+        await page.wait_for_selector(option, timeout=5000)
+        await page.locator(option).first.click()
+        await self.waiter.for_selector('select-account', page, option, state="hidden", timeout=5000)
+
+    async def select_date_range(self, page):
+        if self.all_dates:
+            return False
+        custom = await page.evaluate(CUSTOM_RANGE_JS)
+        if not custom:
+            return False
+        try:
+            await page.select_option('#date-range-select-id', custom)
+            await page.fill(FROM_DATE_SELECTOR, f"{self.start_date:%m/%d/%Y}", timeout=5000)
+            await page.fill(TO_DATE_SELECTOR, f"{self.end_date:%m/%d/%Y}", timeout=5000)
+        except Exception as e:
+            self.log("Custom date range not available:", e)
+            return False
+        return True
+
+    async def select_largest_page_size(self, page):
+        select = page.locator(PAGE_SIZE_SELECTOR).first
+        if not await select.count() or not await page.locator("a[aria-label=\"Next\"]:visible").count():
+            return
+        largest = largest_page_size(await select.evaluate(PAGE_SIZES_JS), await select.input_value())
+        if largest:
+            signature = await self.waiter.table_signature(page)
+            await select.select_option(largest)
+            await self.waiter.for_table_change('page-size', page, signature)
+            await self.wait_for_table_load(page)
+
+    async def select_history_account(self, page, account):
+        await self.select_account(page, account)
+        if not await self.select_date_range(page):
+            await page.select_option('#date-range-select-id', 'Previous 4 Years' if account['type'] == 'EAC' else 'All')
+        if page in self.history_responses:
+            self.history_responses[page].clear()
+        await self.run_search(page)
+        await self.select_largest_page_size(page)
+
+    async def select_statements_account(self, page, account):
+        await self.select_account(page, account)
+        if not await self.select_date_range(page):
+            await page.select_option('#date-range-select-id', 'Last 10 Years')
+        buttons = await page.query_selector_all('xpath=//button[@aria-pressed]')
+        wanted = self.filters.doc_type_buttons([await button.inner_text() for button in buttons])
+        for button, pressed in zip(buttons, wanted):
+            state = 'true' if pressed else 'false'
+            if await button.get_attribute('aria-pressed') != state:
+                try:
+                    await page.evaluate('button => button.click()', button)
+                    await self.waiter.for_function(
+                        'toggle-doc-type', page, f"button => button.getAttribute('aria-pressed') === '{state}'", button
+                    )
+                except Exception:
+                    continue
+        await dispose_async(buttons)
+        await self.run_search(page)
+        await self.select_largest_page_size(page)
+
+    async def run_search(self, page):
+        signature = await self.waiter.table_signature(page)
+        await self.waiter.for_response(
+            'search', page, self.is_site_response, page.locator(SEARCH_BUTTON_XPATH).first.click
+        )
+        try:
+            await page.wait_for_function(
+                TABLE_CHANGED_JS, arg=['tbody > tr', signature], timeout=self.waiter.idle_timeout
+            )
+        except Exception:
+            pass
+        await self.wait_for_table_load(page)
+
+    async def wait_for_table_load(self, page):
+        with self.tracer.span('wait-table'):
+            try:
+                await page.wait_for_selector('tbody > tr, [data-testid*="no-"], .no-', timeout=5000)
+            except Exception:
+                status_text = page.locator(
+                    'xpath=//*[contains(text(), "No ") and contains(translate(text(), "FOUND", "found"), "found")]'
+                )
+                if not await status_text.count():
+                    raise Exception("Page failed to load table data")
+
+    async def extract_table_rows(self, page):
+        return await self.scheduler.run('extract', page.evaluate(TABLE_ROWS_JS))
+
+    async def page_too_new(self, page, account, fn_process_row):
+        dates = []
+        for row in await self.extract_table_rows(page):
+            file_name, _, date, _ = fn_process_row(row, account)
+            if file_name:
+                dates.append(date)
+        return bool(dates) and min(dates) > self.end_date
+
+    async def turn_page(self, page, link):
+        signature = await self.waiter.table_signature(page)
+        await link.click()
+        await self.waiter.for_table_change('pagination', page, signature)
+        await self.wait_for_table_load(page)
+
+    async def go_to_page(self, page, number):
+        signature = await self.waiter.table_signature(page)
+        if not await page.evaluate(GO_TO_PAGE_JS, [PAGER_SELECTOR, number]):
+            return False
+        await self.waiter.for_table_change('pagination', page, signature)
+        await self.wait_for_table_load(page)
+        return True
+
+    async def restore_page(self, page, number):
+        return await self.follow_pager(page, restore_steps(number))
+
+    async def seek_end_date(self, page, account, fn_process_row):
+        current = await self.follow_pager(page, seek_steps(), account, fn_process_row)
+        if current > 1:
+            self.log(f"Skipped to result page {current}, the last one after {self.end_date:%Y%m%d}")
+        return current
+
+    async def follow_pager(self, page, steps, account=None, fn_process_row=None):
+        answer = None
+        try:
+            while True:
+                answer = await self.pager_step(page, steps.send(answer), account, fn_process_row)
+        except StopIteration as stop:
+            return stop.value
+
+    async def pager_step(self, page, step, account, fn_process_row):
+        action, *arg = step
+        if action == 'too-new':
+            return await self.page_too_new(page, account, fn_process_row)
+        if action == 'numbers':
+            return await page.evaluate(PAGE_NUMBERS_JS, PAGER_SELECTOR) or []
+        if action == 'go':
+            return await self.go_to_page(page, *arg)
+        link = page.locator(f"a[aria-label=\"{arg[0]}\"]:visible").first
+        if not await link.count():
+            return False
+        await self.turn_page(page, link)
+        return True
+
+    async def process_page(self, page, account, fn_process_row, fn_click_save, phase):
+        start_date = self.page_start_date(account, phase)
+        if phase == 'history' and self.history_source == 'api':
+            payloads = []
+            for response in self.history_responses.get(page, []):
+                try:
+                    payloads.append(await response.json())
+                except Exception as e:
+                    self.log("Unreadable history response", response.url, e)
+            table_rows = table_row_floor(
+                len(await self.extract_table_rows(page)), await page.evaluate(PAGE_NUMBERS_JS, PAGER_SELECTOR)
+            )
+            start_date = self.history_start_date(account, start_date, payloads, table_rows)
+            if start_date is None:
+                return
+        page_number, scan = await self.start_page(page, account, fn_process_row, phase, start_date)
+        first_page = True
+        while not scan.done:
+            if first_page:
+                first_page = False
+            else:
+                next_link = page.locator("a[aria-label=\"Next\"]:visible").first
+                if not await next_link.count():
+                    break
+                page_number += 1
+                with self.tracer.span('paginate', page=page_number):
+                    await self.turn_page(page, next_link)
+
+            saves = []
+            with self.tracer.context(page=page_number):
+                rows = await self.extract_table_rows(page)
+                for row, file_name, details_link, date, record in self.rows_to_save(
+                    scan, rows, account, fn_process_row
+                ):
+                    with self.tracer.span('save', file=os.path.basename(file_name)) as span:
+                        saving = await self.save_with_retries(
+                            page,
+                            fn_click_save,
+                            file_name,
+                            page.locator("tbody > tr").nth(row["index"]).locator(details_link).first,
+                            row,
+                        )
+                        if saving:
+                            span['outcome'] = "background"
+                    self.follow_save(saving, account, phase, date, file_name, record, saves)
+            self.end_page(account, phase, scan, page_number, saves)
+            self.page_operations[page] += 1 + len(saves)
+            if not scan.done:
+                await self.check_memory(page, account, phase, scan.journal)
+
+        if scan.pending:
+            await asyncio.wait(scan.pending)
+        self.finish_scan(account, phase, scan)
+
+    async def check_memory(self, page, account, phase, journal):
+        """Between result pages: raise RecycleNeeded if the page is due, once its saves are checkpointed."""
+        try:
+            await asyncio.to_thread(self.memory.check, self.page_operations[page], self.browser_switch)
+        except RecycleNeeded:
+            saves = [saving for _, _, page_saves, _ in journal for saving in page_saves]
+            if saves:
+                await asyncio.wait(saves)
+            self.save_progress(account, phase, journal)
+            raise
+
+    async def start_page(self, page, account, fn_process_row, phase, start_date):
+        checkpoint = self.checkpoint(account, phase)
+        if not checkpoint:
+            with self.tracer.span('seek'):
+                return await self.seek_end_date(page, account, fn_process_row), self.new_scan(phase, start_date)
+        with self.tracer.span('restore', page_number=checkpoint['page']):
+            page_number = await self.restore_page(page, checkpoint['page'])
+        self.log(f"Resuming {phase} for account {account['number']} at result page {page_number}")
+        return page_number, self.new_scan(phase, start_date, checkpoint if page_number == checkpoint['page'] else None)
+
+    async def save_with_retries(self, page, fn_click_save, file_name, details_link, row):
+        for attempt in range(1, self.retries + 2):
+            try:
+                return await fn_click_save(page, file_name, details_link, row)
+            except Exception as e:
+                self.log(f"File Failed [{file_name}] (attempt {attempt} of {self.retries + 1}): {e}")
+                error = e
+                await self.discard_save(page, file_name)
+        failed = asyncio.get_running_loop().create_future()
+        failed.set_exception(error)
+        return failed
+
+    async def discard_save(self, page, file_name):
+        try:
+            await self.close_modal(page)
+        except Exception:
+            pass
+        if self.coordinator.release(file_name) and os.path.exists(file_name):
+            os.remove(file_name)
+
+    async def fetch_document(self, page, url, file_name):
+        """Stream a document to disk on a thread, with the browser session's cookies, as the sync engine's fetcher."""
+        if not self.user_agent:
+            self.user_agent = await page.evaluate("navigator.userAgent")
+        headers = session_headers(await self.context.cookies(url), self.user_agent, page.url)
+        await asyncio.to_thread(
+            self.store.save, file_name, lambda part: stream_document(url, part, headers, self.governor), url
+        )
+
+    async def click_and_save(self, page, file_name, details_link, row=None):
+        wanted, url = self.save_source(file_name, row, self.fetch_limit > 0)
+        if not wanted:
+            return None
+
+        if url:
+            # Fast path: fetch the document directly, in the background
+            return await self.scheduler.submit(
+                'download',
+                with_retries_async(
+                    lambda attempt: self.fetch_document(page, url, file_name), self.retries, file_name, self.log
+                ),
+            )
+
+        # The click has to happen on this page, but saving the file runs in the background
+        async with self.waiter.for_download('download', page) as download_info:
+            await details_link.click()
+        download = await download_info.value
+
+        def save(attempt):
+            if attempt > 1 and download.url.startswith(('http://', 'https://')):
+                # A failed download can't be saved again, so retries fetch its URL anew
+                return self.fetch_document(page, download.url, file_name)
+            return self.store.save_async(file_name, download.save_as, download.url)
+
+        return await self.scheduler.submit('download', with_retries_async(save, self.retries, file_name, self.log))
+
+    async def click_modal_and_save(self, page, file_name, details_link, row=None):
+        if not self.should_save(file_name):
+            return
+
+        with self.blocker.saving_document():
+            await details_link.click()
+            try:
+                await self.waiter.for_selector('details-modal', page, PRINT_LINK_SELECTOR)
+            except Exception:
+                pass  # Fall through to the per-modal lookups below
+
+            await self.open_render_pages()
+            if self.render_queue:
+                # Snapshot the modal and close it right away, a render page turns it into a PDF in the background
+                snapshot = await page.evaluate(SNAPSHOT_JS, PRINT_LINK_SELECTOR)
+                if snapshot:
+                    await self.close_modal(page)
+                    document = snapshot_document(snapshot, PRINT_LINK_SELECTOR)
+                    return await self.scheduler.submit(
+                        'render',
+                        with_retries_async(
+                            lambda attempt: self.render_snapshot(document, file_name), self.retries, file_name, self.log
+                        ),
+                    )
+
+            if not await page.locator(PRINT_LINK_SELECTOR).count():
+                raise Exception("No print link in the details modal")
+
+            await self.scheduler.run(
+                'render',
+                self.store.save_async(
+                    file_name,
+                    lambda path: page.pdf(
+                        path=path,
+                        format="Letter",
+                        margin={"top": ".5in", "right": ".5in", "bottom": ".5in", "left": ".5in"},
+                        page_ranges="1",  # page.pdf is generating 5 pages instead of 1... work around it
+                    ),
+                ),
+            )
+            await self.close_modal(page)
+
+    async def close_modal(self, page):
+        await page.keyboard.press('Escape')
+        try:
+            await self.waiter.for_selector('details-close', page, PRINT_LINK_SELECTOR, state="hidden", timeout=5000)
+        except Exception:
+            pass
+
+    async def open_render_pages(self):
+        """Open the render pages, once; without any, modals are rendered on the scraping pages."""
+        async with self.render_lock:
+            if self.render_queue is not None or self.render_pages <= 0:
+                return
+            pages = []
+            try:
+                for _ in range(self.render_pages):
+                    pages.append(await self.context.new_page())
+            except Exception as e:
+                self.log("Could not open render pages, rendering modals on the scraping pages instead:", e)
+            if not pages:
+                self.render_pages = 0
+                return
+            self.render_queue = asyncio.Queue()
+            for page in pages:
+                self.render_queue.put_nowait(page)
+
+    async def render_snapshot(self, document, file_name):
+        """Render a modal snapshot on an idle render page."""
+        page = await self.render_queue.get()
+
+        async def render(path):
+            denied = []
+            on_response = denied_listener(denied)
+            page.on("response", on_response)
+            try:
+                with self.blocker.saving_document():  # Render pages share the context, and its blocker
+                    await page.set_content(document, wait_until="load")
+            finally:
+                page.remove_listener("response", on_response)
+            check_denied(denied)
+            await page.pdf(path=path, **PDF_OPTIONS)
+
+        try:
+            await self.store.save_async(file_name, render)
+        finally:
+            self.render_queue.put_nowait(page)
+
+    async def process_jobs(self, name, jobs):
+        """One page working through (phase, account) jobs, navigating only when the phase changes."""
+        page = await self.new_page()
+        await page.goto(self.summary_url)
+        await self.waiter.for_selector('login-ready', page, SECONDARY_NAV_SELECTOR)
+
+        current_phase = None
+        while True:
+            try:
+                phase, account = jobs.get_nowait()
+            except asyncio.QueueEmpty:
+                break
+            try:
+                if phase != current_phase:
+                    await self.phases()[phase][0](page)
+                    current_phase = phase
+            except Exception as e:
+                self.log(f"[{name}] Failed to open {phase}: {e}")
+            self.log(f"[{name}] Processing {phase} for account", json.dumps(account, indent=2))
+            # The navigation limit holds across profiles, which share the scheduler
+            async with self.scheduler.semaphores['navigation']:
+                page = await self.process_account(page, name, phase, account)
+        await page.close()
+
+    async def process_account(self, page, name, phase, account):
+        """Process one account's phase, retrying from its last checkpoint; returns the page, replaced if it died."""
+        fn_navigate, fn_account_selector, fn_process_row, fn_click_save = self.phases()[phase]
+        checkpoint = self.checkpoint(account, phase)
+        if checkpoint and checkpoint['done']:
+            self.log(f"[{name}] Skipping {phase} for account {account['number']}, done in the run being resumed")
+            return page
+        attempt = 1
+        while attempt <= self.retries + 1:
+            try:
+                with self.tracer.context(account=account['number'], phase=phase):
+                    with self.tracer.span('select-account'):
+                        await fn_account_selector(page, account)
+                    await self.process_page(page, account, fn_process_row, fn_click_save, phase)
+                return page
+            except RecycleNeeded as e:
+                page = await self.recycle(page, e.reason, fn_navigate)
+            except Exception as e:
+                self.log(
+                    f"[{name}] Failed {phase} for account {account['number']}"
+                    f" (attempt {attempt} of {self.retries + 1}): {e}"
+                )
+                page = await self.recover(page, fn_navigate)
+                attempt += 1
+        self.log(f"[{name}] Gave up on {phase} for account {account['number']}, --resume continues it")
+        return page
+
+    async def recycle(self, page, reason, fn_navigate):
+        """Replace a page, continuing from the checkpoint; returns the new page.
+
+        Always the page: the context is shared with the other pages in flight, so --max-rss recycles the page too.
+        """
+        self.log(f"Recycling the page: {reason}")
+        with self.tracer.span('recycle', kind='page'):
+            self.page_operations.pop(page, None)
+            self.history_responses.pop(page, None)
+            await page.close()
+            self.memory.recycled('page')
+            return await self.recover(page, fn_navigate)
+
+    async def recover(self, page, fn_navigate):
+        try:
+            if page.is_closed():
+                page = await self.new_page()
+            else:
+                await self.close_modal(page)
+            await page.goto(self.summary_url)
+            await self.waiter.for_selector('login-ready', page, SECONDARY_NAV_SELECTOR)
+            await fn_navigate(page)
+        except Exception as e:
+            self.log("Could not recover the page:", e)
+        return page
+
+    async def close(self):
+        await self.context.close()
+        if self.owns_browser:
+            await self.browser.close()
+
+    async def run(self):
+        print(self.args)
+        async with async_playwright() as playwright:
+            self.playwright = playwright
+            await self.run_in_browser()
+
+    async def run_in_browser(self):
+        """Log in and sync in a context of self.browser, launching it first unless it is shared."""
+        self.parse_credentials()
+        self.parse_date_range()
+        self.filters = WorkFilter.from_args(self.args)
+        self.ensure_target_dir(self.target_dir)
+        self.open_manifest()
+        if not self.resume:
+            self.manifest.clear_checkpoints()
+        self.open_exporter()
+        self.open_indexer()
+
+        self.open_session_store()
+        storage_state = self.load_session()
+        await self.launch_browser(storage_state=storage_state)
+        try:
+            await self.sync(storage_state)
+        finally:
+            await self.close()
+            if self.indexer:
+                await asyncio.to_thread(self.indexer.shutdown)
+            self.close_run()
+
+    async def sync(self, storage_state):
+        """Log in, unless the saved session is still valid, and process the selected accounts and phases."""
+        if not (storage_state and await self.resume_session()):
+            with self.tracer.span('login'):
+                await self.login()
+            await self.save_session()
+        with self.tracer.span('load-accounts'):
+            await self.load_accounts()
+        self.accounts = self.filters.select_accounts(self.accounts)
+        jobs = asyncio.Queue()
+        for phase in self.filters.phases:
+            for account in self.accounts.values():
+                jobs.put_nowait((phase, account))
+
+        workers = min(self.scheduler.limits['navigation'], jobs.qsize())
+        await asyncio.gather(
+            *(
+                asyncio.create_task(self.process_jobs(f"page {number}", jobs), name=f"page {number}")
+                for number in range(workers)
+            )
+        )
+        await self.scheduler.join()
+        if self.scheduler.errors:
+            print(f"{len(self.scheduler.errors)} background tasks failed")
+        await self.save_session()
+
+
+async def run_profiles(args):
+    """--profiles: every login in its own context of one shared Chromium, under one set of --limits.
+
+    Each profile has its own account cache, manifest, session and downloads/<profile> subtree, so nothing is
+    shared but the browser process, the scheduler's limits and the lock that queues logins needing a human.
+    """
+    profiles = load_profiles(args.get('--config'), args['--profiles'])
+    downloaders = []
+    for name, profile in profiles.items():
+        downloader = AsyncSchwabDownloader(profile_args(args, name, profile), name=name)
+        downloader.target_dir = profile.get('target-dir') or os.path.join(downloader.target_dir, name)
+        downloaders.append(downloader)
+    first = downloaders[0]
+    for downloader in downloaders[1:]:
+        downloader.scheduler = first.scheduler
+        downloader.attention = first.attention
+        downloader.coordinator = first.coordinator
+
+    async with async_playwright() as playwright:
+        first.playwright = playwright
+        browser = await first.start_browser()
+        for downloader in downloaders:
+            downloader.playwright, downloader.browser = playwright, browser
+            downloader.browser_switch = first.browser_switch
+        results = await asyncio.gather(
+            *(downloader.run_in_browser() for downloader in downloaders), return_exceptions=True
+        )
+        await browser.close()
+    for downloader, result in zip(downloaders, results):
+        if isinstance(result, Exception):
+            print(f"[{downloader.name}] failed: {result}")
+    return not any(isinstance(result, Exception) for result in results)
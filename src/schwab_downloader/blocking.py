@@ -0,0 +1,146 @@
+# SPDX-FileCopyrightText: 2023-present David C Wang <dcwangmit01@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+
+"""Resource blocking profiles, applied with context.route, and counters of what they saved."""
+
+import re
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+# Resource types the scraper never needs
+MEDIA_TYPES = {'image', 'media', 'font'}
+
+# Analytics, tag managers, session replay and ad beacons
+TRACKER_HOSTS = re.compile(
+    r'(^|\.)(google-analytics\.com|googletagmanager\.com|doubleclick\.net|googleadservices\.com|facebook\.net'
+    r'|adobedtm\.com|omtrdc\.net|demdex\.net|everesttech\.net|tiqcdn\.com|tealiumiq\.com|quantummetric\.com'
+    r'|hotjar\.com|clarity\.ms|bing\.com|linkedin\.com|licdn\.com|qualtrics\.com|kampyle\.com|medallia\.com'
+    r'|nr-data\.net|newrelic\.com|criteo\.com|adsrvr\.org|taboola\.com|outbrain\.com)$'
+)
+
+# Hosts whose scripts, frames and API calls the site needs to work
+FIRST_PARTY_HOSTS = re.compile(r'(^|\.)(schwab\.com|schwabcdn\.com|schwab\.net)$')
+
+# Never blocked, whatever the profile: pages, the login form, and documents we download
+ALLOW_LIST = re.compile(r'\.pdf(\?|$)|/login|/Login|/api/', re.IGNORECASE)
+
+# Images that are part of a document we save, e.g. the front and back of a check in its details modal
+DOCUMENT_IMAGES = re.compile(r'check[-_]?image|/checks?/.*image|image.*/checks?/', re.IGNORECASE)
+
+PROFILES = ('off', 'media', 'trackers', 'strict')
+
+# Typical transfer sizes, used to estimate the bytes of blocked requests until real sizes have been seen
+TYPICAL_BYTES = {'image': 30_000, 'media': 500_000, 'font': 40_000, 'script': 60_000, 'stylesheet': 20_000}
+
+
+class ResourceBlocker:
+    """Aborts the requests a profile doesn't need and counts what was saved.
+
+    Profiles build on each other:
+      media     images, media and fonts
+      trackers  media, plus analytics and ad hosts
+      strict    trackers, plus third-party scripts and frames outside the site's own hosts
+
+    Images, media and fonts are never blocked while a details modal is being saved (see saving_document), on the
+    render pages, or when they are a document's own images such as check images.
+
+    Note that Playwright disables the HTTP cache of a context once routing is enabled on it.
+    """
+
+    def __init__(self, profile):
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown --block-resources profile: {profile} (choose from {', '.join(PROFILES)})")
+        self.profile = profile
+        self.lock = threading.Lock()
+        self.blocked = defaultdict(int)
+        self.allowed = defaultdict(int)
+        self.allowed_bytes = defaultdict(int)
+        self.documents = 0  # Details modals being saved, whose images and fonts are printed with them
+
+    @property
+    def enabled(self):
+        return self.profile != 'off'
+
+    @contextmanager
+    def saving_document(self):
+        """Let images, media and fonts through while a page shows a document being saved, e.g. a details modal.
+
+        The blocker is shared by every page of the run, so they are let through on all of them meanwhile.
+        """
+        with self.lock:
+            self.documents += 1
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.documents -= 1
+
+    def should_block(self, url, resource_type, media=True):
+        """Whether the profile blocks a request; media=False lets images, media and fonts through."""
+        if resource_type == 'document' or ALLOW_LIST.search(url):
+            return False
+        host = urlparse(url).hostname or ''
+        if resource_type in MEDIA_TYPES:
+            return media and not self.documents and not DOCUMENT_IMAGES.search(url)
+        if self.profile in ('trackers', 'strict') and TRACKER_HOSTS.search(host):
+            return True
+        if self.profile == 'strict' and resource_type in ('script', 'sub_frame') and not FIRST_PARTY_HOSTS.search(host):
+            return True
+        return False
+
+    def _decide(self, request, media=True):
+        block = self.should_block(request.url, request.resource_type, media)
+        with self.lock:
+            if block:
+                self.blocked[request.resource_type] += 1
+            else:
+                self.allowed[request.resource_type] += 1
+        return block
+
+    def handle(self, route):
+        """Route handler for playwright.sync_api."""
+        if self._decide(route.request):
+            route.abort("blockedbyclient")
+        else:
+            route.continue_()
+
+    def handle_render(self, route):
+        """Route handler for playwright.sync_api render pages, which print documents with their images and fonts."""
+        if self._decide(route.request, media=False):
+            route.abort("blockedbyclient")
+        else:
+            route.continue_()
+
+    async def handle_async(self, route):
+        """Route handler for playwright.async_api."""
+        if self._decide(route.request):
+            await route.abort("blockedbyclient")
+        else:
+            await route.continue_()
+
+    def on_response(self, response):
+        """Response listener that tracks the size of allowed traffic, to estimate what blocking saved."""
+        length = response.headers.get('content-length')
+        if length and length.isdigit():
+            with self.lock:
+                self.allowed_bytes[response.request.resource_type] += int(length)
+
+    def estimated_bytes(self, resource_type):
+        """Average size of a request of this type, from the allowed traffic if any was seen."""
+        count = self.allowed[resource_type]
+        if count and self.allowed_bytes[resource_type]:
+            return self.allowed_bytes[resource_type] // count
+        return TYPICAL_BYTES.get(resource_type, 10_000)
+
+    def report(self):
+        if not self.enabled:
+            return
+        total = sum(self.blocked.values())
+        saved = sum(count * self.estimated_bytes(kind) for kind, count in self.blocked.items())
+        print(f"Resource blocking ({self.profile}): blocked {total} requests, ~{saved / 1_000_000:.1f} MB saved")
+        for kind, count in sorted(self.blocked.items(), key=lambda item: -item[1]):
+            print(f"  {kind:<12} {count:>6} requests  ~{count * self.estimated_bytes(kind) / 1_000_000:.1f} MB")
+        print(f"  allowed      {sum(self.allowed.values()):>6} requests")
@@ -11,6 +11,17 @@ Usage:
     [--year=<YYYY> | --date-range=<YYYYMMDD-YYYYMMDD>]
     [--id=<id> --password=<password>] [--remote-debug]
     [--cache-accounts=<file>] [--refresh-cache]
+    [--wait-floor=<spec>] [--wait-jitter=<seconds>] [--max-rate=<n>] [--workers=<n>]
+    [--async] [--limits=<spec>] [--manifest=<file>] [--incremental] [--resume] [--retries=<n>]
+    [--export=<file>] [--pipeline-depth=<n>] [--config=<file>] [--accounts=<list>] [--phases=<list>]
+    [--doc-types=<list>] [--transaction-types=<list>]
+    [--session=<file> | --no-session] [--fetch-limit=<n>] [--history-source=<source>]
+    [--render-pages=<n>] [--recycle-after=<n>] [--max-rss=<mb>] [--block-resources=<profile>]
+    [--base-url=<url>] [--headless] [--plan]
+    [--index=<file>] [--index-workers=<n>]
+    [--trace=<file>] [--chrome-trace=<file>] [--daemon [--daemon-port=<n>] | --no-daemon | --profiles=<names>]
+  schwab-downloader.py search [<query>...] [--accounts=<list>] [--types=<list>]
+    [--year=<YYYY> | --date-range=<YYYYMMDD-YYYYMMDD>] [--invalid] [--max-results=<n>] [--index=<file>]
   schwab-downloader.py (-h | --help)
   schwab-downloader.py (-v | --version)
 
@@ -18,6 +29,10 @@ Login Options:
   --id=<id>              Schwab login id  [default: $SCHWAB_ID].
   --password=<password>  Schwab login password  [default: $SCHWAB_PASSWORD].
 
+Session Options:
+  --session=<file>          Encrypted file to save and reuse the logged-in session  [default: .schwab_session.enc].
+  --no-session              Always log in, without saving or reusing a session.
+
 Date Range Options:
   --date-range=<YYYYMMDD-YYYYMMDD>  Start and end date range
   --year=<YYYY>                     Year, formatted as YYYY  [default: <CUR_YEAR>].
@@ -26,8 +41,86 @@ Cache Options:
   --cache-accounts=<file> Cache accounts to specified file [default: .schwab_accounts.json].
   --refresh-cache         Force refresh of accounts cache from web.
 
+Sync Options:
+  --manifest=<file>         SQLite manifest of downloaded documents  [default: .schwab_manifest.sqlite].
+  --incremental             Stop paging each account at its last fully synced date.
+  --resume                  Continue the last run from the account, result page and row it got to.
+  --retries=<n>             Times a failed document or account is retried before moving on  [default: 2].
+  --export=<file>           Also stream every transaction and statement row in range to a dataset: .csv,
+                            .sqlite or .parquet (needs pyarrow).  Repeat runs append only new rows.
+  --history-source=<source> Read transactions from the rendered table (table) or from the site's
+                            JSON responses (api)  [default: table].
+
+Index Options:
+  --index=<file>            SQLite full-text index of the downloaded documents  [default: .schwab_index.sqlite].
+  --index-workers=<n>       Processes checking each new document and adding its text to the index while the
+                            browser goes on, 0 to not index  [default: 2].  Text needs pypdf.
+
+Search Options:
+  <query>                   Words the documents' text, type or description must contain; AND, OR, NOT and
+                            prefixes ("divid*") work as in SQLite full-text queries.
+  --types=<list>            Only documents whose type or description contains one of these, e.g. "1099,trade".
+  --invalid                 Only documents that failed the PDF check.
+  --max-results=<n>         Most documents listed, best match first  [default: 20].
+
+Daemon Options:
+  --daemon                  Stay up with a logged-in browser and run the sync jobs later invocations submit.
+                            While it runs, an invocation only submits its date range, filters, --incremental
+                            and --resume as a job and waits for it.
+  --daemon-port=<n>         Local port the daemon listens on, 0 for any free one  [default: 0].
+  --no-daemon               Run in this process even when a daemon is running.
+
+Profile Options:
+  --profiles=<names>        Run these logins from the config file's [profiles.<name>] tables ("all" for every
+                            one) at once, each in its own context of one Chromium with its own account cache,
+                            manifest, session and downloads/<name>; --limits applies to all of them together.
+
+Filter Options:
+  --config=<file>           TOML file whose [filters] table sets any of the filters below, as lists of
+                            strings  [default: .schwab_downloader.toml].
+  --accounts=<list>         Only these accounts, by number (or its last digits) or part of their name or type,
+                            e.g. "1234,roth".
+  --phases=<list>           Only these phases: history, statements.
+  --doc-types=<list>        Only statements whose document type or name contains one of these,
+                            e.g. "tax forms,1099".
+  --transaction-types=<list>  Only transactions whose type contains one of these, e.g. "dividend,check".
+
+Wait Options:
+  --wait-floor=<spec>       Minimum seconds per wait, e.g. "0.5,login-form=2"  [default: 0].
+  --wait-jitter=<seconds>   Random extra seconds added to each wait floor  [default: 0].
+  --max-rate=<n>            Fastest the rate governor may pace each wait step or fetch, in actions per
+                            second  [default: 50].
+
+Concurrency Options:
+  --workers=<n>             Number of parallel browser workers  [default: 1].
+  --fetch-limit=<n>         Statement PDFs fetched directly over HTTP at once, 0 to always click  [default: 4].
+  --render-pages=<n>        Background pages rendering details modals to PDF, 0 to render on the
+                            main page  [default: 2].
+  --pipeline-depth=<n>      Saves handed off to the background before the table scan waits for them: started
+                            downloads, queued fetches and renders  [default: 8].
+  --async                   Use the asyncio engine, which overlaps navigation, downloads and renders.
+  --limits=<spec>           Async engine concurrency per kind of work
+                            [default: navigation=2,extract=2,download=4,render=1].
+
+Memory Options:
+  --recycle-after=<n>       Result pages and saves on the working page before it is replaced with a fresh one,
+                            0 never  [default: 500].
+  --max-rss=<mb>            Memory of a worker's Chromium processes above which its browser context is
+                            recreated from its storage state, 0 for no limit  [default: 0].
+
+Network Options:
+  --block-resources=<profile>  Abort requests the scraper doesn't need: off, media (images, media,
+                               fonts), trackers (media plus analytics) or strict (trackers plus
+                               third-party scripts)  [default: off].
+
 Debug Options:
+  --plan                  Print what a run would fetch, per account and phase, from the account cache and
+                          the manifest, without starting a browser.
   --remote-debug          Enable remote debugging on port 9222
+  --base-url=<url>        Use this site instead of schwab.com, e.g. the benchmarks' stand-in site.
+  --headless              Run the browser without a window.
+  --trace=<file>          Write a span of every step (duration, account, page, outcome) as JSON lines.
+  --chrome-trace=<file>   Write the spans as a Chrome trace-event file, for chrome://tracing or Perfetto.
 
 Options:
   -h --help                Show this screen.
@@ -39,22 +132,69 @@ Examples:
   schwab-downloader.py --remote-debug --year=2022
   schwab-downloader.py --cache-accounts=my_accounts.json --year=2022
   schwab-downloader.py --refresh-cache --year=2022
+  schwab-downloader.py --wait-floor=0.5,login-form=2 --wait-jitter=1 --year=2022
+  schwab-downloader.py --workers=3 --year=2022
+  schwab-downloader.py --async --limits=navigation=3,download=6 --year=2022
+  schwab-downloader.py --incremental
+  schwab-downloader.py --incremental --history-source=api
+  schwab-downloader.py --resume --retries=5 --year=2022
+  schwab-downloader.py --incremental --export=transactions.sqlite
+  schwab-downloader.py --accounts=1234,5678 --phases=statements --doc-types=1099 --year=2022
+  schwab-downloader.py --daemon --headless
+  schwab-downloader.py --profiles=all --incremental
+  schwab-downloader.py --plan --incremental --accounts=1234
+  schwab-downloader.py --block-resources=trackers --year=2022
+  schwab-downloader.py --trace=run.jsonl --chrome-trace=run.trace.json --year=2022
+  schwab-downloader.py search 1099-DIV --accounts=1234 --year=2022
+  schwab-downloader.py search "wire transfer" --types=wire
 """
 
+import concurrent.futures
 import json
 import os
+import queue
+import re
 import sys
+import threading
 import time
 from datetime import datetime
 from pathlib import Path
+from urllib.parse import urlparse
 
-import ipdb
 from docopt import docopt
-from dotenv import load_dotenv
-from playwright.sync_api import sync_playwright
-from playwright_stealth import Stealth
 
 from schwab_downloader.__about__ import __version__
+from schwab_downloader.blocking import FIRST_PARTY_HOSTS, ResourceBlocker
+from schwab_downloader.export import open_exporter, row_key
+from schwab_downloader.fetch import DocumentFetcher, session_headers, stream_document
+from schwab_downloader.filters import WorkFilter
+from schwab_downloader.governor import RateGovernor
+from schwab_downloader.history_api import (
+    HISTORY_SOURCES,
+    is_history_response,
+    transactions_from_payloads,
+    truncation,
+)
+from schwab_downloader.manifest import Manifest
+from schwab_downloader.memory import MemoryMonitor, RecycleNeeded, browser_switch, process_tree_rss
+from schwab_downloader.paging import largest_page_size, restore_steps, seek_steps
+from schwab_downloader.pipeline import DownloadQueue, with_retries
+from schwab_downloader.render import SNAPSHOT_JS, RenderPool, snapshot_document
+from schwab_downloader.rows import PageScan, RepeatCounter, table_row_floor
+from schwab_downloader.search import Indexer, search
+from schwab_downloader.session import SessionStore
+from schwab_downloader.store import DocumentStore
+from schwab_downloader.trace import Tracer
+from schwab_downloader.waits import TABLE_CHANGED_JS, Waiter
+
+
+def dispose(handles):
+    """Release element handles as soon as they're used, so the driver and the page don't keep them for the run."""
+    for handle in handles:
+        try:
+            handle.dispose()
+        except Exception:
+            pass  # Already gone with its page
 
 
 def load_env_if_needed():
@@ -80,6 +220,8 @@ def load_env_if_needed():
         current_dir = current_dir.parent
 
     if env_file:
+        from dotenv import load_dotenv
+
         print(f"Loading environment variables from {env_file}")
         load_dotenv(env_file)
     else:
@@ -88,9 +230,164 @@ def load_env_if_needed():
 
 TARGET_DIR = os.getcwd() + "/" + "downloads"
 
+LOGIN_URL = 'https://www.schwab.com/'
+CLIENT_URL = 'https://client.schwab.com'
+SUMMARY_PATH = '/clientapps/accounts/summary/'
+
+# Navigation bar of every logged-in page, present once the page is ready to be used
+SECONDARY_NAV_SELECTOR = 'nav[aria-label="secondary level"]'
+
+# "More" buttons of the accounts summary, and the value of a labeled item in their details dialog
+MORE_BUTTON_XPATH = "xpath=//button[contains(@aria-label, 'More account details overlay')]"
+MORE_BUTTON_SELECTOR = "button[aria-label*='More account details overlay']"
+DETAIL_VALUE_XPATH = "xpath=.//sdps-list-label-value-item[.//span[contains(text(), '{}')]]//div[@slot='value']"
+DETAILS_BODY_SELECTOR = "#accountdetailsoverlay-modal-body"
+DETAIL_LABELS = ('Name', 'Account Number', 'Type', 'Companies')
+
+# Opens the details dialog of every account in turn, from the start-th, and reads all its labeled values, in a
+# single round trip.  Each dialog is closed with its close button and gone before the next is opened.  A dialog
+# without one is left open and its account's next index returned, to be closed with a real Escape key press (a
+# synthetic keydown is untrusted and ignored by dialog libraries) before reading on from there.  Returns
+# {accounts: one {label: value} object per account read, next: that index or null when all were read}.
+ACCOUNT_DETAILS_JS = """
+async ([buttonSelector, bodySelector, start]) => {
+    const waitFor = (test, what) => new Promise((resolve, reject) => {
+        const start = Date.now();
+        const poll = () => {
+            const value = test();
+            if (value) return resolve(value);
+            if (Date.now() - start > 10000) return reject(new Error('Timed out waiting for ' + what));
+            setTimeout(poll, 25);
+        };
+        poll();
+    });
+    const accounts = [];
+    const buttons = [...document.querySelectorAll(buttonSelector)];
+    for (let i = start; i < buttons.length; i++) {
+        buttons[i].click();
+        const body = await waitFor(() => {
+            const body = document.querySelector(bodySelector);
+            return body && body.offsetParent !== null && body.querySelector('sdps-list-label-value-item') && body;
+        }, 'the account details dialog');
+        const details = {};
+        for (const item of body.querySelectorAll('sdps-list-label-value-item')) {
+            const label = item.querySelector('span');
+            const value = item.querySelector('div[slot="value"]');
+            if (label && value) details[label.innerText.trim()] = value.innerText.trim();
+        }
+        accounts.push(details);
+        const close = body.closest('[role="dialog"], .modal, dialog')?.querySelector('button[aria-label*="close" i]');
+        if (!close) return {accounts, next: i + 1};
+        close.click();
+        await waitFor(() => {
+            const body = document.querySelector(bodySelector);
+            return !body || body.offsetParent === null;
+        }, 'the account details dialog to close');
+    }
+    return {accounts, next: null};
+}
+"""
+
+# Search button of the history and statements searches
+SEARCH_BUTTON_XPATH = 'xpath=//button[contains(., "Search")]'
+
+# Print buttons of the Trade, Wire and Check details modals
+PRINT_LINK_SELECTOR = "button#print-icon-button, a.print-link, a.linkPrint"
+
+# Extracts every result row of the current page in a single round trip.  Rows are referenced by
+# their index so that element handles are only resolved for the rows that are actually downloaded.
+# Links carry any document URL found on the row's anchors and buttons, for fetching it directly.
+TABLE_ROWS_JS = """
+() => {
+    const urlOf = el => {
+        const url = el.getAttribute('href') || el.getAttribute('data-url') || el.getAttribute('data-href');
+        if (!url || url.startsWith('#') || url.startsWith('javascript:')) return null;
+        return new URL(url, location.href).href;
+    };
+    return Array.from(document.querySelectorAll('tbody > tr')).map((row, index) => ({
+        index,
+        cells: Array.from(row.querySelectorAll(':scope > td')).map(td => td.innerText.trim()),
+        buttons: Array.from(row.querySelectorAll('button')).map(button => button.innerText.trim()),
+        links: Array.from(row.querySelectorAll('a, button'))
+            .map(el => ({text: el.innerText.trim(), url: urlOf(el)}))
+            .filter(link => link.url),
+    }));
+}
+"""
+
+
+# The date range select's "Custom" option, and the date inputs it reveals
+CUSTOM_RANGE_JS = """
+() => {
+    const select = document.querySelector('#date-range-select-id');
+    const option = select && Array.from(select.options).find(option => /custom/i.test(option.text));
+    return option ? option.value : null;
+}
+"""
+FROM_DATE_SELECTOR = "input[aria-label*='from' i], input[id*='from' i][type='text'], input[name*='from' i]"
+TO_DATE_SELECTOR = "input[aria-label*='to date' i], input[id*='to-date' i], input[id='toDate'], input[name*='toDate' i]"
+
+# Rows-per-page select of the result table
+PAGE_SIZE_SELECTOR = "select[aria-label*='per page' i], select[id*='page-size' i], select[name*='pageSize' i]"
+PAGE_SIZES_JS = "select => Array.from(select.options).map(option => option.value)"
+
+# Numbered links of the result table's pager
+PAGER_SELECTOR = "nav[aria-label*='agination'], .pagination, [class*='pagination']"
+
+# Page numbers the pager links to right now, or null if it has no numbered links
+PAGE_NUMBERS_JS = """
+pagerSelector => {
+    const pager = document.querySelector(pagerSelector);
+    if (!pager) return null;
+    const numbers = Array.from(pager.querySelectorAll('a, button'))
+        .filter(el => el.offsetParent !== null && /^\\d+$/.test(el.innerText.trim()))
+        .map(el => parseInt(el.innerText.trim(), 10));
+    return numbers.length ? numbers : null;
+}
+"""
+
+# Clicks the pager link to a page number; returns whether there was one
+GO_TO_PAGE_JS = """
+([pagerSelector, number]) => {
+    const pager = document.querySelector(pagerSelector);
+    const link = pager && Array.from(pager.querySelectorAll('a, button'))
+        .find(el => el.offsetParent !== null && el.innerText.trim() === String(number));
+    if (!link) return false;
+    link.click();
+    return true;
+}
+"""
+
+
+class WorkCoordinator:
+    """Coordinates workers: serializes progress output and hands out each file name to one worker only."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.claimed = set()
+
+    def claim(self, file_name):
+        with self.lock:
+            if file_name in self.claimed:
+                return False
+            self.claimed.add(file_name)
+            return True
+
+    def release(self, file_name):
+        """Give up the claim on a file name whose save failed, so that it can be retried; returns if it was claimed."""
+        with self.lock:
+            if file_name not in self.claimed:
+                return False
+            self.claimed.discard(file_name)
+            return True
+
+    def print(self, *args):
+        with self.lock:
+            print(*args)
+
 
 class SchwabDownloader:
-    def __init__(self, playwright, args):
+    def __init__(self, playwright, args, coordinator=None, name=None):
         self.playwright = playwright
         self.args = args
         self.id = None
@@ -101,8 +398,74 @@ class SchwabDownloader:
         self.context = None
         self.page = None
         self.accounts = None
+        self.all_accounts = None  # Every loaded account, self.accounts being those selected for the job
         self.cache_file = args.get('--cache-accounts') or '.schwab_accounts.json'
+        self.target_dir = TARGET_DIR  # A subdirectory of it per login with --profiles
         self.refresh_cache = args.get('--refresh-cache', False)
+        self.governor = RateGovernor(float(args.get('--max-rate') or 50), self.site_hosts(args.get('--base-url')))
+        self.waiter = Waiter(
+            floors=Waiter.parse_floors(args.get('--wait-floor') or '0'),
+            jitter=float(args.get('--wait-jitter') or 0),
+            governor=self.governor,
+        )
+        self.workers = int(args.get('--workers') or 1)
+        self.coordinator = coordinator or WorkCoordinator()
+        self.name = name
+        self.manifest = None
+        self.store = None
+        self.exporter = None
+        self.session_store = None
+        self.fetch_limit = int(args.get('--fetch-limit') or 0)
+        self.fetcher = None
+        self.render_pages = int(args.get('--render-pages') or 0)
+        self.render_pool = None
+        self.index_workers = int(args.get('--index-workers') or 0)
+        self.indexer = None
+        self.pipeline_depth = int(args.get('--pipeline-depth') or 0)
+        self.downloads = DownloadQueue(self.pipeline_depth)
+        self.user_agent = None
+        self.history_source = self.check_history_source(args)
+        self.history_responses = []
+        self.capture_page = None
+        self.incremental = args.get('--incremental', False)
+        self.resume = args.get('--resume', False)
+        self.retries = int(args.get('--retries') or 0)
+        self.all_dates = False  # No --year or --date-range, everything is wanted
+        self.filters = WorkFilter()  # Everything, until run() reads --config and the filter options
+        base_url = (args.get('--base-url') or '').rstrip('/')
+        self.login_url = base_url + '/' if base_url else LOGIN_URL
+        self.client_url = base_url or CLIENT_URL
+        self.summary_url = self.client_url + SUMMARY_PATH
+        self.blocker = ResourceBlocker(args.get('--block-resources') or 'off')
+        self.tracer = Tracer(keep=bool(args.get('--trace') or args.get('--chrome-trace')))
+        self.memory = MemoryMonitor(int(args.get('--recycle-after') or 0), int(args.get('--max-rss') or 0))
+        self.operations = 0  # Result pages and saves on the working page since it was opened
+        self.browser_switch = browser_switch()  # Tells this browser's processes apart, for --max-rss
+
+    @staticmethod
+    def check_history_source(args):
+        source = args.get('--history-source') or 'table'
+        if source not in HISTORY_SOURCES:
+            raise ValueError(f"Unknown --history-source: {source} (choose from {', '.join(HISTORY_SOURCES)})")
+        return source
+
+    @staticmethod
+    def check_options(args):
+        """Reject unknown values of the enumerated options as soon as they're parsed, before anything starts."""
+        SchwabDownloader.check_history_source(args)
+        ResourceBlocker(args.get('--block-resources') or 'off')
+        WorkFilter.from_args(args, quiet=True)
+        if args.get('--profiles') and args.get('--remote-debug'):
+            raise ValueError("--remote-debug can't be used with --profiles, whose logins share one launched browser")
+        if int(args.get('--max-rss') or 0) and process_tree_rss() is None:
+            raise ValueError("--max-rss can't be enforced here: neither /proc nor ps tells the processes' memory")
+
+    @staticmethod
+    def site_hosts(base_url):
+        """Regex of the hosts whose responses tell the rate governor how the site is coping."""
+        if base_url:
+            return re.compile(f"^{re.escape(urlparse(base_url).hostname or '')}$")
+        return FIRST_PARTY_HOSTS
 
     def parse_credentials(self):
         self.id = self.args.get('--id')
@@ -121,14 +484,45 @@ class SchwabDownloader:
         else:
             year = str(datetime.now().year)
             self.start_date, self.end_date = "2000101", year + "1231"
+            self.all_dates = True
 
         self.start_date = datetime.strptime(self.start_date, "%Y%m%d")
         self.end_date = datetime.strptime(self.end_date, "%Y%m%d")
 
-    def ensure_target_dir(self, TARGET_DIR):
-        os.makedirs(TARGET_DIR, exist_ok=True)
+    def ensure_target_dir(self, target_dir):
+        os.makedirs(target_dir, exist_ok=True)
+
+    def open_fetcher(self):
+        if self.fetch_limit > 0:
+            self.fetcher = DocumentFetcher(
+                self.fetch_limit, self.store, self.pipeline_depth, self.governor, self.retries, self.log
+            )
+
+    def open_render_pool(self):
+        if self.render_pages > 0:
+            self.render_pool = RenderPool(
+                self.render_pages, self.store, self.pipeline_depth, self.retries, self.log, self.blocker
+            )
 
-    def launch_browser(self):
+    def open_indexer(self):
+        if self.index_workers > 0:
+            self.indexer = Indexer(self.args.get('--index') or '.schwab_index.sqlite', self.index_workers, self.log)
+
+    def open_manifest(self):
+        self.manifest = Manifest(self.args.get('--manifest') or '.schwab_manifest.sqlite')
+        self.store = DocumentStore(self.target_dir, self.manifest)
+        self.governor.load(self.manifest.rates())
+
+    def open_exporter(self):
+        if self.args.get('--export'):
+            self.exporter = open_exporter(self.args['--export'])
+
+    def log(self, *args):
+        if self.name:
+            args = (f"[{self.name}]",) + args
+        self.coordinator.print(*args)
+
+    def launch_browser(self, storage_state=None):
         # Check if remote debugging is enabled
         remote_debug = self.args.get('--remote-debug', False)
 
@@ -145,6 +539,7 @@ class SchwabDownloader:
                     '--remote-debugging-address=0.0.0.0',
                     '--disable-web-security',
                     '--disable-features=VizDisplayCompositor',
+                    self.browser_switch,
                 ],
             )
 
@@ -152,15 +547,62 @@ class SchwabDownloader:
             self.browser = self.playwright.chromium.connect_over_cdp("http://localhost:9222")
         else:
             self.browser = self.playwright.chromium.launch(
-                headless=False,
+                headless=bool(self.args.get('--headless')),
+                args=[self.browser_switch],
             )
 
-        self.context = self.browser.new_context()
+        self.context = self.browser.new_context(storage_state=storage_state)
+        self.apply_blocking()
+
+    def new_page(self):
+        from playwright_stealth import Stealth
+
+        page = self.context.new_page()
+        Stealth().apply_stealth_sync(page)
+        return page
+
+    def apply_blocking(self):
+        """Route every request of the context through the --block-resources profile."""
+        if self.blocker.enabled:
+            self.context.route("**/*", self.blocker.handle)
+            self.context.on("response", self.blocker.on_response)
+        self.context.on("response", self.governor.on_response)
+
+    def open_session_store(self):
+        """Set up the encrypted session file, unless disabled or there is no secret to encrypt it with."""
+        if self.args.get('--no-session'):
+            return
+        secret = os.environ.get('SCHWAB_SESSION_KEY') or self.password
+        if not secret:
+            print("No SCHWAB_SESSION_KEY or password to encrypt the session with, not saving it")
+            return
+        self.session_store = SessionStore(self.args.get('--session') or '.schwab_session.enc', secret)
+
+    def load_session(self):
+        return self.session_store.load() if self.session_store else None
+
+    def save_session(self):
+        if self.session_store:
+            self.session_store.save(self.context.storage_state())
+
+    def resume_session(self):
+        """Check whether the saved session is still logged in, in which case login can be skipped."""
+        self.page = self.new_page()
+        self.page.goto(self.summary_url)
+        try:
+            self.waiter.for_selector('session-check', self.page, SECONDARY_NAV_SELECTOR, timeout=10000)
+            if self.page.url.startswith(self.summary_url):
+                print("Reusing saved session")
+                return True
+        except Exception:
+            pass
+        print("Saved session has expired, logging in")
+        self.page.close()
+        return False
 
     def login(self):
-        self.page = self.context.new_page()
-        Stealth().apply_stealth_sync(self.page)
-        self.page.goto("https://www.schwab.com/")
+        self.page = self.new_page()
+        self.page.goto(self.login_url)
 
         # Store frame locator once for efficiency
         frame = self.page.frame_locator("iframe[title=\"log in form\"]")
@@ -173,44 +615,73 @@ class SchwabDownloader:
 
         frame.get_by_label("Remember Login ID").check()
 
-        self.sleep()
+        self.waiter.pause('login-form')
 
         if self.id and self.password:
+            login_page_url = self.page.url
             frame.get_by_role("button", name="Log in").click()
-            self.sleep()
-
-            # Check if we're on the identity confirmation page
-            if "Confirm Your Identity" in self.page.title():
-                print("\n2FA REQUIRED: Enter your security code and click Continue")
-        else:
-            print("No credentials provided, waiting for user to enter credentials")
+            self.leave_login_page(login_page_url)
 
+        prompt = self.login_prompt(self.page.title())
+        if prompt:
+            print(prompt)
         print("Waiting for verification...")
 
         # Wait for navigation to the account summary page
-        self.page.wait_for_url('https://client.schwab.com/clientapps/accounts/summary/', timeout=0)
+        self.waiter.for_url('login-verify', self.page, self.summary_url, timeout=0)
 
         print("Verification completed! Continuing...")
-        self.sleep()
+        self.waiter.for_selector('login-ready', self.page, SECONDARY_NAV_SELECTOR)
+
+    def login_prompt(self, title):
+        """What the user has to do to finish logging in, from the page's title once the form is submitted."""
+        if not (self.id and self.password):
+            return "No credentials provided, waiting for user to enter credentials"
+        if "Confirm Your Identity" in title:
+            return "\n2FA REQUIRED: Enter your security code and click Continue"
+        return None
+
+    def leave_login_page(self, login_page_url):
+        """Wait for the login form to navigate away, to the summary or a verification page."""
+        try:
+            self.waiter.for_url('login-submit', self.page, lambda url: url != login_page_url)
+        except Exception:
+            pass  # Still on the form, e.g. the password was rejected; waiting for the summary page takes over
 
     def navigate_to_statements(self):
         # Click on any link with "Statements" in it
-        statements_link = self.page.query_selector('nav[aria-label="secondary level"] a[href*="Statements"]')
+        statements_link = self.page.query_selector(f'{SECONDARY_NAV_SELECTOR} a[href*="Statements"]')
         if statements_link:
             statements_link.click()
-            self.page.wait_for_url('https://client.schwab.com/app/Accounts/Statements/#/', timeout=0)
+            self.page.wait_for_url(f'{self.client_url}/app/Accounts/Statements/#/', timeout=0)
         else:
             # Fallback to the original method if "Statements" link not found
             self.page.get_by_label("secondary level").get_by_role("link", name="Statements & Tax Forms").click()
-            self.page.wait_for_url('https://client.schwab.com/app/accounts/statements/#/', timeout=0)
-        self.sleep()
+            self.page.wait_for_url(f'{self.client_url}/app/accounts/statements/#/', timeout=0)
+        self.waiter.for_selector('navigate-statements', self.page, '.sdps-account-selector')
+
+    def is_site_response(self, response):
+        """A JSON response of the site's own API, such as the results of a search."""
+        return (
+            response.request.resource_type in ('xhr', 'fetch')
+            and 'json' in response.headers.get('content-type', '')
+            and self.governor.site_hosts.search(urlparse(response.url).hostname or '') is not None
+        )
+
+    def capture_history_response(self, response):
+        if is_history_response(response):
+            self.history_responses.append(response)
 
     def navigate_to_history(self):
+        if self.history_source == 'api' and self.capture_page is not self.page:
+            # Only store the responses here, their bodies are read once the table has loaded
+            self.page.on("response", self.capture_history_response)
+            self.capture_page = self.page
         self.page.get_by_label("secondary level").get_by_role("link", name="Transaction History").click()
-        self.page.wait_for_url('https://client.schwab.com/app/accounts/history/#/', timeout=0)
-        self.sleep()
+        self.page.wait_for_url(f'{self.client_url}/app/accounts/history/#/', timeout=0)
+        self.waiter.for_selector('navigate-history', self.page, '.sdps-account-selector')
 
-    def load_accounts_from_cache(self):
+    def load_accounts_from_cache(self, quiet=False):
         """Load accounts from cache file if it exists and is valid."""
         if not os.path.exists(self.cache_file):
             print(f"Cache file {self.cache_file} does not exist")
@@ -236,8 +707,9 @@ class SchwabDownloader:
                     return False
 
             self.accounts = cache_data
-            print(f"Loaded {len(self.accounts)} accounts from cache file {self.cache_file}")
-            print(json.dumps(self.accounts, indent=2))
+            if not quiet:
+                print(f"Loaded {len(self.accounts)} accounts from cache file {self.cache_file}")
+                print(json.dumps(self.accounts, indent=2))
             return True
 
         except (json.JSONDecodeError, IOError) as e:
@@ -272,88 +744,149 @@ class SchwabDownloader:
         self.accounts = {}
 
         # Wait for the "More" buttons to be present before querying
-        self.page.wait_for_selector(
-            "xpath=//button[contains(@aria-label, 'More account details overlay')]", timeout=30000
-        )
+        self.page.wait_for_selector(MORE_BUTTON_XPATH, timeout=30000)
 
-        # Find all "More" buttons for accounts
-        more_buttons = self.page.query_selector_all(
-            "xpath=//button[contains(@aria-label, 'More account details overlay')]"
-        )
+        try:
+            dialogs = self.evaluate_account_dialogs()
+        except Exception as e:
+            print("Reading the account details dialogs in one pass failed, reading them one by one:", e)
+            dialogs = self.read_account_dialogs()
+        self.accounts_from_dialogs(dialogs)
+
+    def accounts_from_dialogs(self, dialogs):
+        """Set the accounts from the labeled values of their details dialogs."""
+        for details in dialogs:
+            account = self.account_from_details(*(self.detail_value(details, label) for label in DETAIL_LABELS))
+            self.accounts[account['number']] = account
 
+        print(json.dumps(self.accounts, indent=2))
+
+    def evaluate_account_dialogs(self):
+        """Read the labeled values of every account's details dialog in as few round trips as the dialogs allow."""
+        dialogs, start = [], 0
+        while start is not None:
+            result = self.page.evaluate(ACCOUNT_DETAILS_JS, [MORE_BUTTON_SELECTOR, DETAILS_BODY_SELECTOR, start])
+            dialogs += result['accounts']
+            start = result['next']
+            if start is not None:
+                self.close_account_dialog()
+        return dialogs
+
+    def close_account_dialog(self):
+        """Close the open details dialog with a real Escape key press and wait until it is gone."""
+        self.page.keyboard.press("Escape")
+        self.waiter.for_selector('account-details-close', self.page, DETAILS_BODY_SELECTOR, state="hidden")
+
+    def read_account_dialogs(self):
+        """Open the details dialog of every account and read its labeled values, one round trip at a time."""
+        dialogs = []
+        more_buttons = self.page.query_selector_all(MORE_BUTTON_XPATH)
         for more_button in more_buttons:
-            # Click the "More" button to open the dialog
             more_button.click()
-            self.sleep()
-
-            # Wait for the dialog to appear and extract account information
-            dialog = self.page.query_selector("#accountdetailsoverlay-modal-body")
-
-            # Extract account name from the label-value item with "Name" label
-            #   For EAC this will be the company name
-            #   For other accounts this will be the account name (alias that the user has set)
-            name_item = dialog.query_selector(
-                "xpath=.//sdps-list-label-value-item[.//span[contains(text(), 'Name')]]//div[@slot='value']"
+            self.waiter.for_selector(
+                'account-details', self.page, f"{DETAILS_BODY_SELECTOR} sdps-list-label-value-item"
             )
-            account_name = name_item.inner_text().strip() if name_item else "Unknown"
-
-            # Extract account number from the label-value item with "Account Number" label
-            account_number_item = dialog.query_selector(
-                "xpath=.//sdps-list-label-value-item[.//span[contains(text(), 'Account Number')]]//div[@slot='value']"
-            )
-            account_number_text = account_number_item.inner_text().strip() if account_number_item else "Unknown"
-
-            # Extract account number - handle all formats:
-            # 1. "440044196739 Schwab Bank" -> extract "440044196739"
-            # 2. "6206-8621" -> extract "6206-8621"
-            # 3. "1952-1651 DAFgiving360" -> extract "1952-1651"
-            import re
-
-            account_match = re.search(r'[\d-]+', account_number_text)
-            account_number = account_match.group(0) if account_match else "Unknown"
-
-            # Extract account type from the label-value item with "Type" label
-            type_item = dialog.query_selector(
-                "xpath=.//sdps-list-label-value-item[.//span[contains(text(), 'Type')]]//div[@slot='value']"
-            )
-            account_type_text = type_item.inner_text().strip() if type_item else "Unknown"
-
-            # Extract "Companies" from the label-value item with "Companies" label, if present
-            companies_item = dialog.query_selector(
-                "xpath=.//sdps-list-label-value-item[.//span[contains(text(), 'Companies')]]//div[@slot='value']"
-            )
-            companies_text = companies_item.inner_text().strip() if companies_item else None
-            if companies_text:
-                account_type = "EAC"
-                account_name = "Equity Award Center"
-                account_number = "EAC" + companies_text.replace(" ", "")
-            elif 'DAF' in account_type_text:
-                account_type = "DAF"
-            elif account_type_text == "Checking":
-                account_type = "bank"
-            elif account_type_text == "Brokerage":
-                account_type = "brokerage"
-            else:
-                account_type = account_type_text
-
-            # Store the account information
-            self.accounts[account_number] = {
-                "number": account_number,
-                "name": account_name,
-                "type": account_type,
-            }
+            dialog = self.page.query_selector(DETAILS_BODY_SELECTOR)
+
+            details = {}
+            for label in DETAIL_LABELS:
+                item = dialog.query_selector(DETAIL_VALUE_XPATH.format(label))
+                if item:
+                    details[label] = item.inner_text().strip()
+                    item.dispose()
+            dialog.dispose()
+            dialogs.append(details)
+
+            self.close_account_dialog()
+        dispose(more_buttons)
+        return dialogs
+
+    @staticmethod
+    def detail_value(details, label):
+        """Value of the first item whose label contains label, as the details dialog XPath matches it."""
+        return next((value for item_label, value in details.items() if label in item_label), None)
+
+    @staticmethod
+    def account_from_details(account_name, account_number_text, account_type_text, companies_text):
+        """Build an account record from the text of its details dialog."""
+        # Account name from the "Name" item
+        #   For EAC this will be the company name
+        #   For other accounts this will be the account name (alias that the user has set)
+        account_name = account_name or "Unknown"
+
+        # Extract account number - handle all formats:
+        # 1. "440044196739 Schwab Bank" -> extract "440044196739"
+        # 2. "6206-8621" -> extract "6206-8621"
+        # 3. "1952-1651 DAFgiving360" -> extract "1952-1651"
+        account_match = re.search(r'[\d-]+', account_number_text or "Unknown")
+        account_number = account_match.group(0) if account_match else "Unknown"
+
+        account_type_text = account_type_text or "Unknown"
+
+        # "Companies" is only present for EAC accounts
+        if companies_text:
+            account_type = "EAC"
+            account_name = "Equity Award Center"
+            account_number = "EAC" + companies_text.replace(" ", "")
+        elif 'DAF' in account_type_text:
+            account_type = "DAF"
+        elif account_type_text == "Checking":
+            account_type = "bank"
+        elif account_type_text == "Brokerage":
+            account_type = "brokerage"
+        else:
+            account_type = account_type_text
 
-            # Close the dialog
-            self.page.keyboard.press("Escape")
+        return {
+            "number": account_number,
+            "name": account_name,
+            "type": account_type,
+        }
 
-        print(json.dumps(self.accounts, indent=2))
-
-    def process_accounts(self, fn_account_selector: callable, fn_process_row: callable, fn_click_save: callable):
+    def process_accounts(self, phase: str):
         for _, account in self.accounts.items():
-            print("Processing account", json.dumps(account, indent=2))
+            self.log("Processing account", json.dumps(account, indent=2))
+            self.process_account(phase, account)
+
+    def process_account(self, phase, account):
+        """Process one account's phase, retrying from its last checkpoint when it fails."""
+        fn_navigate, fn_account_selector, fn_process_row, fn_click_save = self.phases()[phase]
+        checkpoint = self.checkpoint(account, phase)
+        if checkpoint and checkpoint['done']:
+            self.log(f"Skipping {phase} for account {account['number']}, done in the run being resumed")
+            return
+        attempt = 1
+        while attempt <= self.retries + 1:
+            try:
+                with self.tracer.context(account=account['number'], phase=phase):
+                    with self.tracer.span('select-account'):
+                        fn_account_selector(account)
+                    self.process_page(account, fn_process_row, fn_click_save, phase)
+                return
+            except RecycleNeeded as e:
+                # Not a failure: continue from the checkpoint on the fresh page
+                self.recycle(e.kind, e.reason, fn_navigate)
+            except Exception as e:
+                self.log(
+                    f"Failed {phase} for account {account['number']} (attempt {attempt} of {self.retries + 1}): {e}"
+                )
+                self.downloads.drain()
+                self.recover(fn_navigate)
+                attempt += 1
+        self.log(f"Gave up on {phase} for account {account['number']}, --resume continues it from its checkpoint")
 
-            fn_account_selector(account)
-            self.process_page(account, fn_process_row, fn_click_save)
+    def recover(self, fn_navigate):
+        """Get back to the phase's search page after a failure, on a new page if the old one was closed."""
+        try:
+            if self.page.is_closed():
+                self.page = self.new_page()
+            else:
+                self.close_modal()
+            self.page.goto(self.summary_url)
+            self.waiter.for_selector('login-ready', self.page, SECONDARY_NAV_SELECTOR)
+            fn_navigate()
+        except Exception as e:
+            self.log("Could not recover the page:", e)
 
     def select_account(self, account):
         # Click account selector and select the target account
@@ -362,81 +895,180 @@ class SchwabDownloader:
         self.page.wait_for_selector(f"xpath=//a[.//span[contains(text(), '{account['name']}')]]", timeout=5000)
         # Click on the account option in the dropdown (more specific selector to target the link)
         self.page.query_selector(f"xpath=//a[.//span[contains(text(), '{account['name']}')]]").click()
-        self.sleep()
+        # The dropdown closes once the account is selected
+        self.waiter.for_selector(
+            'select-account',
+            self.page,
+            f"xpath=//a[.//span[contains(text(), '{account['name']}')]]",
+            state="hidden",
+            timeout=5000,
+        )
+
+    def select_date_range(self):
+        """Ask the site for start_date to end_date only, if a range was given and the site offers a custom range.
+
+        Returns whether the custom range was set.
+        """
+        if self.all_dates:
+            return False
+        custom = self.page.evaluate(CUSTOM_RANGE_JS)
+        if not custom:
+            return False
+        try:
+            self.page.select_option('#date-range-select-id', custom)
+            self.page.fill(FROM_DATE_SELECTOR, f"{self.start_date:%m/%d/%Y}", timeout=5000)
+            self.page.fill(TO_DATE_SELECTOR, f"{self.end_date:%m/%d/%Y}", timeout=5000)
+        except Exception as e:
+            self.log("Custom date range not available:", e)
+            return False
+        return True
+
+    def select_largest_page_size(self):
+        """Show as many rows per page as the table allows, so fewer pages need to be turned."""
+        select = self.page.locator(PAGE_SIZE_SELECTOR).first
+        # Only worth it, and only changes the table, if there is more than one page
+        if not select.count() or not self.page.locator("a[aria-label=\"Next\"]:visible").count():
+            return
+        largest = largest_page_size(select.evaluate(PAGE_SIZES_JS), select.input_value())
+        if largest:
+            signature = self.waiter.table_signature(self.page)
+            select.select_option(largest)
+            self.waiter.for_table_change('page-size', self.page, signature)
+            self.wait_for_table_load()
 
     def select_history_account(self, account):
         self.select_account(account)
-        if account['type'] == 'EAC':
-            self.page.select_option('#date-range-select-id', 'Previous 4 Years')
-        else:
-            self.page.select_option('#date-range-select-id', 'All')
-        search_button = self.page.query_selector('xpath=//button[contains(., "Search")]')
-        search_button.click()
-        self.sleep()
-        self.wait_for_table_load()
+        if not self.select_date_range():
+            self.page.select_option('#date-range-select-id', 'Previous 4 Years' if account['type'] == 'EAC' else 'All')
+        self.history_responses.clear()
+        self.run_search()
+        self.select_largest_page_size()
 
     def select_statements_account(self, account):
         self.select_account(account)
-        self.page.select_option('#date-range-select-id', 'Last 10 Years')
-        # Select all document type buttons (using aria-pressed attribute for precise targeting)
+        if not self.select_date_range():
+            self.page.select_option('#date-range-select-id', 'Last 10 Years')
+        # Press the selected document type buttons, all by default (aria-pressed for precise targeting)
         buttons = self.page.query_selector_all('xpath=//button[@aria-pressed]')
-        for button in buttons:
-            if button.get_attribute('aria-pressed') != 'true':
+        wanted = self.filters.doc_type_buttons([button.inner_text() for button in buttons])
+        for button, pressed in zip(buttons, wanted):
+            state = 'true' if pressed else 'false'
+            if button.get_attribute('aria-pressed') != state:
                 try:
                     # Use JavaScript click to avoid pointer event interception issues
                     self.page.evaluate('button => button.click()', button)
-                    self.sleep(0.5)
+                    self.waiter.for_function(
+                        'toggle-doc-type',
+                        self.page,
+                        f"button => button.getAttribute('aria-pressed') === '{state}'",
+                        button,
+                    )
                 except Exception:
                     continue
-        search_button = self.page.query_selector('xpath=//button[contains(., "Search")]')
-        search_button.click()
-        self.sleep()
+        dispose(buttons)
+        self.run_search()
+        self.select_largest_page_size()
+
+    def run_search(self):
+        """Click Search and wait for its response, then for the results to replace the previous table."""
+        signature = self.waiter.table_signature(self.page)
+        self.waiter.for_response(
+            'search', self.page, self.is_site_response, self.page.locator(SEARCH_BUTTON_XPATH).first.click
+        )
+        try:
+            # Bounded: a search can bring back the same rows, e.g. none again
+            self.page.wait_for_function(
+                TABLE_CHANGED_JS, arg=['tbody > tr', signature], timeout=self.waiter.idle_timeout
+            )
+        except Exception:
+            pass
         self.wait_for_table_load()
 
     def wait_for_table_load(self):
         """Wait for either table results to appear or "no results" message"""
-        try:
-            # Wait for either table rows or any "no results" message
-            self.page.wait_for_selector('tbody > tr, [data-testid*="no-"], .no-', timeout=5000)
-        except Exception:
-            # If timeout, check for any "No * Found" message
-            status_text = self.page.query_selector(
-                'xpath=//*[contains(text(), "No ") and contains(translate(text(), "FOUND", "found"), "found")]'
-            )
-            if not status_text:
-                raise Exception("Page failed to load table data")
+        with self.tracer.span('wait-table'):
+            try:
+                # Wait for either table rows or any "no results" message
+                self.page.wait_for_selector('tbody > tr, [data-testid*="no-"], .no-', timeout=5000)
+            except Exception:
+                # If timeout, check for any "No * Found" message
+                status_text = self.page.locator(
+                    'xpath=//*[contains(text(), "No ") and contains(translate(text(), "FOUND", "found"), "found")]'
+                )
+                if not status_text.count():
+                    raise Exception("Page failed to load table data")
 
-    def process_history_row(self, data_row, tds, account) -> (str, str, datetime):
-        tds_strs = [td.inner_text().strip() for td in tds]
-        tds_strs = ["" if td == "blank" else td for td in tds_strs]
-        tds_strs = [td.replace("\n", "") for td in tds_strs]  # remove all newlines from tds_strs
+    def extract_table_rows(self):
+        """Return all rows of the current result page as plain data: [{index, cells, buttons}]."""
+        return self.page.evaluate(TABLE_ROWS_JS)
 
+    def row_locator(self, index):
+        return self.page.locator("tbody > tr").nth(index)
+
+    def history_file_name(self, account, date, type_text, description_text, quantity_text, total, check_number):
+        """File name of a history transaction, from the text of its fields."""
         account_type = account["type"]
         account_nickname = account["name"].title().replace(" ", "").replace("/", "")
         if account_type == "EAC":
             account_number = account["number"]
         else:
             account_number = account["number"][-4:]
+
+        _type = "".join(type_text.title().split())
+        description = "".join(description_text.title().split()).replace("/", "")
+        quantity = "".join(quantity_text.title().split())
+        date_str = date.strftime("%Y%m%d")
+
+        if _type == "Check":
+            file_name = (
+                f"{self.target_dir}/schwab"
+                f"_{account_type}_{account_number}_{account_nickname}_{date_str}"
+                f"_{_type}_{total}_{check_number}.pdf"
+            )
+        elif total == "":
+            file_name = (
+                f"{self.target_dir}/schwab"
+                f"_{account_type}_{account_number}_{account_nickname}_{date_str}"
+                f"_{_type}_{quantity}shares_{description}.pdf"
+            )
+        else:
+            file_name = (
+                f"{self.target_dir}/schwab"
+                f"_{account_type}_{account_number}_{account_nickname}_{date_str}"
+                f"_{_type}_{total}_{description}.pdf"
+            )
+        return file_name
+
+    @staticmethod
+    def amount(text):
+        """Normalize an amount cell, e.g. "-$1,234.56" to "-1234.56"; blank stays blank."""
+        return text.replace("$", "").replace(",", "").strip()
+
+    def process_history_row(self, row, account) -> (str, str, datetime, dict):
+        tds_strs = ["" if td == "blank" else td for td in row["cells"]]
+        tds_strs = [td.replace("\n", "") for td in tds_strs]  # remove all newlines from tds_strs
+
+        account_type = account["type"]
         date = None
+        quantity = ""
+        check_number = ""
 
         if account_type in ["brokerage", "IRA", "DAF", "EAC"]:
             if len(tds_strs) != 7:
-                print("Data row:", data_row)
-                print("TDs:", tds)
+                print("Data row:", row)
                 print("Account:", account)
-                return None, None, None
-            if account_type == "EAC":
-                pass
+                return None, None, None, None
             date = datetime.strptime(tds_strs[0].split(" ")[0], "%m/%d/%Y")
-            _type = "".join(tds_strs[1].title().split())
-            description = "".join(tds_strs[2].title().split()).replace("/", "")
-            quantity = "".join(tds_strs[3].title().split())
+            _type = tds_strs[1]
+            description = tds_strs[2]
+            quantity = tds_strs[3]
             total = tds_strs[6].replace("$", "").replace(",", "").replace("-", "")
+            price, fees, amount = self.amount(tds_strs[4]), self.amount(tds_strs[5]), self.amount(tds_strs[6])
         elif account_type == "bank":
             date = datetime.strptime(tds_strs[0], "%m/%d/%Y")
-            _type = "".join(tds_strs[1].title().split())
+            _type = tds_strs[1]
             check_number = tds_strs[2]
-            description = "".join(tds_strs[3].title().split()).replace("/", "")
+            description = tds_strs[3]
 
             withdrawal = tds_strs[4].replace("$", "").replace(",", "").replace("-", "")
             deposit = tds_strs[5].replace("$", "").replace(",", "").replace("-", "")
@@ -445,44 +1077,35 @@ class SchwabDownloader:
                 total = deposit
             elif deposit == "":
                 total = withdrawal
+            price, fees, amount = "", "", f"-{withdrawal}" if withdrawal else deposit
 
         if date is None:
-            import ipdb
-
-            ipdb.set_trace()
-
-        date_str = date.strftime("%Y%m%d")
+            self.log("Unknown account type, skipping row:", account_type, row)
+            return None, None, None, None
 
-        if _type == "Check":
-            file_name = (
-                f"{TARGET_DIR}/schwab"
-                f"_{account_type}_{account_number}_{account_nickname}_{date_str}"
-                f"_{_type}_{total}_{check_number}.pdf"
-            )
-        elif total == "":
-            file_name = (
-                f"{TARGET_DIR}/schwab"
-                f"_{account_type}_{account_number}_{account_nickname}_{date_str}"
-                f"_{_type}_{quantity}shares_{description}.pdf"
-            )
-        else:
-            file_name = (
-                f"{TARGET_DIR}/schwab"
-                f"_{account_type}_{account_number}_{account_nickname}_{date_str}"
-                f"_{_type}_{total}_{description}.pdf"
-            )
+        file_name = self.history_file_name(account, date, _type, description, quantity, total, check_number)
 
-        details_link = data_row.query_selector("button")
+        # Selector of the details link within the row, resolved only if the row is saved
+        details_link = "button" if row["buttons"] else None
 
-        return file_name, details_link, date
+        record = {
+            'date': date,
+            'type': _type,
+            'description': description,
+            'quantity': quantity,
+            'price': price,
+            'fees': fees,
+            'amount': amount,
+            'check_number': check_number,
+        }
+        return file_name, details_link, date, record
 
-    def process_statements_row(self, data_row, tds, account) -> (str, str, datetime):
-        tds_strs = [td.inner_text().strip() for td in tds]
-        tds_strs = ["" if td == "blank" else td for td in tds_strs]
+    def process_statements_row(self, row, account) -> (str, str, datetime, dict):
+        tds_strs = ["" if td == "blank" else td for td in row["cells"]]
 
         # Skip the records of the 1099 dashboard, which is the annual summary
         if len(tds_strs) == 3:
-            return None, None, datetime(2000, 1, 1)
+            return None, None, datetime(2000, 1, 1), None
 
         account_type = account["type"]
         account_nickname = account["name"].title().replace(" ", "").replace("/", "")
@@ -500,132 +1123,836 @@ class SchwabDownloader:
         date_str = date.strftime("%Y%m%d")
 
         file_name = (
-            f"{TARGET_DIR}/schwab_{account_type}_{account_number}_{account_nickname}_{date_str}_{_type}_{doc_name}.pdf"
+            f"{self.target_dir}/schwab"
+            f"_{account_type}_{account_number}_{account_nickname}_{date_str}_{_type}_{doc_name}.pdf"
         )
 
-        details_link = data_row.query_selector("button:text('PDF')")
-        return file_name, details_link, date
+        has_pdf = any("pdf" in button.lower() for button in row["buttons"])
+        details_link = "button:text('PDF')" if has_pdf else None
+        record = {
+            'date': date,
+            'type': tds_strs[1],
+            'description': tds_strs[3].split("\n")[0].strip(),
+            'url': self.document_url(row),
+        }
+        return file_name, details_link, date, record
+
+    def page_start_date(self, account, phase):
+        """Date at which paging stops: start_date, or the account's high-water mark with --incremental."""
+        if not self.incremental:
+            return self.start_date
+        start_date = self.manifest.incremental_start(account['number'], phase, self.start_date, self.end_date)
+        if start_date > self.start_date:
+            self.log(f"Incremental {phase} for account {account['number']}: stopping at {start_date:%Y%m%d}")
+        return start_date
+
+    def record_saved(self, account, phase, date, file_name, record=None):
+        """Record a saved, or already present, document in the manifest, and queue it for the index."""
+        checksum = self.store.pop_checksum(file_name)
+        if checksum or not self.manifest.has(file_name):
+            self.manifest.record(account['number'], phase, date, file_name, checksum)
+        if self.indexer:
+            self.indexer.submit(account, phase, date, file_name, record)
+
+    def history_payloads(self):
+        payloads = []
+        for response in self.history_responses:
+            try:
+                payloads.append(response.json())
+            except Exception as e:
+                self.log("Unreadable history response", response.url, e)
+        return payloads
+
+    def history_transactions(self, account, payloads):
+        """Typed transactions of the account from history API payloads, each with its file name.
+
+        Names are numbered for repeats as the table's rows are, so that a transaction's name is the same either way;
+        the number is kept as its repeat.
+        """
+        transactions = transactions_from_payloads(payloads)
+        repeats = RepeatCounter()
+        for transaction in transactions:
+            file_name = self.history_file_name(
+                account,
+                transaction['date'],
+                transaction['type'],
+                transaction['description'],
+                transaction['quantity'],
+                transaction['total'],
+                transaction['check_number'],
+            )
+            transaction['file_name'], transaction['repeat'] = repeats.distinct(file_name, transaction['date'])
+        return transactions
+
+    def table_rows(self):
+        """The fewest rows the search's result table holds, told from its first page."""
+        return table_row_floor(len(self.extract_table_rows()), self.page.evaluate(PAGE_NUMBERS_JS, PAGER_SELECTOR))
+
+    def history_start_date(self, account, start_date, payloads, table_rows=0):
+        """With --history-source=api, the date to page the table back to: that of the oldest missing document.
+
+        Exports every transaction in range from the payloads.  Returns None if no document in range is missing,
+        having marked the account synced, and start_date, to scrape the whole table, if the payloads aren't
+        complete.  They are complete if there is at least one, none of them is paged (a total above its records,
+        or a next page marker), and they hold at least table_rows transactions, the fewest the table can have.
+        """
+        if not payloads:
+            self.log("No history API response captured, scraping the table instead")
+            return start_date
+        transactions = self.history_transactions(account, payloads)
+        incomplete = next(filter(None, map(truncation, payloads)), None)
+        if not incomplete and len(transactions) < table_rows:
+            incomplete = f"{len(transactions)} transactions, the table has at least {table_rows}"
+        if incomplete:
+            self.log(f"History API response is incomplete ({incomplete}), scraping the table instead")
+            return start_date
+
+        in_range = [
+            transaction
+            for transaction in transactions
+            if start_date <= transaction['date'] <= self.end_date and self.filters.wants_row('history', transaction)
+        ]
+        missing = []
+        for transaction in in_range:
+            self.export_row(account, 'history', transaction, transaction['file_name'], transaction['repeat'])
+            if self.store.has(transaction['file_name']):
+                self.record_saved(account, 'history', transaction['date'], transaction['file_name'], transaction)
+            else:
+                missing.append(transaction)
+        if self.exporter:
+            self.exporter.flush()
+        self.log(f"History API: {len(in_range)} transactions in range, {len(missing)} without a document")
+        if not missing:
+            self.save_checkpoint(account, 'history', 1, -1, done=True)
+            self.mark_synced(account, 'history', [])
+            return None
+        return max(start_date, min(transaction['date'] for transaction in missing))
+
+    def page_too_new(self, account, fn_process_row):
+        """Whether even the oldest row of the current page is after end_date (rows are sorted newest first)."""
+        dates = []
+        for row in self.extract_table_rows():
+            file_name, _, date, _ = fn_process_row(row, account)
+            if file_name:
+                dates.append(date)
+        return bool(dates) and min(dates) > self.end_date
+
+    def turn_page(self, link):
+        signature = self.waiter.table_signature(self.page)
+        link.click()
+        self.waiter.for_table_change('pagination', self.page, signature)
+        self.wait_for_table_load()
 
-    def process_page(self, account, fn_process_row: callable, fn_click_save: callable):
+    def go_to_page(self, number):
+        """Click the pager's link to a page number; returns whether it had one."""
+        signature = self.waiter.table_signature(self.page)
+        if not self.page.evaluate(GO_TO_PAGE_JS, [PAGER_SELECTOR, number]):
+            return False
+        self.waiter.for_table_change('pagination', self.page, signature)
+        self.wait_for_table_load()
+        return True
+
+    def restore_page(self, number):
+        """Page forward to result page number (see restore_steps); returns the number of the page reached."""
+        return self.follow_pager(restore_steps(number))
+
+    def seek_end_date(self, account, fn_process_row):
+        """Open the last result page after end_date (see seek_steps) and return its number."""
+        current = self.follow_pager(seek_steps(), account, fn_process_row)
+        if current > 1:
+            self.log(f"Skipped to result page {current}, the last one after {self.end_date:%Y%m%d}")
+        return current
+
+    def follow_pager(self, steps, account=None, fn_process_row=None):
+        """Carry out the pager steps of a paging decision on the page; returns the number of the page it leaves."""
+        answer = None
+        try:
+            while True:
+                answer = self.pager_step(steps.send(answer), account, fn_process_row)
+        except StopIteration as stop:
+            return stop.value
+
+    def pager_step(self, step, account, fn_process_row):
+        action, *arg = step
+        if action == 'too-new':
+            return self.page_too_new(account, fn_process_row)
+        if action == 'numbers':
+            return self.page.evaluate(PAGE_NUMBERS_JS, PAGER_SELECTOR) or []
+        if action == 'go':
+            return self.go_to_page(*arg)
+        link = self.page.locator(f"a[aria-label=\"{arg[0]}\"]:visible").first
+        if not link.count():
+            return False
+        self.turn_page(link)
+        return True
+
+    def process_page(self, account, fn_process_row: callable, fn_click_save: callable, phase: str):
+        start_date = self.page_start_date(account, phase)
+        if phase == 'history' and self.history_source == 'api':
+            start_date = self.history_start_date(account, start_date, self.history_payloads(), self.table_rows())
+            if start_date is None:
+                return
+        page_number, scan = self.start_page(account, fn_process_row, phase, start_date)
         first_page = True
-        done = False
-        while not done:
+        while not scan.done:
             if first_page:
                 first_page = False
             else:
-                # Find visible Next links using specific aria-label selector
-                next_links = self.page.query_selector_all("a[aria-label=\"Next\"]")
-                if not next_links:
+                # The first visible Next link, as a locator so no element handle outlives the page
+                next_link = self.page.locator("a[aria-label=\"Next\"]:visible").first
+                if not next_link.count():
                     break
+                page_number += 1
+                with self.tracer.span('paginate', page=page_number):
+                    self.turn_page(next_link)
+
+            saves = []
+            with self.tracer.context(page=page_number):
+                rows = self.extract_table_rows()
+                for row, file_name, details_link, date, record in self.rows_to_save(
+                    scan, rows, account, fn_process_row
+                ):
+                    with self.tracer.span('save', file=os.path.basename(file_name)) as span:
+                        saving = self.save_with_retries(
+                            fn_click_save, file_name, self.row_locator(row["index"]).locator(details_link).first, row
+                        )
+                        if saving:
+                            span['outcome'] = "background"
+                    self.follow_save(saving, account, phase, date, file_name, record, saves)
+            self.end_page(account, phase, scan, page_number, saves)
+            self.operations += 1 + len(saves)
+            if not scan.done:
+                self.check_memory(account, phase, scan.journal)
+
+        self.downloads.drain()
+        concurrent.futures.wait(scan.pending)
+        self.finish_scan(account, phase, scan)
+
+    def rows_to_save(self, scan, rows, account, fn_process_row):
+        """The rows of a result page the scan takes that have a document to save, once every row taken is exported."""
+
+        def parse(row):
+            with self.tracer.span('parse-row'):
+                return fn_process_row(row, account)
+
+        for row, file_name, details_link, date, record, repeat in scan.rows(rows, parse):
+            self.export_row(account, scan.phase, record, file_name, repeat)
+            if details_link:
+                yield row, file_name, details_link, date, record
+
+    def follow_save(self, saving, account, phase, date, file_name, record, saves):
+        """Record a finished save, or a background one (a Future or Task, added to saves) once it's done."""
+        if not saving:
+            self.record_saved(account, phase, date, file_name, record)
+            return
+        self.tracer.track('save-background', saving, file=os.path.basename(file_name))
+        saving.add_done_callback(lambda saving: self.on_saved(saving, account, phase, date, file_name, record))
+        saves.append(saving)
+
+    def end_page(self, account, phase, scan, page_number, saves):
+        """Journal a scanned result page, checkpoint the pages whose saves have succeeded and flush the export."""
+        scan.end_page(page_number, saves)
+        self.save_progress(account, phase, scan.journal)
+        if self.exporter:
+            self.exporter.flush()
+
+    def finish_scan(self, account, phase, scan):
+        """Once the scan's saves have all ended: checkpoint it done and mark it synced.
+
+        Unless a save failed: then it stays checkpointed before that save.
+        """
+        if any(self.save_failed(saving) for saving in scan.pending):
+            self.save_progress(account, phase, scan.journal)
+        else:
+            page_number, last_row, repeats = scan.position
+            self.save_checkpoint(account, phase, page_number, last_row, done=True, repeats=repeats)
+        self.mark_synced(account, phase, scan.pending)
 
-                # Find the first visible Next link
-                next_link = None
-                for link in next_links:
-                    # Check if the link is visible (not hidden)
-                    is_visible = link.evaluate("element => element.offsetParent !== null")
-                    if is_visible:
-                        next_link = link
-                        break
+    def export_row(self, account, phase, record, file_name, repeat=1):
+        """Stream a parsed row to the --export dataset, keyed by a stable identity (see row_key).
 
-                if not next_link:
-                    break
-                next_link.click()
-                self.sleep()
-                self.wait_for_table_load()
-
-            data_rows = self.page.query_selector_all("tbody > tr")
-            for data_row in data_rows:
-                tds = data_row.query_selector_all(":scope > td")
-                file_name, details_link, date = fn_process_row(data_row, tds, account)
-                if not details_link:
-                    continue
-                if date > self.end_date:
-                    continue
-                elif date < self.start_date:
-                    done = True
-                    break
-                fn_click_save(file_name, details_link)
+        repeat numbers identical rows apart: the same row is keyed alike every run, whether it came from the table
+        or the history API, and whatever the account's nickname.
+        """
+        if not self.exporter:
+            return
+        file_name = os.path.basename(file_name)
+        self.exporter.add(
+            dict(
+                record,
+                key=row_key(account['number'], phase, record, repeat),
+                phase=phase,
+                account=account['number'],
+                account_name=account['name'],
+                file_name=file_name,
+            )
+        )
 
-    def click_and_save(self, file_name, details_link):
-        if os.path.isfile(file_name):
-            print(f"File Exists [{file_name}]")
-        else:
-            print(f"File Saving [{file_name}]")
+    def checkpoint(self, account, phase):
+        return self.manifest.checkpoint(account['number'], phase, self.start_date, self.end_date)
 
-            with self.page.expect_download() as download_info:
-                details_link.click()
-            download = download_info.value
-            download.save_as(file_name)
+    def save_checkpoint(self, account, phase, page, row, done=False, repeats=None):
+        self.manifest.save_checkpoint(
+            account['number'], phase, self.start_date, self.end_date, page, row, done, repeats
+        )
 
-    def click_modal_and_save(self, file_name, details_link):
-        if os.path.isfile(file_name):
-            print(f"File Exists [{file_name}]")
-        else:
-            print(f"File Saving [{file_name}]")
+    def start_page(self, account, fn_process_row, phase, start_date):
+        """Open the result page to start from: the checkpointed one when resuming, else the last one after end_date.
+
+        Returns its number and the PageScan going on from it.
+        """
+        checkpoint = self.checkpoint(account, phase)
+        if not checkpoint:
+            with self.tracer.span('seek'):
+                return self.seek_end_date(account, fn_process_row), self.new_scan(phase, start_date)
+        with self.tracer.span('restore', page_number=checkpoint['page']):
+            page_number = self.restore_page(checkpoint['page'])
+        self.log(f"Resuming {phase} for account {account['number']} at result page {page_number}")
+        return page_number, self.new_scan(phase, start_date, checkpoint if page_number == checkpoint['page'] else None)
+
+    def new_scan(self, phase, start_date, checkpoint=None):
+        """A PageScan of the phase down to start_date; with a checkpoint, going on after its row and repeat counts."""
+        if not checkpoint:
+            return PageScan(phase, start_date, self.end_date, self.filters)
+        return PageScan(
+            phase, start_date, self.end_date, self.filters, checkpoint['row'], RepeatCounter(checkpoint['repeats'])
+        )
+
+    def save_progress(self, account, phase, journal):
+        """Checkpoint the last page whose saves have all succeeded, so that a resumed run skips no unsaved row.
+
+        A failed save holds the checkpoint back, for a retry or a resumed run to go over its page again.
+        """
+        checkpoint = None
+        while journal and all(saving.done() and not self.save_failed(saving) for saving in journal[0][2]):
+            checkpoint = journal.pop(0)
+        if checkpoint:
+            page_number, last_row, _, repeats = checkpoint
+            self.save_checkpoint(account, phase, page_number, last_row, repeats=repeats)
+
+    def check_memory(self, account, phase, journal):
+        """Between result pages: raise RecycleNeeded if the page or context is due, once its saves are checkpointed."""
+        try:
+            self.memory.check(self.operations, self.browser_switch)
+        except RecycleNeeded:
+            self.downloads.drain()
+            self.save_progress(account, phase, journal)
+            raise
+
+    def recycle(self, kind, reason, fn_navigate):
+        """Replace the working page, or the whole context keeping its storage state, and get back to the phase."""
+        self.log(f"Recycling the {kind}: {reason}")
+        with self.tracer.span('recycle', kind=kind):
+            if kind == 'context':
+                storage_state = self.context.storage_state()
+                self.context.close()
+                self.context = self.browser.new_context(storage_state=storage_state)
+                self.apply_blocking()
+            else:
+                self.page.close()
+            self.memory.recycled(kind)
+            self.operations = 0
+            self.recover(fn_navigate)
+
+    @staticmethod
+    def save_failed(saving):
+        return saving.cancelled() or saving.exception() is not None
+
+    def save_with_retries(self, fn_click_save, file_name, details_link, row):
+        """Call fn_click_save, retrying when it fails.
+
+        Returns what it returns, or once out of retries a failed future, which is logged and recorded like a
+        failed background save.
+        """
+        for attempt in range(1, self.retries + 2):
+            try:
+                return fn_click_save(file_name, details_link, row)
+            except Exception as e:
+                self.log(f"File Failed [{file_name}] (attempt {attempt} of {self.retries + 1}): {e}")
+                error = e
+                self.discard_save(file_name)
+        failed = concurrent.futures.Future()
+        failed.set_exception(error)
+        return failed
+
+    def discard_save(self, file_name):
+        """Undo a failed save: close its modal, remove what it wrote and release its file name."""
+        try:
+            self.close_modal()
+        except Exception:
+            pass
+        if self.coordinator.release(file_name) and os.path.exists(file_name):
+            os.remove(file_name)
+
+    def on_saved(self, saving, account, phase, date, file_name, record=None):
+        """Done callback of a background save (a Future or Task)."""
+        if self.save_failed(saving):
+            self.log(f"File Failed [{file_name}]: {'cancelled' if saving.cancelled() else saving.exception()}")
+            self.coordinator.release(file_name)  # So that a retry or resumed pass doesn't find it claimed
+            return
+        self.record_saved(account, phase, date, file_name, record)
+
+    def mark_synced(self, account, phase, pending):
+        """Every row in range has been seen, so the account's phase is synced for the whole date range.
 
+        Unless a background save failed, in which case the next incremental run must look at it again, or rows
+        were filtered out by type.
+        """
+        if any(self.save_failed(saving) for saving in pending):
+            self.log(f"Not marking {phase} for account {account['number']} as synced, some saves failed")
+            return
+        if self.filters.narrows(phase):
+            return  # Rows of the other types were left out, they are still to be synced
+        self.manifest.mark_synced(account['number'], phase, self.start_date, self.end_date)
+
+    def should_save(self, file_name):
+        """Return whether file_name still needs saving, claiming it for this worker if so."""
+        if self.store.has(file_name):
+            self.log(f"File Exists [{file_name}]")
+            return False
+        if os.path.isfile(file_name):
+            self.log(f"File Incomplete, saving it again [{file_name}]")
+        if not self.coordinator.claim(file_name):
+            self.log(f"File Claimed by another worker [{file_name}]")
+            return False
+        self.log(f"File Saving [{file_name}]")
+        return True
+
+    @staticmethod
+    def document_url(row):
+        """Return the URL of the row's PDF, if the row exposes one."""
+        for link in (row or {}).get("links", []):
+            if "pdf" in link["text"].lower() or ".pdf" in link["url"].lower():
+                return link["url"]
+        return None
+
+    def request_headers(self, url):
+        """Headers that make a plain HTTP request look like it comes from the browser session."""
+        if not self.user_agent:
+            self.user_agent = self.page.evaluate("navigator.userAgent")
+        return session_headers(self.context.cookies(url), self.user_agent, self.page.url)
+
+    def save_source(self, file_name, row, fetching):
+        """Whether file_name is to be saved, claiming it if so, and the URL to fetch it from (None to click for it).
+
+        Returns (False, None) when it is saved already, claimed by another worker, or linked to the same
+        document another account downloaded.
+        """
+        url = self.document_url(row) if fetching else None
+        if not self.should_save(file_name):
+            return False, None
+        if self.store.link_source(url, file_name):
+            self.log(f"File Linked to the same document of another account [{file_name}]")
+            return False, None
+        return True, url
+
+    def click_and_save(self, file_name, details_link, row=None):
+        wanted, url = self.save_source(file_name, row, self.fetcher is not None)
+        if not wanted:
+            return None
+
+        if url:
+            # Fast path: fetch the document directly, in the background
+            return self.fetcher.submit(url, file_name, self.request_headers(url))
+
+        # The browser goes on downloading while the scan moves on, the file is saved once the queue is full
+        with self.waiter.for_download('download', self.page) as download_info:
             details_link.click()
-            time.sleep(5)
+        download = download_info.value
+
+        def save(attempt):
+            if attempt > 1 and download.url.startswith(('http://', 'https://')):
+                # A failed download can't be saved again, so retries fetch its URL anew
+                headers = self.request_headers(download.url)
+                return self.store.save(
+                    file_name, lambda path: stream_document(download.url, path, headers, self.governor), download.url
+                )
+            return self.store.save(file_name, download.save_as, download.url)
 
-            print_link = self.page.query_selector("button#print-icon-button")  # Trade Details
-            if not print_link:
-                print_link = self.page.query_selector("a.print-link")  # Wire Details
-            if not print_link:
-                print_link = self.page.query_selector("a.linkPrint")  # Check Details
-            if not print_link:
-                ipdb.set_trace()
+        return self.downloads.add(lambda: with_retries(save, self.retries, file_name, self.log))
 
+    def click_modal_and_save(self, file_name, details_link, row=None):
+        if not self.should_save(file_name):
+            return
+
+        # Check images load with the modal and are printed with it
+        with self.blocker.saving_document():
+            details_link.click()
             try:
-                self.page.pdf(
-                    path=file_name,
+                self.waiter.for_selector('details-modal', self.page, PRINT_LINK_SELECTOR)
+            except Exception:
+                pass  # Fall through to the per-modal lookups below
+
+            if self.render_pool and self.render_pool.alive:
+                # Snapshot the modal and close it right away, the PDF is rendered in the background
+                snapshot = self.page.evaluate(SNAPSHOT_JS, PRINT_LINK_SELECTOR)
+                if snapshot:
+                    self.close_modal()
+                    document = snapshot_document(snapshot, PRINT_LINK_SELECTOR)
+                    return self.render_pool.submit(document, file_name, self.context.storage_state)
+
+            # Trade, wire or check details; counted rather than queried, so no element handle is left per modal
+            if not self.page.locator(PRINT_LINK_SELECTOR).count():
+                raise Exception("No print link in the details modal")
+
+            self.store.save(
+                file_name,
+                lambda path: self.page.pdf(
+                    path=path,
                     format="Letter",
                     margin={"top": ".5in", "right": ".5in", "bottom": ".5in", "left": ".5in"},
                     page_ranges="1",  # page.pdf is generating 5 pages instead of 1... work around it
-                )
-                self.sleep()
-            except Exception as e:
-                print("Save Page failed", e)
-                ipdb.set_trace()
+                ),
+            )
+            self.close_modal()
 
-            # Close the Modal
-            self.page.keyboard.press('Escape')
+    def close_modal(self):
+        self.page.keyboard.press('Escape')
+        try:
+            self.waiter.for_selector('details-close', self.page, PRINT_LINK_SELECTOR, state="hidden", timeout=5000)
+        except Exception:
+            pass
+
+    def phases(self):
+        """Map each phase to its (navigate, account selector, row parser, saver) functions."""
+        return {
+            'history': (
+                self.navigate_to_history,
+                self.select_history_account,
+                self.process_history_row,
+                self.click_modal_and_save,
+            ),
+            'statements': (
+                self.navigate_to_statements,
+                self.select_statements_account,
+                self.process_statements_row,
+                self.click_and_save,
+            ),
+        }
+
+    def process_jobs(self, jobs):
+        """Take (phase, account) jobs off the shared queue until it is empty."""
+        current_phase = None
+        while True:
+            try:
+                phase, account = jobs.get_nowait()
+            except queue.Empty:
+                return
+            if phase != current_phase:
+                self.phases()[phase][0]()
+                current_phase = phase
+            self.log(f"Processing {phase} for account", json.dumps(account, indent=2))
+            self.process_account(phase, account)
+
+    def run_worker(self, number, storage_state, jobs):
+        """Worker thread: its own Playwright and browser, authenticated with the main context's storage state.
+
+        The sync Playwright API can't be shared across threads, so each worker drives its own browser.
+        """
+        from playwright.sync_api import sync_playwright
+
+        try:
+            with sync_playwright() as playwright:
+                worker = SchwabDownloader(
+                    playwright, dict(self.args, **{'--remote-debug': False}), self.coordinator, f"worker {number}"
+                )
+                worker.start_date, worker.end_date, worker.accounts = self.start_date, self.end_date, self.accounts
+                worker.all_dates = self.all_dates
+                worker.target_dir = self.target_dir
+                worker.filters = self.filters
+                worker.manifest = self.manifest
+                worker.store = self.store
+                worker.exporter = self.exporter
+                worker.fetcher = self.fetcher
+                worker.render_pool = self.render_pool
+                worker.indexer = self.indexer
+                worker.blocker = self.blocker
+                worker.tracer = self.tracer
+                worker.memory = self.memory
+                worker.governor = worker.waiter.governor = self.governor
+                worker.launch_browser(storage_state=storage_state)
+                worker.page = worker.new_page()
+                worker.page.goto(self.summary_url)
+                worker.waiter.for_selector('login-ready', worker.page, SECONDARY_NAV_SELECTOR)
+                try:
+                    worker.process_jobs(jobs)
+                finally:
+                    worker.close()
+                    with self.coordinator.lock:
+                        self.waiter.merge(worker.waiter)
+        except Exception as e:
+            self.coordinator.print(f"[worker {number}] failed, its remaining jobs go to the other workers: {e}")
+
+    def run_workers(self):
+        """Shard the history and statements work of every account across --workers browsers."""
+        jobs = queue.Queue()
+        for phase in self.filters.phases:
+            for account in self.accounts.values():
+                jobs.put((phase, account))
+
+        storage_state = self.context.storage_state()
+        threads = [
+            threading.Thread(target=self.run_worker, args=(number, storage_state, jobs), daemon=True)
+            for number in range(1, self.workers)
+        ]
+        for thread in threads:
+            thread.start()
+
+        # The main, already authenticated page is worker 0
+        self.name = "worker 0"
+        self.process_jobs(jobs)
+        for thread in threads:
+            thread.join()
 
     def close(self):
         self.context.close()
         self.browser.close()
 
-    def sleep(self):
-        # Add human latency
-        # Generate a random self.sleep time between 3 and 5 seconds
-        # self.sleep_time = random.uniform(1, 2)
-        # # self.sleep for the generated time
-        # time.sleep(self.sleep_time)
-        time.sleep(3)
-
     def run(self):
         print(self.args)
-        self.parse_credentials()
+        self.prepare_job()
+        self.start()
+        try:
+            self.sync()
+        finally:
+            self.finish()
+
+    def prepare_job(self):
+        """Read what to sync from the options: the date range, the filters and how to go about it."""
         self.parse_date_range()
-        self.ensure_target_dir(TARGET_DIR)  # Replace with the actual directory
-        self.launch_browser()
-        self.login()
-        self.load_accounts()
-        self.navigate_to_history()
-        self.process_accounts(self.select_history_account, self.process_history_row, self.click_modal_and_save)
-        self.navigate_to_statements()
-        self.process_accounts(self.select_statements_account, self.process_statements_row, self.click_and_save)
+        self.filters = WorkFilter.from_args(self.args)
+        self.incremental = self.args.get('--incremental', False)
+        self.resume = self.args.get('--resume', False)
+
+    def start(self):
+        """Open the manifest and the save pipeline, then log in and load the accounts."""
+        self.parse_credentials()
+        self.ensure_target_dir(self.target_dir)
+        self.open_manifest()
+        self.open_exporter()
+        self.open_fetcher()
+        self.open_render_pool()
+        self.open_indexer()
+        self.open_session_store()
+        storage_state = self.load_session()
+        self.launch_browser(storage_state=storage_state)
+        if not (storage_state and self.resume_session()):
+            with self.tracer.span('login'):
+                self.login()
+            self.save_session()
+        with self.tracer.span('load-accounts'):
+            self.load_accounts()
+        self.all_accounts = self.accounts
+
+    def sync(self):
+        """Process the selected accounts and phases, on the logged-in browser."""
+        if not self.resume:
+            self.manifest.clear_checkpoints()
+        self.accounts = self.filters.select_accounts(self.all_accounts)
+        if self.workers > 1:
+            self.run_workers()
+        else:
+            for phase in self.filters.phases:
+                self.phases()[phase][0]()
+                self.process_accounts(phase)
+        if self.exporter:
+            self.exporter.flush()
+        self.save_session()
+
+    def finish(self):
+        if self.fetcher:
+            self.fetcher.shutdown()
+        if self.render_pool:
+            self.render_pool.shutdown()
         self.close()
+        if self.indexer:
+            self.indexer.shutdown()
+        self.close_run()
+
+    def close_run(self):
+        """Once the browser is closed: keep the learned rates, close the manifest and export, and report."""
+        self.manifest.save_rates(self.governor.rates)
+        self.manifest.close()
+        if self.exporter:
+            self.exporter.close()
+        self.waiter.report()
+        self.blocker.report()
+        self.governor.report()
+        self.store.report()
+        if self.indexer:
+            self.indexer.report()
+        self.memory.sample()
+        self.memory.report()
+        self.report_trace()
+
+    def plan(self):
+        """--plan: print what a run would fetch, from the account cache and the manifest, without a browser."""
+        self.prepare_job()
+        if not self.load_accounts_from_cache(quiet=True):
+            print("A run would first load the accounts from the site, and process all of them")
+            return
+        accounts = self.filters.select_accounts(self.accounts)
+        manifest_path = self.args.get('--manifest') or '.schwab_manifest.sqlite'
+        self.manifest = Manifest(manifest_path) if os.path.exists(manifest_path) else None
+        print(
+            f"Plan: {self.start_date:%Y-%m-%d} to {self.end_date:%Y-%m-%d}"
+            f"{', incremental' if self.incremental else ''}{', resuming' if self.resume else ''},"
+            f" {len(accounts)} of {len(self.accounts)} accounts"
+        )
+        for phase in self.filters.phases:
+            types = self.filters.transaction_types if phase == 'history' else self.filters.doc_types
+            print(f"{phase}{' (types matching ' + ', '.join(types) + ')' if types else ''}:")
+            for account in accounts.values():
+                print(
+                    f"  {account['number']:<16} {account['type']:<10} {account['name'][:24]:<24}"
+                    f" {self.plan_account(account, phase)}"
+                )
+        if self.manifest:
+            self.manifest.close()
+
+    def plan_account(self, account, phase):
+        """What a run would do for an account's phase, as far as the manifest tells."""
+        if not self.manifest:
+            return f"back to {self.start_date:%Y-%m-%d}, nothing downloaded yet"
+        if self.resume:
+            checkpoint = self.checkpoint(account, phase)
+            if checkpoint and checkpoint['done']:
+                return "skipped, done in the run being resumed"
+        start_date = self.start_date
+        if self.incremental:
+            start_date = self.manifest.incremental_start(account['number'], phase, self.start_date, self.end_date)
+        count = self.manifest.document_count(account['number'], phase, self.start_date, self.end_date)
+        plan = f"back to {start_date:%Y-%m-%d}, {count} documents of the range already downloaded"
+        if self.resume and checkpoint:
+            plan += f", continuing at result page {checkpoint['page']}"
+        return plan
+
+    def keep_alive(self):
+        """Reload the account summary so the session doesn't time out, logging in again if it has."""
+        if self.page and not self.page.is_closed():
+            self.page.close()
+        if not self.resume_session():
+            with self.tracer.span('login'):
+                self.login()
+        self.save_session()
+
+    def serve(self):
+        """--daemon: log in once, then run the jobs later invocations submit, keeping the session warm between them."""
+        from schwab_downloader.daemon import KEEPALIVE, DaemonServer, JobQueue
+
+        jobs = JobQueue()
+        server = DaemonServer(int(self.args.get('--daemon-port') or 0), jobs)
+        daemon_args = self.args
+        self.start()
+        server.start()
+        try:
+            while True:
+                job = jobs.next(KEEPALIVE)
+                if not job:
+                    self.keep_alive()
+                    continue
+                print(f"Running job {job['id']}: {job['args']}")
+                self.args = dict(daemon_args, **job['args'])
+                try:
+                    self.prepare_job()
+                    self.keep_alive()
+                    self.sync()
+                except Exception as e:
+                    print(f"Job {job['id']} failed: {e}")
+                    jobs.update(job['id'], state='failed', error=str(e), finished=time.time())
+                else:
+                    jobs.update(job['id'], state='done', finished=time.time())
+                    print(f"Job {job['id']} done in {time.time() - job['started']:.0f}s")
+                finally:
+                    self.args = daemon_args
+        except KeyboardInterrupt:
+            print("Stopping the daemon")
+        finally:
+            server.stop()
+            self.finish()
+
+    def report_trace(self):
+        self.tracer.summary()
+        if self.args.get('--trace'):
+            self.tracer.write_jsonl(self.args['--trace'])
+        if self.args.get('--chrome-trace'):
+            self.tracer.write_chrome_trace(self.args['--chrome-trace'])
 
 
 def schwab_downloader():
-    # Load environment variables from .env file if needed
-    load_env_if_needed()
-
+    # Parse the options before importing anything heavy, so --help, --version and --plan stay fast
     args = docopt(__doc__)
-    print(args)
     if args['--version']:
         print(__version__)
         sys.exit(0)
+    try:
+        SchwabDownloader.check_options(args)
+    except ValueError as e:
+        sys.exit(str(e))
+
+    if args['search']:
+        try:
+            search(args)
+        except ValueError as e:
+            sys.exit(str(e))
+        return
+
+    if args['--plan']:
+        try:
+            SchwabDownloader(None, args).plan()
+        except ValueError as e:
+            sys.exit(str(e))
+        return
+
+    print(args)
+    # Load environment variables from .env file if needed
+    load_env_if_needed()
+
+    if args['--profiles']:
+        import asyncio
+
+        from schwab_downloader.async_engine import run_profiles
+
+        try:
+            sys.exit(0 if asyncio.run(run_profiles(args)) else 1)
+        except ValueError as e:
+            sys.exit(str(e))
+
+    if args['--daemon']:
+        from playwright.sync_api import sync_playwright
+
+        if args['--async']:
+            sys.exit("The daemon runs the sync engine, drop --async")
+        with sync_playwright() as playwright:
+            SchwabDownloader(playwright, args).serve()
+        return
+
+    if not args['--no-daemon']:
+        from schwab_downloader.daemon import DaemonClient, local_options
+
+        client = DaemonClient.connect()
+        unsupported = local_options(args, docopt(__doc__, argv=[])) if client else []
+        if unsupported:
+            print(f"Running here, not on the daemon at {client.url}: it can't apply {', '.join(unsupported)}")
+        elif client:
+            sys.exit(0 if client.run(args) else 1)
+
+    if args['--async']:
+        import asyncio
+
+        from schwab_downloader.async_engine import AsyncSchwabDownloader
+
+        try:
+            asyncio.run(AsyncSchwabDownloader(args).run())
+        except ValueError as e:
+            sys.exit(str(e))
+        return
+
+    from playwright.sync_api import sync_playwright
 
-    with sync_playwright() as playwright:
-        downloader = SchwabDownloader(playwright, args)
-        downloader.run()
+    try:
+        with sync_playwright() as playwright:
+            downloader = SchwabDownloader(playwright, args)
+            downloader.run()
+    except ValueError as e:
+        sys.exit(str(e))
@@ -0,0 +1,206 @@
+# SPDX-FileCopyrightText: 2023-present David C Wang <dcwangmit01@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+
+"""Daemon mode: one warm, logged-in browser taking sync jobs from later invocations over local HTTP."""
+
+import hmac
+import itertools
+import json
+import os
+import queue
+import secrets
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STATE_FILE = '.schwab_daemon.json'  # Port and token of the running daemon, readable by its user only
+
+# The options a job may set; everything else (browser, session, concurrency) is fixed when the daemon starts
+JOB_OPTIONS = (
+    '--year',
+    '--date-range',
+    '--accounts',
+    '--phases',
+    '--doc-types',
+    '--transaction-types',
+    '--incremental',
+    '--resume',
+)
+
+KEEPALIVE = 300  # Seconds without a job after which the session is touched, so it doesn't time out
+POLL = 2
+
+
+def job_args(args):
+    return {option: args.get(option) for option in JOB_OPTIONS}
+
+
+def local_options(args, defaults):
+    """Options set on the command line that a job can't carry, so the daemon would run without them."""
+    return sorted(
+        option
+        for option, value in args.items()
+        if option.startswith('--') and option not in JOB_OPTIONS + ('--no-daemon',) and value != defaults.get(option)
+    )
+
+
+class JobQueue:
+    """Jobs submitted over HTTP, run one at a time by the thread that owns the browser."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.jobs = {}
+        self.queue = queue.Queue()
+
+    def submit(self, args):
+        unknown = set(args) - set(JOB_OPTIONS)
+        if unknown:
+            raise ValueError(f"Options a job can't set: {', '.join(sorted(unknown))}")
+        with self.lock:
+            job = {'id': next(self.ids), 'args': args, 'state': 'queued', 'submitted': time.time()}
+            self.jobs[job['id']] = job
+        self.queue.put(job['id'])
+        return dict(job)
+
+    def get(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def next(self, timeout):
+        """The next queued job, marked running; None when none came within timeout seconds."""
+        try:
+            job_id = self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        return self.update(job_id, state='running', started=time.time())
+
+    def update(self, job_id, **fields):
+        with self.lock:
+            self.jobs[job_id].update(fields)
+            return dict(self.jobs[job_id])
+
+
+class DaemonServer(ThreadingHTTPServer):
+    """POST /jobs queues a job, GET /jobs/<id> reports it, GET /health answers while the daemon is up.
+
+    Bound to localhost, and every request must carry the token from the state file.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, port, jobs):
+        super().__init__(('127.0.0.1', port), DaemonHandler)
+        self.jobs = jobs
+        self.token = secrets.token_urlsafe(32)
+
+    def write_state(self):
+        # Only the current user may read the token, also when it replaces a file created otherwise
+        fd = os.open(STATE_FILE, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        os.fchmod(fd, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'pid': os.getpid(), 'port': self.server_address[1], 'token': self.token}, f)
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name='daemon-http', daemon=True).start()
+        self.write_state()
+        print(f"Daemon listening on http://127.0.0.1:{self.server_address[1]}, waiting for jobs")
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if os.path.exists(STATE_FILE):
+            os.remove(STATE_FILE)
+
+
+class DaemonHandler(BaseHTTPRequestHandler):
+    def authorized(self):
+        header = self.headers.get('Authorization', '')
+        return hmac.compare_digest(header.encode(), f"Bearer {self.server.token}".encode())
+
+    def reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if not self.authorized():
+            return self.reply(401, {'error': "bad token"})
+        if self.path == '/health':
+            return self.reply(200, {'ok': True})
+        job_id = self.path.removeprefix('/jobs/')
+        if job_id.isdigit():
+            job = self.server.jobs.get(int(job_id))
+            return self.reply(200, job) if job else self.reply(404, {'error': "no such job"})
+        self.reply(404, {'error': "not found"})
+
+    def do_POST(self):
+        if not self.authorized():
+            return self.reply(401, {'error': "bad token"})
+        if self.path != '/jobs':
+            return self.reply(404, {'error': "not found"})
+        try:
+            args = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+            job = self.server.jobs.submit(args)
+        except ValueError as e:  # Includes malformed JSON
+            return self.reply(400, {'error': str(e)})
+        self.reply(202, job)
+
+    def log_message(self, format, *args):
+        pass  # The daemon prints what its jobs do, not every poll
+
+
+class DaemonClient:
+    """Talks to the daemon described by the state file."""
+
+    def __init__(self, port, token):
+        self.url = f"http://127.0.0.1:{port}"
+        self.token = token
+
+    @classmethod
+    def connect(cls):
+        """A client of the running daemon, or None when there is none (or only a stale state file)."""
+        try:
+            with open(STATE_FILE) as f:
+                state = json.load(f)
+            client = cls(state['port'], state['token'])
+            client.request('GET', '/health', timeout=2)
+            return client
+        except (OSError, ValueError, KeyError):  # URLError and HTTPError are OSErrors
+            return None
+
+    def request(self, method, path, body=None, timeout=10):
+        request = urllib.request.Request(
+            self.url + path,
+            data=json.dumps(body).encode() if body is not None else None,
+            method=method,
+            headers={'Authorization': f"Bearer {self.token}", 'Content-Type': 'application/json'},
+        )
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.load(response)
+
+    def run(self, args):
+        """Submit a job and wait for it; returns whether it succeeded."""
+        try:
+            job = self.request('POST', '/jobs', job_args(args))
+        except urllib.error.HTTPError as e:
+            print(f"Daemon refused the job: {json.load(e).get('error')}")
+            return False
+        print(f"Submitted job {job['id']} to the daemon at {self.url}, its output is in the daemon's log")
+        state = job['state']
+        while job['state'] in ('queued', 'running'):
+            time.sleep(POLL)
+            job = self.request('GET', f"/jobs/{job['id']}")
+            if job['state'] != state:
+                state = job['state']
+                print(f"Job {job['id']} {state}")
+        if job['state'] == 'failed':
+            print(f"Job {job['id']} failed: {job.get('error')}")
+        return job['state'] == 'done'
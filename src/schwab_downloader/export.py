@@ -0,0 +1,203 @@
+# SPDX-FileCopyrightText: 2023-present David C Wang <dcwangmit01@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+
+"""Streaming export of every parsed history and statement row to a CSV, SQLite or Parquet dataset."""
+
+import abc
+import csv
+import glob
+import hashlib
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+# History rows fill the amount columns, statement rows the url; description is a statement's document name
+FIELDS = (
+    'key',
+    'phase',
+    'account',
+    'account_name',
+    'date',
+    'type',
+    'description',
+    'quantity',
+    'price',
+    'fees',
+    'amount',
+    'check_number',
+    'url',
+    'file_name',
+)
+
+COLUMN_TYPES = {'key': 'TEXT PRIMARY KEY', 'price': 'NUMERIC', 'fees': 'NUMERIC', 'amount': 'NUMERIC'}
+
+# The fields of a row that tell transactions apart, as the table and the history API both have them
+KEY_FIELDS = ('type', 'description', 'quantity', 'amount', 'check_number')
+
+
+def row_key(account_number, phase, record, repeat=1):
+    """Stable identity of a parsed row: a digest of the account number, phase, date and the row's fields.
+
+    Text is compared without case or whitespace; repeat is the row's number among identical rows (see
+    RepeatCounter), to key them apart.
+    """
+    fields = ["".join(str(record.get(field) or '').casefold().split()) for field in KEY_FIELDS]
+    parts = [account_number, phase, record['date'].strftime('%Y%m%d'), *fields, str(repeat)]
+    return hashlib.sha256("\x1f".join(parts).encode()).hexdigest()[:32]
+
+
+def open_exporter(path):
+    """Open the exporter for the dataset's format, told by its extension."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        return CsvExporter(path)
+    if extension in ('.sqlite', '.sqlite3', '.db'):
+        return SqliteExporter(path)
+    if extension == '.parquet':
+        return ParquetExporter(path)
+    raise ValueError(f"Unknown export format {extension!r}, use .csv, .sqlite or .parquet")
+
+
+class Exporter(abc.ABC):
+    """Appends rows to a dataset as they are parsed, skipping rows whose key it already holds.
+
+    Rows are written as they come and flushed after each result page, so nothing is buffered per account; only
+    the keys are kept, to make repeat runs append just the new rows.  Shared by all workers of a run.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.keys = set()
+        self.added = 0
+
+    @staticmethod
+    def values(record):
+        values = {field: record.get(field) or '' for field in FIELDS}
+        if isinstance(record.get('date'), datetime):
+            values['date'] = record['date'].strftime('%Y-%m-%d')
+        return values
+
+    def add(self, record):
+        with self.lock:
+            if record['key'] in self.keys:
+                return
+            self.keys.add(record['key'])
+            self.write(self.values(record))
+            self.added += 1
+
+    @abc.abstractmethod
+    def write(self, values):
+        """Append a row's values to the dataset; called with the lock held."""
+
+    def flush(self):
+        pass
+
+    def close(self):
+        print(f"Exported {self.added} new rows to {self.path}")
+
+
+class CsvExporter(Exporter):
+    def __init__(self, path):
+        super().__init__(path)
+        exists = os.path.isfile(path) and os.path.getsize(path) > 0
+        if exists:
+            with open(path, newline='') as f:
+                self.keys.update(row['key'] for row in csv.DictReader(f))
+        self.file = open(path, 'a', newline='')
+        self.writer = csv.DictWriter(self.file, fieldnames=FIELDS)
+        if not exists:
+            self.writer.writeheader()
+
+    def write(self, values):
+        self.writer.writerow(values)
+
+    def flush(self):
+        with self.lock:
+            self.file.flush()
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+        super().close()
+
+
+class SqliteExporter(Exporter):
+    """Rows go to a "transactions" table, committed after each result page; the key is its primary key."""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        columns = ", ".join(f"{field} {COLUMN_TYPES.get(field, 'TEXT')}" for field in FIELDS)
+        self.conn.execute(f"CREATE TABLE IF NOT EXISTS transactions ({columns})")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS transactions_account_date ON transactions (account, date)")
+
+    def add(self, record):
+        # The primary key skips known rows, no need to keep the keys in memory
+        with self.lock:
+            self.added += self.write(self.values(record))
+
+    def write(self, values):
+        """Insert the row unless its key is in the table; returns the number of rows inserted."""
+        cursor = self.conn.execute(
+            f"INSERT OR IGNORE INTO transactions VALUES ({', '.join('?' * len(FIELDS))})",
+            [values[field] or None for field in FIELDS],
+        )
+        return cursor.rowcount
+
+    def flush(self):
+        with self.lock:
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.commit()
+            self.conn.close()
+        super().close()
+
+
+class ParquetExporter(Exporter):
+    """Writes a dataset directory with one Parquet file per run, a row group per result page.
+
+    The file is written under a temporary name and renamed when the run closes it, so a killed run never leaves
+    a file without its footer in the dataset.  Needs pyarrow (pip install schwab-downloader[parquet]).
+    """
+
+    def __init__(self, path):
+        super().__init__(path)
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ValueError("Parquet export needs pyarrow: pip install 'schwab-downloader[parquet]'") from None
+        self.pa, self.pq = pa, pq
+        self.schema = pa.schema([(field, pa.string()) for field in FIELDS])
+        os.makedirs(path, exist_ok=True)
+        for part in glob.glob(os.path.join(path, '*.parquet')):
+            self.keys.update(pq.read_table(part, columns=['key']).column('key').to_pylist())
+        self.part = os.path.join(path, f"part-{datetime.now():%Y%m%d-%H%M%S}.parquet")
+        self.temp = self.part + '.tmp'
+        self.writer = None
+        self.rows = []
+
+    def write(self, values):
+        self.rows.append(values)
+
+    def flush(self):
+        with self.lock:
+            if not self.rows:
+                return
+            if not self.writer:
+                self.writer = self.pq.ParquetWriter(self.temp, self.schema)
+            self.writer.write_table(self.pa.Table.from_pylist(self.rows, schema=self.schema))
+            self.rows = []
+
+    def close(self):
+        self.flush()
+        with self.lock:
+            if self.writer:
+                self.writer.close()
+                os.replace(self.temp, self.part)
+        super().close()
@@ -0,0 +1,85 @@
+# SPDX-FileCopyrightText: 2023-present David C Wang <dcwangmit01@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+
+"""Direct HTTP fetch of documents with the browser session's cookies, a few at a time."""
+
+import shutil
+import time
+
+from schwab_downloader.governor import is_congestion_status
+from schwab_downloader.pipeline import BoundedExecutor, with_retries
+
+CHUNK_SIZE = 256 * 1024
+
+
+def check_pdf(path, url):
+    """Raise if the file at path doesn't start like a PDF (e.g. a login page served instead)."""
+    with open(path, 'rb') as f:
+        if f.read(5) != b'%PDF-':
+            raise ValueError(f"Not a PDF: {url}")
+
+
+def session_headers(cookies, user_agent, referer):
+    """Headers that make a plain HTTP request look like it comes from the browser session."""
+    return {
+        'Cookie': "; ".join(f"{cookie['name']}={cookie['value']}" for cookie in cookies),
+        'User-Agent': user_agent,
+        'Referer': referer,
+        'Accept': 'application/pdf,*/*',
+    }
+
+
+def stream_document(url, path, headers, governor):
+    """Stream url's document to path, paced by the governor; it blocks, so it runs on a thread."""
+    import urllib.error
+    import urllib.request
+
+    governor.acquire('fetch')
+    started = time.monotonic()
+    request = urllib.request.Request(url, headers=headers)
+    try:
+        with urllib.request.urlopen(request, timeout=120) as response, open(path, 'wb') as f:
+            shutil.copyfileobj(response, f, CHUNK_SIZE)
+    except urllib.error.HTTPError as e:
+        if is_congestion_status(e.code):
+            governor.congestion('fetch', f"HTTP {e.code}")
+        raise
+    except TimeoutError:
+        governor.congestion('fetch', "timeout")
+        raise
+    governor.success('fetch', time.monotonic() - started)
+    check_pdf(path, url)
+
+
+class DocumentFetcher:
+    """Downloads documents on a thread pool, streaming each response body straight to disk.
+
+    The sync Playwright API can't be used from other threads, so requests go through urllib with the
+    headers (cookies, user agent, referer) of the browser session, which the caller looks up.  A failed fetch
+    is retried on its thread up to retries times before its Future fails.
+    """
+
+    def __init__(self, limit, store, backlog, governor, retries=0, log=print):
+        self.executor = BoundedExecutor(limit, backlog, thread_name_prefix='fetch')
+        self.store = store
+        self.governor = governor
+        self.retries = retries
+        self.log = log
+
+    def submit(self, url, file_name, headers):
+        """Start fetching url into file_name, waiting while the backlog is full; returns a Future."""
+        return self.executor.submit(self.fetch, url, file_name, headers)
+
+    def fetch(self, url, file_name, headers):
+        with_retries(
+            lambda attempt: self.store.save(
+                file_name, lambda part: stream_document(url, part, headers, self.governor), url
+            ),
+            self.retries,
+            file_name,
+            self.log,
+        )
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
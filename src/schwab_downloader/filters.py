@@ -0,0 +1,120 @@
+# SPDX-FileCopyrightText: 2023-present David C Wang <dcwangmit01@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+
+"""Selection of the accounts, phases, document types and transaction types a run works on."""
+
+import os
+import re
+import tomllib
+
+PHASES = ('history', 'statements')
+
+# Keys of the config file's [filters] table, with the CLI option that overrides each
+FILTER_OPTIONS = {
+    'accounts': '--accounts',
+    'phases': '--phases',
+    'doc-types': '--doc-types',
+    'transaction-types': '--transaction-types',
+}
+
+
+def normalize(text):
+    """Lowercase letters and digits only, without a plural s: "Tax Forms" and "tax form" are both "taxform"."""
+    return re.sub(r's$', '', re.sub(r'[^a-z0-9]', '', (text or '').lower()))
+
+
+def split_list(value):
+    """A filter from the CLI ("a,b") or the config file (["a", "b"] or "a,b"); None when not set."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.split(',')
+    return [item.strip() for item in value if str(item).strip()]
+
+
+def load_config(path, quiet=False):
+    """The [filters] table of a TOML config file; empty when the file doesn't exist."""
+    if not path or not os.path.isfile(path):
+        return {}
+    with open(path, 'rb') as f:
+        filters = tomllib.load(f).get('filters', {})
+    unknown = set(filters) - set(FILTER_OPTIONS)
+    if unknown:
+        raise ValueError(f"Unknown filters in {path}: {', '.join(sorted(unknown))}")
+    if filters and not quiet:
+        print(f"Loaded filters from {path}: {filters}")
+    return filters
+
+
+class WorkFilter:
+    """Which work a run does, from the CLI options and the config file; the CLI wins where both set a filter.
+
+    Accounts and phases are selected before any navigation, and document types are the only ones toggled on in
+    the statements search, so excluded work never reaches the site.  Rows are checked again as they are parsed,
+    since a document or transaction type has no search filter of its own, or none matching the one asked for.
+    Every match is on normalized text: account numbers by their last digits, everything else by part of the text.
+    """
+
+    def __init__(self, accounts=None, phases=None, doc_types=None, transaction_types=None):
+        self.accounts = [normalize(account) for account in accounts or []]
+        unknown = set(phases or []) - set(PHASES)
+        if unknown:
+            raise ValueError(f"Unknown phases {', '.join(sorted(unknown))}, use {' or '.join(PHASES)}")
+        self.phases = tuple(phase for phase in PHASES if not phases or phase in phases)
+        self.doc_types = [normalize(doc_type) for doc_type in doc_types or []]
+        self.transaction_types = [normalize(transaction_type) for transaction_type in transaction_types or []]
+
+    @classmethod
+    def from_args(cls, args, quiet=False):
+        config = load_config(args.get('--config'), quiet)
+        values = {}
+        for key, option in FILTER_OPTIONS.items():
+            value = args.get(option)
+            values[key.replace('-', '_')] = split_list(config.get(key) if value is None else value)
+        return cls(**values)
+
+    def wants_account(self, account):
+        """Selected by its number (or the digits it ends with), or part of its name or type."""
+        if not self.accounts:
+            return True
+        number = normalize(account['number'])
+        return any(
+            number.endswith(pattern) or pattern in normalize(account['name']) or pattern in normalize(account['type'])
+            for pattern in self.accounts
+        )
+
+    def select_accounts(self, accounts):
+        if not self.accounts:
+            return accounts
+        selected = {number: account for number, account in accounts.items() if self.wants_account(account)}
+        if not selected:
+            raise ValueError(
+                "--accounts selects none of the accounts: "
+                + ", ".join(f"{number} ({account['name']}, {account['type']})" for number, account in accounts.items())
+            )
+        print(f"Selected {len(selected)} of {len(accounts)} accounts: {', '.join(selected)}")
+        return selected
+
+    @staticmethod
+    def matches(patterns, *texts):
+        return not patterns or any(pattern in normalize(text) for pattern in patterns for text in texts)
+
+    def doc_type_buttons(self, labels):
+        """Whether each of the statements search's document type buttons should be pressed.
+
+        All of them without a document type filter, or when none matches it (e.g. "1099" matches document
+        names, not a type): the rows are filtered as they are parsed then.
+        """
+        wanted = [self.matches(self.doc_types, label) for label in labels]
+        return wanted if any(wanted) else [True] * len(labels)
+
+    def wants_row(self, phase, record):
+        """Whether a parsed history or statements row is of a selected transaction or document type."""
+        if phase == 'history':
+            return self.matches(self.transaction_types, record.get('type'))
+        return self.matches(self.doc_types, record.get('type'), record.get('description'))
+
+    def narrows(self, phase):
+        """Whether rows of the phase are left out, so finishing it doesn't mean it is synced."""
+        return bool(self.transaction_types if phase == 'history' else self.doc_types)
@@ -0,0 +1,126 @@
+# SPDX-FileCopyrightText: 2023-present David C Wang <dcwangmit01@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+
+"""Adaptive (AIMD) pacing of browser actions and fetches, per endpoint, learned across runs."""
+
+import re
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlparse
+
+DEFAULT_RATE = 5.0  # Actions per second of an endpoint not seen before
+MIN_RATE = 0.05
+INCREASE = 1.0  # Added to the rate after each fast, error-free action
+DECREASE = 0.5  # Rate multiplier on a timeout, 429/5xx response or challenge page
+COOLDOWN = 2.0  # Seconds after a decrease in which further signals are the same congestion
+SLOW_FACTOR = 2.0  # An action this many times slower than the endpoint's average isn't "fast"
+
+# Bot checks and captchas served instead of the page
+CHALLENGE_URL = re.compile(r'captcha|challenge|are-you-human|bot-?detect|/distil', re.IGNORECASE)
+
+
+def is_congestion_status(status):
+    return status == 429 or status >= 500
+
+
+class RateGovernor:
+    """Paces every action of an endpoint (a wait step such as "pagination", or "fetch") to a learned rate.
+
+    Additive increase, multiplicative decrease: the rate grows while actions stay fast and error-free, and halves
+    on a timeout, an HTTP 429/5xx response or a challenge page.  A congested response from the site's own hosts
+    (site_hosts, a regex) slows every endpoint, as the site is telling us to back off as a whole.  Rates are
+    loaded from and saved to the manifest, so each run starts at what the site tolerated last time.  Shared by
+    all workers, so state is guarded by a lock.
+    """
+
+    def __init__(self, max_rate, site_hosts):
+        self.max_rate = max_rate
+        self.site_hosts = site_hosts
+        self.lock = threading.Lock()
+        self.rates = {}
+        self.next_start = defaultdict(float)
+        self.average = {}
+        self.cooldown_until = defaultdict(float)
+        self.backoffs = defaultdict(int)
+        self.delayed = defaultdict(float)
+
+    def load(self, rates):
+        """Start from the rates learned in earlier runs."""
+        with self.lock:
+            self.rates.update({endpoint: max(min(rate, self.max_rate), MIN_RATE) for endpoint, rate in rates.items()})
+
+    def rate(self, endpoint):
+        return self.rates.setdefault(endpoint, min(DEFAULT_RATE, self.max_rate))
+
+    def reserve(self, endpoint):
+        """Book the endpoint's next slot; returns the seconds to wait for it."""
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_start[endpoint])
+            self.next_start[endpoint] = start + 1 / self.rate(endpoint)
+            self.delayed[endpoint] += start - now
+            return start - now
+
+    def acquire(self, endpoint):
+        delay = self.reserve(endpoint)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self, endpoint):
+        import asyncio
+
+        delay = self.reserve(endpoint)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def success(self, endpoint, seconds):
+        """An action completed; speed up unless it was slow for this endpoint."""
+        with self.lock:
+            average = self.average.get(endpoint, seconds)
+            self.average[endpoint] = 0.8 * average + 0.2 * seconds
+            if seconds <= SLOW_FACTOR * average and time.monotonic() >= self.cooldown_until[endpoint]:
+                self.rates[endpoint] = min(self.rate(endpoint) + INCREASE, self.max_rate)
+
+    def back_off(self, endpoint):
+        """Halve an endpoint's rate, once per cooldown however many signals arrive; returns if it did."""
+        now = time.monotonic()
+        if now < self.cooldown_until[endpoint]:
+            return False
+        self.cooldown_until[endpoint] = now + COOLDOWN
+        self.rates[endpoint] = max(self.rate(endpoint) * DECREASE, MIN_RATE)
+        self.backoffs[endpoint] += 1
+        return True
+
+    def congestion(self, endpoint, reason):
+        with self.lock:
+            if not self.back_off(endpoint):
+                return
+            rate = self.rates[endpoint]
+        print(f"Rate governor: backing off {endpoint} to {rate:.2f}/s ({reason})")
+
+    def congestion_all(self, reason):
+        with self.lock:
+            count = sum(self.back_off(endpoint) for endpoint in list(self.rates))
+        if count:
+            print(f"Rate governor: backing off {count} endpoints ({reason})")
+
+    def on_response(self, response):
+        """Context "response" listener: the site's own congestion signals."""
+        if not self.site_hosts.search(urlparse(response.url).hostname or ''):
+            return
+        if is_congestion_status(response.status):
+            self.congestion_all(f"HTTP {response.status} from {response.url[:80]}")
+        elif CHALLENGE_URL.search(response.url):
+            self.congestion_all(f"challenge page {response.url[:80]}")
+
+    def report(self):
+        if not self.rates:
+            return
+        print("Rate governor (actions/s, learned per endpoint):")
+        for endpoint, rate in sorted(self.rates.items()):
+            print(
+                f"  {endpoint:<24} {rate:>6.2f}/s  {self.backoffs[endpoint]:>3} backoffs"
+                f"  {self.delayed[endpoint]:>7.1f}s paced"
+            )
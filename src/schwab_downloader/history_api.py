@@ -0,0 +1,167 @@
+# SPDX-FileCopyrightText: 2023-present David C Wang <dcwangmit01@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+
+"""Transactions from the JSON responses the history page loads, instead of its rendered table."""
+
+import re
+from datetime import datetime
+
+# Values of --history-source: the rendered table, or the JSON responses behind it
+HISTORY_SOURCES = ('table', 'api')
+
+# XHR calls of the history SPA that carry transactions
+HISTORY_API_PATTERN = re.compile(r'/api/.*(transaction|history)', re.IGNORECASE)
+
+# Field names seen in the payloads, in order of preference
+DATE_KEYS = ('transactionDate', 'tradeDate', 'date', 'postedDate', 'settlementDate')
+TYPE_KEYS = ('transactionType', 'action', 'type', 'actionType')
+DESCRIPTION_KEYS = ('description', 'securityDescription', 'transactionDescription')
+QUANTITY_KEYS = ('quantity', 'shares')
+PRICE_KEYS = ('price', 'executionPrice', 'pricePerShare')
+FEES_KEYS = ('fees', 'feesAndCommissions', 'commission')
+AMOUNT_KEYS = ('amount', 'netAmount', 'totalAmount', 'total')
+CHECK_KEYS = ('checkNumber', 'checkNo')
+WITHDRAWAL_KEYS = ('withdrawal', 'withdrawalAmount', 'debit')
+DEPOSIT_KEYS = ('deposit', 'depositAmount', 'credit')
+
+# Paging fields of a response: a total count, a flag for more records, a token or link to the next page
+TOTAL_KEYS = ('totalCount', 'totalRecords', 'totalTransactions', 'totalResults', 'recordCount')
+MORE_KEYS = ('hasMore', 'hasNextPage', 'moreRecords', 'moreAvailable', 'isTruncated')
+NEXT_KEYS = ('nextPage', 'nextPageToken', 'nextCursor', 'nextLink', 'next', 'continuationToken')
+
+
+def is_history_response(response):
+    content_type = response.headers.get('content-type', '')
+    return 'json' in content_type and HISTORY_API_PATTERN.search(response.url) is not None
+
+
+def _first(record, keys):
+    for key in keys:
+        value = record.get(key)
+        if value not in (None, ''):
+            return value
+    return None
+
+
+def _is_transaction(item):
+    return isinstance(item, dict) and _first(item, DATE_KEYS) is not None
+
+
+def find_records(payload):
+    """Return the largest list of transaction-like objects anywhere in a payload."""
+    best = []
+    stack = [payload]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            stack.extend(node.values())
+        elif isinstance(node, list):
+            records = [item for item in node if _is_transaction(item)]
+            if len(records) > len(best):
+                best = records
+            stack.extend(item for item in node if isinstance(item, (dict, list)))
+    return best
+
+
+def truncation(payload):
+    """Why a payload holds only part of its results, told by its paging fields, or None if nothing says so."""
+    found = len(find_records(payload))
+    stack = [payload]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(node)
+            continue
+        if not isinstance(node, dict) or _is_transaction(node):
+            continue
+        for key in TOTAL_KEYS:
+            total = node.get(key)
+            if isinstance(total, int) and not isinstance(total, bool) and total > found:
+                return f"{found} of {total} records"
+        for key in MORE_KEYS + NEXT_KEYS:
+            if node.get(key):
+                return f"{key} is set"
+        stack.extend(node.values())
+    return None
+
+
+def parse_date(value):
+    """Parse ISO ("2024-01-31T00:00:00") and US ("01/31/2024") dates."""
+    value = str(value).strip()
+    for fmt, length in (("%Y-%m-%d", 10), ("%m/%d/%Y", 10)):
+        try:
+            return datetime.strptime(value[:length], fmt)
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognized date: {value}")
+
+
+def format_amount(value):
+    """Format an amount the way the rendered table shows it, without "$", "," or sign: "1234.50"."""
+    if value in (None, ''):
+        return ""
+    if isinstance(value, str):
+        return value.replace("$", "").replace(",", "").replace("-", "").strip()
+    return f"{abs(float(value)):.2f}"
+
+
+def format_signed_amount(value):
+    """Format an amount keeping its sign, as the export has it: "-1234.50"."""
+    if value in (None, ''):
+        return ""
+    if isinstance(value, str):
+        return value.replace("$", "").replace(",", "").strip()
+    return f"{float(value):.2f}"
+
+
+def format_quantity(value):
+    if value in (None, ''):
+        return ""
+    if isinstance(value, str):
+        return value.strip()
+    return f"{float(value):g}"
+
+
+def transaction_from_record(record):
+    """Map one payload record to a typed transaction dict.
+
+    total is unsigned, as in file names; price, fees and the signed amount are what the table's export row has.
+    """
+    withdrawal = format_amount(_first(record, WITHDRAWAL_KEYS))
+    deposit = format_amount(_first(record, DEPOSIT_KEYS))
+    total = format_amount(_first(record, AMOUNT_KEYS))
+    amount = format_signed_amount(_first(record, AMOUNT_KEYS))
+    if not total:
+        total = deposit if not withdrawal else withdrawal if not deposit else ""
+        amount = f"-{withdrawal}" if withdrawal else deposit
+    return {
+        'date': parse_date(_first(record, DATE_KEYS)),
+        'type': str(_first(record, TYPE_KEYS) or ""),
+        'description': str(_first(record, DESCRIPTION_KEYS) or ""),
+        'quantity': format_quantity(_first(record, QUANTITY_KEYS)),
+        'total': total,
+        'price': format_signed_amount(_first(record, PRICE_KEYS)),
+        'fees': format_signed_amount(_first(record, FEES_KEYS)),
+        'amount': amount,
+        'check_number': str(_first(record, CHECK_KEYS) or ""),
+    }
+
+
+def transactions_from_payloads(payloads):
+    """Typed transactions of all captured payloads, newest first, skipping records that can't be parsed.
+
+    A payload captured twice (e.g. the same search loaded again) counts once.
+    """
+    transactions = []
+    seen = []
+    for payload in payloads:
+        if payload in seen:
+            continue
+        seen.append(payload)
+        for record in find_records(payload):
+            try:
+                transactions.append(transaction_from_record(record))
+            except ValueError as e:
+                print("Skipping history record:", e)
+    return sorted(transactions, key=lambda transaction: transaction['date'], reverse=True)
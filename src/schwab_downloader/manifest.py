@@ -0,0 +1,245 @@
+# SPDX-FileCopyrightText: 2023-present David C Wang <dcwangmit01@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+
+"""Persistent SQLite manifest: downloaded documents, the store's index, sync marks, checkpoints and learned rates."""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+# Documents can show up a little after their date (e.g. a statement dated the 31st, posted days later),
+# so incremental runs re-scan this many days before an account's high-water mark.
+INCREMENTAL_LOOKBACK_DAYS = 45
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    file_name TEXT PRIMARY KEY,
+    account TEXT NOT NULL,
+    phase TEXT NOT NULL,
+    date TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    recorded_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS documents_account_phase ON documents (account, phase, date);
+CREATE TABLE IF NOT EXISTS sync_state (
+    account TEXT NOT NULL,
+    phase TEXT NOT NULL,
+    synced_from TEXT NOT NULL,
+    synced_through TEXT NOT NULL,
+    synced_at TEXT NOT NULL,
+    PRIMARY KEY (account, phase)
+);
+CREATE TABLE IF NOT EXISTS objects (
+    sha256 TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    stored_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sources (
+    url TEXT PRIMARY KEY,
+    sha256 TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rates (
+    endpoint TEXT PRIMARY KEY,
+    rate REAL NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    account TEXT NOT NULL,
+    phase TEXT NOT NULL,
+    start_date TEXT NOT NULL,
+    end_date TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    row INTEGER NOT NULL,
+    done INTEGER NOT NULL,
+    updated_at TEXT NOT NULL,
+    repeats TEXT NOT NULL DEFAULT '{}',
+    PRIMARY KEY (account, phase)
+);
+"""
+
+
+def sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Manifest:
+    """Records every document seen per account and phase, and the date range each account is fully synced for.
+
+    Shared by all workers of a run, so access is serialized with a lock.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript(SCHEMA)
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(checkpoints)")]
+        if 'repeats' not in columns:  # A manifest from before checkpoints kept the file names' repeat numbers
+            self.conn.execute("ALTER TABLE checkpoints ADD COLUMN repeats TEXT NOT NULL DEFAULT '{}'")
+
+    def has(self, file_name):
+        with self.lock:
+            row = self.conn.execute("SELECT 1 FROM documents WHERE file_name = ?", (file_name,)).fetchone()
+        return row is not None
+
+    def record(self, account, phase, date, file_name, checksum=None):
+        """Record a document that exists on disk, with its size and checksum (computed unless given)."""
+        if not os.path.isfile(file_name):
+            return
+        size = os.path.getsize(file_name)
+        checksum = checksum or sha256_file(file_name)
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    file_name,
+                    account,
+                    phase,
+                    date.strftime("%Y%m%d"),
+                    size,
+                    checksum,
+                    datetime.now().isoformat(timespec='seconds'),
+                ),
+            )
+
+    def record_object(self, checksum, size, source=None):
+        """Index a document of the store, and the URL it was downloaded from."""
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO objects VALUES (?, ?, ?)",
+                (checksum, size, datetime.now().isoformat(timespec='seconds')),
+            )
+            if source:
+                self.conn.execute("INSERT OR REPLACE INTO sources VALUES (?, ?)", (source, checksum))
+
+    def stored_size(self, file_name):
+        """Return the size of file_name's document if it was saved through the store, else None."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT objects.size FROM documents JOIN objects ON objects.sha256 = documents.sha256"
+                " WHERE documents.file_name = ?",
+                (file_name,),
+            ).fetchone()
+        return row[0] if row else None
+
+    def source_checksum(self, url):
+        with self.lock:
+            row = self.conn.execute("SELECT sha256 FROM sources WHERE url = ?", (url,)).fetchone()
+        return row[0] if row else None
+
+    def document_count(self, account, phase, start_date, end_date):
+        """Return how many documents of the account's phase dated within [start_date, end_date] are recorded."""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM documents WHERE account = ? AND phase = ? AND date BETWEEN ? AND ?",
+                (account, phase, start_date.strftime("%Y%m%d"), end_date.strftime("%Y%m%d")),
+            ).fetchone()[0]
+
+    def synced_range(self, account, phase):
+        """Return the (from, through) dates the account's phase is fully synced for, or None."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT synced_from, synced_through FROM sync_state WHERE account = ? AND phase = ?", (account, phase)
+            ).fetchone()
+        if not row:
+            return None
+        return datetime.strptime(row[0], "%Y%m%d"), datetime.strptime(row[1], "%Y%m%d")
+
+    def incremental_start(self, account, phase, start_date, end_date):
+        """Return the date an incremental run can stop paginating at.
+
+        That is the account's high-water mark (less a lookback), as long as the synced range already covers
+        everything from start_date up to it; otherwise start_date.
+        """
+        synced = self.synced_range(account, phase)
+        if not synced:
+            return start_date
+        synced_from, synced_through = synced
+        if synced_from > start_date:
+            return start_date
+        return min(max(start_date, synced_through - timedelta(days=INCREMENTAL_LOOKBACK_DAYS)), end_date)
+
+    def mark_synced(self, account, phase, start_date, end_date):
+        """Record that every document of the account's phase in [start_date, end_date] has been processed."""
+        end_date = min(end_date, datetime.now())
+        synced = self.synced_range(account, phase)
+        if synced and synced[0] <= end_date and start_date <= synced[1]:
+            # Overlapping ranges merge, disjoint ones replace the older record
+            start_date, end_date = min(start_date, synced[0]), max(end_date, synced[1])
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO sync_state VALUES (?, ?, ?, ?, ?)",
+                (
+                    account,
+                    phase,
+                    start_date.strftime("%Y%m%d"),
+                    end_date.strftime("%Y%m%d"),
+                    datetime.now().isoformat(timespec='seconds'),
+                ),
+            )
+
+    def save_checkpoint(self, account, phase, start_date, end_date, page, row, done=False, repeats=None):
+        """Journal how far the run got in an account's phase: the last result page and row processed.
+
+        repeats is the state of the pass's RepeatCounter at that row, for a resumed pass to number on from.
+        """
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO checkpoints"
+                " (account, phase, start_date, end_date, page, row, done, updated_at, repeats)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    account,
+                    phase,
+                    start_date.strftime("%Y%m%d"),
+                    end_date.strftime("%Y%m%d"),
+                    page,
+                    row,
+                    int(done),
+                    datetime.now().isoformat(timespec='seconds'),
+                    json.dumps(repeats or {}),
+                ),
+            )
+
+    def checkpoint(self, account, phase, start_date, end_date):
+        """Return the checkpoint {page, row, done, repeats} of an account's phase for the same date range, or None."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT page, row, done, repeats FROM checkpoints WHERE account = ? AND phase = ? AND start_date = ?"
+                " AND end_date = ?",
+                (account, phase, start_date.strftime("%Y%m%d"), end_date.strftime("%Y%m%d")),
+            ).fetchone()
+        if not row:
+            return None
+        return {'page': row[0], 'row': row[1], 'done': bool(row[2]), 'repeats': json.loads(row[3])}
+
+    def clear_checkpoints(self):
+        """Forget the checkpoints of the previous run, when starting a new one."""
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM checkpoints")
+
+    def rates(self):
+        """Return the rate governor's learned {endpoint: actions per second}."""
+        with self.lock:
+            return dict(self.conn.execute("SELECT endpoint, rate FROM rates").fetchall())
+
+    def save_rates(self, rates):
+        now = datetime.now().isoformat(timespec='seconds')
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO rates VALUES (?, ?, ?)",
+                [(endpoint, rate, now) for endpoint, rate in rates.items()],
+            )
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
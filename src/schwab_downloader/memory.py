@@ -0,0 +1,165 @@
+# SPDX-FileCopyrightText: 2023-present David C Wang <dcwangmit01@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+
+"""Memory use of the run's process tree (Python, the Playwright driver, Chromium), and when to recycle pages."""
+
+import itertools
+import os
+import subprocess
+import threading
+
+MIN_OPERATIONS = 50  # Operations a fresh context gets before --max-rss may recycle it again
+
+# Command-line switch each scraping browser is launched with, so its processes can be told apart from the
+# render pages' browsers and the indexer's processes; Chromium ignores switches it doesn't know
+BROWSER_SWITCH = '--schwab-downloader-browser'
+_browser_ids = itertools.count(1)
+
+
+def browser_switch():
+    """A switch naming a new scraping browser, unique across the run and any other run on the machine."""
+    return f"{BROWSER_SWITCH}={os.getpid()}.{next(_browser_ids)}"
+
+
+class RecycleNeeded(Exception):
+    """Raised between result pages when the working page (or context) should be replaced; not a failure."""
+
+    def __init__(self, kind, reason):
+        super().__init__(f"recycle the {kind}: {reason}")
+        self.kind = kind
+        self.reason = reason
+
+
+def has_switch(pid, switch):
+    try:
+        with open(f'/proc/{pid}/cmdline', 'rb') as f:
+            return switch.encode() in f.read().split(b'\0')
+    except OSError:
+        return False
+
+
+def proc_processes(switch=None):
+    """{pid: (parent pid, RSS in bytes, whether launched with switch)} of every process, from /proc.
+
+    None without /proc.
+    """
+    try:
+        entries = os.listdir('/proc')
+    except OSError:
+        return None
+    processes = {}
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/status') as f:
+                status = dict(line.split(':', 1) for line in f if ':' in line)
+        except OSError:
+            continue  # Exited meanwhile, or not ours to read
+        rss = int(status.get('VmRSS', '0 kB').split()[0]) * 1024
+        processes[int(entry)] = (int(status.get('PPid', '0').strip()), rss, bool(switch) and has_switch(entry, switch))
+    return processes
+
+
+def ps_processes(switch=None):
+    """The same from ps, where there is no /proc (macOS, the BSDs); None without ps."""
+    try:  # -ww: command lines untruncated, to find the switch in
+        output = subprocess.run(
+            ['ps', '-A', '-ww', '-o', 'pid=,ppid=,rss=,args='], capture_output=True, text=True, check=True
+        ).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    processes = {}
+    for line in output.splitlines():
+        fields = line.split(None, 3)
+        if len(fields) >= 3 and all(field.isdigit() for field in fields[:3]):
+            launched = bool(switch) and len(fields) == 4 and switch in fields[3].split()
+            processes[int(fields[0])] = (int(fields[1]), int(fields[2]) * 1024, launched)
+    return processes
+
+
+def process_tree_rss(pid=None, switch=None):
+    """Sum of the resident memory of a process and all its descendants, in bytes.
+
+    With switch, of the processes launched with that command-line switch and their descendants instead, i.e.
+    of one browser.  Shared pages are counted once per process that maps them, so Chromium's total is overstated
+    a little, but its growth is what matters here.  None when neither /proc nor ps can tell.
+    """
+    pid = pid or os.getpid()
+    processes = proc_processes(switch)
+    if processes is None:
+        processes = ps_processes(switch)
+    if not processes or pid not in processes:
+        return None
+    children = {}
+    rss = {}
+    for entry, (parent, entry_rss, _) in processes.items():
+        children.setdefault(parent, []).append(entry)
+        rss[entry] = entry_rss
+    roots = [entry for entry, (_, _, launched) in processes.items() if launched] if switch else [pid]
+    total, stack, seen = 0, roots, set()
+    while stack:
+        current = stack.pop()
+        if current in seen:
+            continue  # A child launched with the switch too
+        seen.add(current)
+        total += rss.get(current, 0)
+        stack.extend(children.get(current, []))
+    return total
+
+
+class MemoryMonitor:
+    """Samples the process tree's memory and decides when a worker should recycle its page or context.
+
+    After --recycle-after operations (result pages and saves) on a page the page is replaced, which frees what
+    the site's scripts and the modals left behind; when the worker's browser is above --max-rss the whole
+    context is recreated from its storage state, which frees the renderer processes too.  Only that browser is
+    measured against --max-rss: recycling can't free the render pages' browsers or the indexer's processes.
+    The report covers the whole process tree.  Shared by all workers of a run.
+    """
+
+    def __init__(self, recycle_after, max_rss_mb):
+        self.recycle_after = recycle_after
+        self.max_rss = max_rss_mb * 1_000_000
+        self.lock = threading.Lock()
+        self.start = process_tree_rss()
+        self.peak = self.start
+        self.last = self.start
+        self.recycles = {'page': 0, 'context': 0}
+
+    def sample(self):
+        rss = process_tree_rss()
+        if rss is not None:
+            with self.lock:
+                self.last = rss
+                self.peak = max(self.peak or 0, rss)
+        return rss
+
+    def check(self, operations, switch=None):
+        """Raise RecycleNeeded when a worker that did operations on its page since it was recycled should recycle.
+
+        switch names the worker's browser (see browser_switch), whose memory is compared with --max-rss.
+        """
+        self.sample()
+        rss = process_tree_rss(switch=switch) if self.max_rss and operations >= MIN_OPERATIONS else None
+        if rss and rss > self.max_rss:
+            raise RecycleNeeded(
+                'context', f"browser RSS {rss / 1_000_000:.0f} MB above {self.max_rss / 1_000_000:.0f} MB"
+            )
+        if self.recycle_after and operations >= self.recycle_after:
+            raise RecycleNeeded('page', f"{operations} operations")
+
+    def recycled(self, kind):
+        with self.lock:
+            self.recycles[kind] += 1
+
+    def report(self):
+        if self.peak is None:
+            print("Memory: not measured, neither /proc nor ps is available")
+            return
+        print(
+            f"Memory (Python, driver and Chromium): {self.start / 1_000_000:.0f} MB at start,"
+            f" {self.peak / 1_000_000:.0f} MB peak, {self.last / 1_000_000:.0f} MB at end;"
+            f" {self.recycles['page']} page and {self.recycles['context']} context recycles"
+        )
@@ -0,0 +1,74 @@
+# SPDX-FileCopyrightText: 2023-present David C Wang <dcwangmit01@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+
+"""Where to go in a result table's pager, decided the same for the sync and async engines.
+
+The decisions are generators of pager steps, which an engine carries out on its page and answers with send():
+
+- ('too-new',): whether even the oldest row of the current page is after end_date
+- ('numbers',): the page numbers the pager links to
+- ('go', number): click the pager's link to a page number; whether it had one
+- ('turn', label): click the "Next" or "Previous" link; whether there was one
+
+Each returns the number of the page it leaves open.
+"""
+
+
+def restore_steps(number):
+    """Page forward to result page number, jumping by the pager's page numbers where it can.
+
+    Ends on a lower page if the table ends first.
+    """
+    current = 1
+    while current < number:
+        numbers = [n for n in (yield ('numbers',)) if current < n <= number]
+        if numbers and (yield ('go', max(numbers))):
+            current = max(numbers)
+            continue
+        if not (yield ('turn', 'Next')):
+            break
+        current += 1
+    return current
+
+
+def seek_steps():
+    """Skip the result pages newer than end_date by bisecting over the pager's page numbers.
+
+    Leaves a page that is still too new open, so that paging on from it with "Next" sees every row in range.  Only
+    page numbers the pager links to can be visited; without any, paging stays linear.
+    """
+    if not (yield ('too-new',)):
+        return 1
+    low, high, current = 1, None, 1  # Page low is too new, page high (once found) is not
+    while True:
+        numbers = [n for n in (yield ('numbers',)) if low < n and (not high or n < high)]
+        if not numbers:
+            break
+        # Gallop to the farthest page in sight until one isn't too new, then bisect
+        target = max(numbers) if not high else min(numbers, key=lambda n: abs(n - (low + high) // 2))
+        if not (yield ('go', target)):
+            break
+        current = target
+        if (yield ('too-new',)):
+            low = target
+        else:
+            high = target
+    if current != low and (yield ('go', low)):
+        current = low
+    # If page low isn't linked from here, step back until a page is too new again
+    while current > low and not (yield ('too-new',)):
+        if not (yield ('turn', 'Previous')):
+            current = 1 if (yield ('go', 1)) else current
+            break
+        current -= 1
+    return current
+
+
+def largest_page_size(values, selected):
+    """The page size option to select to show the most rows per page, or None if it is already selected."""
+    sizes = [value for value in values if value.isdigit()]
+    if not sizes:
+        return None
+    largest = max(sizes, key=int)
+    return largest if largest != selected else None
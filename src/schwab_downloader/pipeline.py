@@ -0,0 +1,96 @@
+# SPDX-FileCopyrightText: 2023-present David C Wang <dcwangmit01@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+
+"""Hand-off of saves from the table scan (the producer) to background consumers, with backpressure.
+
+The producer parses rows and starts their saves; the consumers finish them while the producer moves on to the
+next rows and pages.  Every hand-off is bounded, so a producer that outruns its consumers waits instead of
+piling up work in memory.
+"""
+
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+def with_retries(attempt, retries, file_name, log=print):
+    """Return attempt(number) for the first attempt that succeeds, raising once retries more have failed too.
+
+    Background saves retry through the same consumer that failed them, so the scan never waits on a retry; each
+    failure that is retried is logged, the last one is the save's result.
+    """
+    for number in range(1, retries + 2):
+        try:
+            return attempt(number)
+        except Exception as e:
+            if number > retries:
+                raise
+            log(f"File Failed [{file_name}] (attempt {number} of {retries + 1}), retrying: {e}")
+
+
+async def with_retries_async(attempt, retries, file_name, log=print):
+    """with_retries() for an attempt(number) that returns a coroutine."""
+    for number in range(1, retries + 2):
+        try:
+            return await attempt(number)
+        except Exception as e:
+            if number > retries:
+                raise
+            log(f"File Failed [{file_name}] (attempt {number} of {retries + 1}), retrying: {e}")
+
+
+class BoundedExecutor:
+    """A thread pool whose submit() blocks while max_workers + backlog jobs are queued or running."""
+
+    def __init__(self, max_workers, backlog, thread_name_prefix=''):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=thread_name_prefix)
+        self.slots = threading.BoundedSemaphore(max_workers + backlog)
+
+    def submit(self, fn, *args):
+        self.slots.acquire()
+        try:
+            future = self.executor.submit(fn, *args)
+        except BaseException:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda future: self.slots.release())
+        return future
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
+
+
+class DownloadQueue:
+    """Downloads the browser has started, saved to disk later, oldest first.
+
+    The sync Playwright API only works on the thread that drives the page, so the browser itself is the
+    consumer: it keeps transferring while the table scan goes on, and a download is only saved (which waits
+    for its transfer to end) once more than depth downloads are in flight, or the account is done.
+    """
+
+    def __init__(self, depth):
+        self.depth = depth
+        self.downloads = deque()
+
+    def add(self, save):
+        """Queue save(), which saves a started download; returns a Future of its result."""
+        future = Future()
+        self.downloads.append((save, future))
+        while len(self.downloads) > self.depth:
+            self.save_oldest()
+        return future
+
+    def save_oldest(self):
+        save, future = self.downloads.popleft()
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(save())
+        except Exception as e:
+            future.set_exception(e)
+
+    def drain(self):
+        """Save every queued download."""
+        while self.downloads:
+            self.save_oldest()
@@ -0,0 +1,72 @@
+# SPDX-FileCopyrightText: 2023-present David C Wang <dcwangmit01@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+
+"""Several Schwab logins in one run: per-login options from the config file's [profiles.<name>] tables."""
+
+import os
+import tomllib
+
+from schwab_downloader.filters import split_list
+
+# Keys of a [profiles.<name>] table.  Passwords only come from the environment, never from the file
+PROFILE_KEYS = (
+    'id',
+    'id-env',
+    'password-env',
+    'cache-accounts',
+    'manifest',
+    'session',
+    'index',
+    'export',
+    'target-dir',
+)
+
+
+def suffixed(path, name):
+    """path with the profile's name before its extension: "run.jsonl" becomes "run.personal.jsonl"."""
+    stem, extension = os.path.splitext(path)
+    return f"{stem}.{name}{extension}"
+
+
+def load_profiles(path, names):
+    """{name: profile} for the profiles named ("a,b", or "all") in the config file."""
+    if not path or not os.path.isfile(path):
+        raise ValueError(f"--profiles needs a config file with [profiles.<name>] tables, {path} doesn't exist")
+    with open(path, 'rb') as f:
+        profiles = tomllib.load(f).get('profiles', {})
+    if not profiles:
+        raise ValueError(f"No [profiles.<name>] tables in {path}")
+    selected = list(profiles) if names == 'all' else split_list(names)
+    unknown = set(selected) - set(profiles)
+    if unknown:
+        raise ValueError(f"Unknown profiles {', '.join(sorted(unknown))}, {path} has {', '.join(profiles)}")
+    return {name: profiles[name] for name in selected}
+
+
+def profile_args(args, name, profile):
+    """The options of one profile's downloader: the run's, with the login and every local file its own.
+
+    Files default to the run's names suffixed with the profile's, so no two profiles share a cache, manifest,
+    session, index or trace; the profile's table may name them instead.
+    """
+    unknown = set(profile) - set(PROFILE_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown keys in [profiles.{name}]: {', '.join(sorted(unknown))}")
+    login_id = profile.get('id') or os.environ.get(profile.get('id-env') or '')
+    password = os.environ.get(profile['password-env']) if profile.get('password-env') else None
+    overrides = {
+        '--id': login_id,
+        '--password': password,
+        '--cache-accounts': (
+            profile.get('cache-accounts') or suffixed(args.get('--cache-accounts') or '.schwab_accounts.json', name)
+        ),
+        '--manifest': profile.get('manifest') or suffixed(args.get('--manifest') or '.schwab_manifest.sqlite', name),
+        '--session': profile.get('session') or suffixed(args.get('--session') or '.schwab_session.enc', name),
+        '--index': profile.get('index') or suffixed(args.get('--index') or '.schwab_index.sqlite', name),
+        '--export': profile.get('export') or (suffixed(args['--export'], name) if args.get('--export') else None),
+    }
+    for option in ('--trace', '--chrome-trace'):
+        if args.get(option):
+            overrides[option] = suffixed(args[option], name)
+    return dict(args, **overrides)
@@ -0,0 +1,215 @@
+# SPDX-FileCopyrightText: 2023-present David C Wang <dcwangmit01@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+
+"""Render details modals to PDF off the main page, from a snapshot of the modal's HTML and styles."""
+
+import html
+import queue
+import threading
+from concurrent.futures import Future
+
+from schwab_downloader.pipeline import with_retries
+
+PDF_OPTIONS = {
+    "format": "Letter",
+    "margin": {"top": ".5in", "right": ".5in", "bottom": ".5in", "left": ".5in"},
+    "print_background": True,
+}
+
+# Snapshots the modal around the print link: its HTML, the page's readable CSS, and links to the
+# stylesheets that can't be read (cross-origin).  Returns null if there is no modal to snapshot.
+SNAPSHOT_JS = """
+printSelector => {
+    const printLink = document.querySelector(printSelector);
+    if (!printLink) return null;
+    const modal = printLink.closest('[role="dialog"], dialog, .modal-content, .modal');
+    if (!modal) return null;
+    const css = [];
+    const links = [];
+    for (const sheet of document.styleSheets) {
+        try {
+            css.push(Array.from(sheet.cssRules).map(rule => rule.cssText).join('\\n'));
+        } catch (e) {
+            if (sheet.href) links.push(sheet.href);
+        }
+    }
+    return {html: modal.outerHTML, css: css.join('\\n'), links, baseUrl: location.href};
+}
+"""
+
+
+def snapshot_document(snapshot, print_selector):
+    """Standalone HTML document of a modal snapshot, with the print buttons hidden."""
+    links = "".join(f'<link rel="stylesheet" href="{html.escape(href)}">' for href in snapshot["links"])
+    return (
+        "<!DOCTYPE html><html><head>"
+        f'<base href="{html.escape(snapshot["baseUrl"])}">'
+        f"{links}<style>{snapshot['css']}</style>"
+        f"<style>{print_selector} {{ display: none !important; }}</style>"
+        f"</head><body>{snapshot['html']}</body></html>"
+    )
+
+
+# Responses that mean a resource of the document (e.g. a check image) needs the session it was rendered without
+DENIED_STATUSES = (401, 403)
+
+
+def denied_listener(denied):
+    """A "response" listener appending the responses a render was denied to the denied list."""
+
+    def on_response(response):
+        if response.status in DENIED_STATUSES:
+            denied.append(f"HTTP {response.status} from {response.url[:80]}")
+
+    return on_response
+
+
+def check_denied(denied):
+    """Raise if a resource of the rendered document was denied, rather than save a PDF with parts missing."""
+    if denied:
+        raise RuntimeError(f"Details modal rendered without its resources ({denied[0]})")
+
+
+def render_to_file(page, document, path):
+    """Render a document to a PDF at path with the given page."""
+    denied = []
+    on_response = denied_listener(denied)
+    page.on("response", on_response)
+    try:
+        page.set_content(document, wait_until="load")
+    finally:
+        page.remove_listener("response", on_response)
+    check_denied(denied)
+    page.pdf(path=path, **PDF_OPTIONS)
+
+
+class RenderPool:
+    """Dedicated headless render pages, each in its own thread with its own Playwright.
+
+    Scraping hands over a snapshot and moves on; the PDF is produced in the background.  The job queue is
+    bounded, so a scraper that outruns the renderers waits instead of piling up snapshots in memory.  The
+    render browsers are only launched with the first snapshot, so runs without details modals don't pay for
+    them, each in a context with the logged-in session's storage state and the scraper's resource blocker, as
+    snapshots load their images and stylesheets from the site.  If none of them can be launched, or all of them
+    die, the pool is dead: every queued and later job fails, and the scraper renders on its own page instead.  A
+    failed render, including one denied a resource, is retried on the same render page up to retries times
+    before its Future fails.
+    """
+
+    def __init__(self, size, store, backlog, retries=0, log=print, blocker=None):
+        self.size = size
+        self.store = store
+        self.retries = retries
+        self.log = log
+        self.blocker = blocker
+        self.storage_state = None
+        self.jobs = queue.Queue(maxsize=max(1, backlog))
+        self.lock = threading.Lock()
+        self.threads = []
+        self.live = 0
+        self.error = None
+
+    @property
+    def alive(self):
+        return self.error is None
+
+    def start(self, session):
+        """Launch the render threads, once, with the storage state session() returns."""
+        with self.lock:
+            if self.threads:
+                return
+            self.storage_state = session()
+            self.live = self.size
+            self.threads = [
+                threading.Thread(target=self.work, daemon=True, name=f"render-{n}") for n in range(self.size)
+            ]
+        for thread in self.threads:
+            thread.start()
+
+    def put(self, job):
+        """Queue a job, unless the pool dies while the queue is full; returns whether it was queued."""
+        while self.alive:
+            try:
+                self.jobs.put(job, timeout=1)
+            except queue.Full:
+                continue
+            if not self.alive:
+                self.fail_pending()  # Died meanwhile, and its threads may have drained the queue already
+            return True
+        return False
+
+    def submit(self, document, file_name, session):
+        """Queue a document for rendering into file_name; returns a Future.
+
+        session returns the storage state of the logged-in context, to launch the render pages with; it is called
+        on the caller's thread, as Playwright objects can't be used from others.
+        """
+        self.start(session)
+        future = Future()
+        if not self.put((document, file_name, future)):
+            future.set_exception(RuntimeError(f"render pool failed: {self.error}"))
+        return future
+
+    def fail_pending(self):
+        while True:
+            try:
+                job = self.jobs.get_nowait()
+            except queue.Empty:
+                return
+            if job is not None and job[2].set_running_or_notify_cancel():
+                job[2].set_exception(RuntimeError(f"render pool failed: {self.error}"))
+
+    def work(self):
+        try:
+            from playwright.sync_api import sync_playwright
+
+            with sync_playwright() as playwright:
+                browser = playwright.chromium.launch(headless=True)
+                try:
+                    context = browser.new_context(storage_state=self.storage_state)
+                    if self.blocker and self.blocker.enabled:
+                        context.route("**/*", self.blocker.handle_render)
+                    self.render(context.new_page())
+                finally:
+                    browser.close()
+        except Exception as e:
+            self.stopped(e)
+        else:
+            self.stopped(None)
+
+    def render(self, page):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            document, file_name, future = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                with_retries(
+                    lambda attempt: self.store.save(file_name, lambda part: render_to_file(page, document, part)),
+                    self.retries,
+                    file_name,
+                    self.log,
+                )
+                future.set_result(file_name)
+            except Exception as e:
+                future.set_exception(e)
+
+    def stopped(self, error):
+        """A render thread ended; if it was the last one and it failed, the pool is dead."""
+        with self.lock:
+            self.live -= 1
+            if error is None or self.live > 0:
+                return
+            self.error = error
+        print(f"Render pages failed, rendering modals on the scraping pages instead: {error}")
+        self.fail_pending()
+
+    def shutdown(self):
+        """Finish the queued renders and stop the render threads."""
+        for _ in self.threads:
+            self.put(None)
+        for thread in self.threads:
+            thread.join()
@@ -0,0 +1,99 @@
+# SPDX-FileCopyrightText: 2023-present David C Wang <dcwangmit01@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+
+"""Processing of parsed result rows shared by the sync and async engines."""
+
+import os
+from collections import Counter
+
+
+class RepeatCounter:
+    """Numbers the repeats of a file name within an account's pass, before anything is saved under it.
+
+    Distinct rows can parse to the same name (e.g. two identical trades on a day); the second would otherwise
+    find the first's file and be skipped.  A row's number is its place among the rows of that name, in the order
+    the site lists them.  Rows come newest first and a name includes its date, so only the names of the current
+    date can come up again: those are all that is kept, and they are checkpointed with each result page, so that
+    a resumed or retried pass numbers on from where it stopped instead of starting over.
+    """
+
+    def __init__(self, state=None):
+        state = state or {}
+        self.date = state.get('date')
+        self.counts = Counter(state.get('names') or {})
+
+    def distinct(self, file_name, date):
+        """Return the row's file name, suffixed with its repeat number from the second on, and that number."""
+        day = date.strftime("%Y%m%d")
+        if day != self.date:
+            self.date, self.counts = day, Counter()
+        self.counts[file_name] += 1
+        repeat = self.counts[file_name]
+        if repeat == 1:
+            return file_name, repeat
+        root, ext = os.path.splitext(file_name)
+        return f"{root}_{repeat}{ext}", repeat
+
+    def state(self):
+        """The counts to checkpoint, to restore a counter from with RepeatCounter(state)."""
+        return {'date': self.date, 'names': dict(self.counts)}
+
+
+def table_row_floor(rows, page_numbers):
+    """The fewest rows a result table can hold, from its first page's row count and the pager's page numbers."""
+    last_page = max(page_numbers or [1])
+    return (last_page - 1) * rows + 1 if last_page > 1 else rows
+
+
+class PageScan:
+    """One pass over an account's result pages: which rows to take, under which names, and how far it got.
+
+    The engines drive the pages and the saves; the rest is decided here, the same for both.  Rows that the run
+    being resumed processed are skipped, the others numbered apart (see RepeatCounter); rows after end_date are
+    passed over, and the first one before start_date ends the pass.  Each page is journaled with its background
+    saves, for the engine to checkpoint once they have all succeeded.
+    """
+
+    def __init__(self, phase, start_date, end_date, filters, resume_row=-1, repeats=None):
+        self.phase = phase
+        self.start_date = start_date
+        self.end_date = end_date
+        self.filters = filters
+        self.resume_row = resume_row
+        self.repeats = repeats or RepeatCounter()
+        self.last_row = resume_row
+        self.journal = []  # (page, last row, saves, repeat counts) of the pages not checkpointed yet
+        self.position = None  # (page, last row, repeat counts) of the last page scanned
+        self.pending = []  # The background saves of every page
+        self.done = False
+
+    def rows(self, rows, parse):
+        """Yield (row, file_name, details_link, date, record, repeat) for the rows of a page to take.
+
+        parse parses a row; repeat is the row's number among the rows of its file name.
+        """
+        self.last_row = self.resume_row
+        for row in rows:
+            file_name, details_link, date, record = parse(row)
+            if row["index"] <= self.resume_row:
+                continue  # Processed before the run being resumed stopped
+            self.last_row = row["index"]
+            if not file_name:
+                continue
+            file_name, repeat = self.repeats.distinct(file_name, date)
+            if date > self.end_date:
+                continue
+            if date < self.start_date:
+                self.done = True
+                return
+            if self.filters.wants_row(self.phase, record):
+                yield row, file_name, details_link, date, record, repeat
+
+    def end_page(self, page_number, saves):
+        """Journal the page just scanned, with the saves it left running in the background."""
+        repeats = self.repeats.state()
+        self.position = (page_number, self.last_row, repeats)
+        self.journal.append((page_number, self.last_row, saves, repeats))
+        self.pending.extend(saves)
+        self.resume_row = -1
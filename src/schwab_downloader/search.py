@@ -0,0 +1,300 @@
+# SPDX-FileCopyrightText: 2023-present David C Wang <dcwangmit01@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+
+"""Full-text index of the downloaded documents: checked and extracted in worker processes, searched with SQLite FTS5."""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from schwab_downloader.filters import normalize, split_list
+from schwab_downloader.store import is_complete_pdf
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    file_name TEXT NOT NULL UNIQUE,
+    account TEXT NOT NULL,
+    phase TEXT NOT NULL,
+    date TEXT NOT NULL,
+    type TEXT NOT NULL,
+    description TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    pages INTEGER,
+    valid INTEGER NOT NULL,
+    error TEXT,
+    indexed_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS documents_account_date ON documents (account, date);
+CREATE INDEX IF NOT EXISTS documents_date ON documents (date);
+CREATE VIRTUAL TABLE IF NOT EXISTS document_text USING fts5(type, description, body);
+"""
+
+# Words of a query that FTS5 reads as operators rather than terms
+OPERATORS = ('AND', 'OR', 'NOT')
+
+
+def extract_document(path):
+    """Check a downloaded document and extract its text; runs in a worker process.
+
+    A PDF must be complete (header and end-of-file marker) and, with pypdf, parse page by page.  Without pypdf
+    only the structure is checked and no text is extracted.  Other documents are indexed by their metadata only.
+    """
+    if not path.lower().endswith('.pdf'):
+        return {'valid': True, 'error': None, 'pages': None, 'body': ''}
+    if not is_complete_pdf(path):
+        return {'valid': False, 'error': "not a complete PDF", 'pages': None, 'body': ''}
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        return {'valid': True, 'error': None, 'pages': None, 'body': None}
+    try:
+        reader = PdfReader(path)
+        texts = [page.extract_text() or '' for page in reader.pages]
+    except Exception as e:  # pypdf raises a variety of errors on damaged files
+        return {'valid': False, 'error': f"unreadable PDF: {e}", 'pages': None, 'body': ''}
+    return {'valid': True, 'error': None, 'pages': len(texts), 'body': '\n'.join(texts)}
+
+
+def fts_query(words):
+    """FTS5 query of the words, each quoted (so "1099-DIV" is a phrase, not syntax) but operators and prefixes."""
+    terms = []
+    for word in words:
+        if word in OPERATORS:
+            terms.append(word)
+        elif word.endswith('*') and re.fullmatch(r'\w+\*', word):
+            terms.append(word)
+        else:
+            terms.append('"' + word.replace('"', '""') + '"')
+    return ' '.join(terms)
+
+
+class DocumentIndex:
+    """The index's SQLite file: one row per document, keyed by account, date and type, and its extracted text.
+
+    A document is indexed again only when its size or modification time changed.  Shared by the indexer's
+    result callbacks and the workers, so access is serialized with a lock.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.create_function('normalize', 1, normalize, deterministic=True)
+        self.conn.executescript(SCHEMA)
+
+    def is_current(self, file_name, size, mtime_ns):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT 1 FROM documents WHERE file_name = ? AND size = ? AND mtime_ns = ?", (file_name, size, mtime_ns)
+            ).fetchone()
+        return row is not None
+
+    def add(self, document, result):
+        """Add or replace a document with what extract_document found; a body of None keeps the text indexed before."""
+        with self.lock, self.conn:
+            row = self.conn.execute("SELECT id FROM documents WHERE file_name = ?", (document['file_name'],)).fetchone()
+            body = result['body']
+            if row:
+                if body is None:
+                    previous = self.conn.execute("SELECT body FROM document_text WHERE rowid = ?", row).fetchone()
+                    body = previous[0] if previous else None
+                self.conn.execute("DELETE FROM documents WHERE id = ?", row)
+                self.conn.execute("DELETE FROM document_text WHERE rowid = ?", row)
+            cursor = self.conn.execute(
+                "INSERT INTO documents (file_name, account, phase, date, type, description, size, mtime_ns, pages,"
+                " valid, error, indexed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    document['file_name'],
+                    document['account'],
+                    document['phase'],
+                    document['date'].strftime("%Y%m%d"),
+                    document['type'],
+                    document['description'],
+                    document['size'],
+                    document['mtime_ns'],
+                    result['pages'],
+                    int(result['valid']),
+                    result['error'],
+                    datetime.now().isoformat(timespec='seconds'),
+                ),
+            )
+            self.conn.execute(
+                "INSERT INTO document_text (rowid, type, description, body) VALUES (?, ?, ?, ?)",
+                (cursor.lastrowid, document['type'], document['description'], body or ''),
+            )
+
+    def search(self, words, accounts=None, types=None, start_date=None, end_date=None, invalid=False, limit=20):
+        """Documents matching the query words and filters, best match first (newest first without words).
+
+        Accounts match the end of the account number, types part of the type or description, as the run's
+        filters do.
+        """
+        conditions, params = [], []
+        if words:
+            conditions.append("document_text MATCH ?")
+            params.append(fts_query(words))
+        if accounts:
+            conditions.append("(" + " OR ".join("normalize(d.account) LIKE '%' || ?" for _ in accounts) + ")")
+            params.extend(normalize(account) for account in accounts)
+        if types:
+            conditions.append(
+                "("
+                + " OR ".join(
+                    "normalize(d.type) LIKE '%' || ? || '%' OR normalize(d.description) LIKE '%' || ? || '%'"
+                    for _ in types
+                )
+                + ")"
+            )
+            for pattern in types:
+                params.extend([normalize(pattern)] * 2)
+        if start_date:
+            conditions.append("d.date >= ?")
+            params.append(start_date.strftime("%Y%m%d"))
+        if end_date:
+            conditions.append("d.date <= ?")
+            params.append(end_date.strftime("%Y%m%d"))
+        if invalid:
+            conditions.append("NOT d.valid")
+        snippet = "snippet(document_text, -1, '[', ']', '...', 12)" if words else "''"
+        order = "bm25(document_text)" if words else "d.date DESC"
+        query = (
+            f"SELECT d.date, d.account, d.type, d.file_name, d.valid, d.error, {snippet}"
+            " FROM document_text JOIN documents d ON d.id = document_text.rowid"
+            f"{' WHERE ' + ' AND '.join(conditions) if conditions else ''} ORDER BY {order} LIMIT ?"
+        )
+        try:
+            with self.lock:
+                rows = self.conn.execute(query, params + [limit]).fetchall()
+        except sqlite3.OperationalError as e:  # A malformed query, e.g. a dangling operator
+            raise ValueError(f"Bad search query {' '.join(words)!r}: {e}") from None
+        keys = ('date', 'account', 'type', 'file_name', 'valid', 'error', 'snippet')
+        return [dict(zip(keys, row)) for row in rows]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class Indexer:
+    """Checks and indexes each newly saved document in a pool of worker processes, while the browser goes on.
+
+    Text extraction is CPU-bound, so it runs in processes (started with spawn, as the run's threads make fork
+    unsafe); the results are written to the index from the pool's callback thread.  Shared by all workers of a
+    run, and submitting never blocks, so it can be called from the async engine's event loop too.
+    """
+
+    def __init__(self, path, workers, log=print):
+        import multiprocessing
+
+        self.index = DocumentIndex(path)
+        self.executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        self.log = log
+        self.lock = threading.Lock()
+        self.submitted = set()
+        self.indexed = 0
+        self.unchanged = 0
+        self.invalid = []
+        self.failed = 0
+        self.without_text = False
+
+    def submit(self, account, phase, date, file_name, record=None):
+        """Queue a saved (or already present) document, unless the index has it as it is on disk."""
+        try:
+            stat = os.stat(file_name)
+        except OSError:
+            return
+        with self.lock:
+            if file_name in self.submitted:
+                return
+            self.submitted.add(file_name)
+        if self.index.is_current(file_name, stat.st_size, stat.st_mtime_ns):
+            with self.lock:
+                self.unchanged += 1
+            return
+        record = record or {}
+        document = {
+            'file_name': file_name,
+            'account': account['number'],
+            'phase': phase,
+            'date': date,
+            'type': record.get('type') or '',
+            'description': record.get('description') or '',
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+        }
+        future = self.executor.submit(extract_document, file_name)
+        future.add_done_callback(lambda future: self.on_extracted(future, document))
+
+    def on_extracted(self, future, document):
+        try:
+            result = future.result()
+            self.index.add(document, result)
+        except Exception as e:
+            self.log(f"Not indexed [{document['file_name']}]: {e}")
+            with self.lock:
+                self.failed += 1
+            return
+        with self.lock:
+            self.indexed += 1
+            if result['body'] is None:
+                self.without_text = True
+            if not result['valid']:
+                self.invalid.append(document['file_name'])
+        if not result['valid']:
+            self.log(f"File Invalid [{document['file_name']}]: {result['error']}")
+
+    def shutdown(self):
+        """Wait for the documents still being indexed, then close the pool and the index."""
+        self.executor.shutdown(wait=True)
+        self.index.close()
+
+    def report(self):
+        print(
+            f"Index {self.index.path}: {self.indexed} documents indexed, {self.unchanged} unchanged,"
+            f" {len(self.invalid)} invalid{f', {self.failed} failed' if self.failed else ''}"
+        )
+        for file_name in self.invalid:
+            print(f"  Invalid: {file_name}")
+        if self.without_text:
+            print("  PDF text isn't extracted without pypdf: pip install 'schwab-downloader[search]'")
+
+
+def search(args):
+    """The search command: print the indexed documents matching the query and filters."""
+    path = args.get('--index') or '.schwab_index.sqlite'
+    if not os.path.exists(path):
+        raise ValueError(f"No index at {path}, a run with --index-workers above 0 builds it")
+    start_date = end_date = None
+    if args.get('--date-range'):
+        start_date, end_date = (datetime.strptime(date, "%Y%m%d") for date in args['--date-range'].split('-'))
+    elif args.get('--year') and args['--year'] != "<CUR_YEAR>":
+        start_date, end_date = datetime(int(args['--year']), 1, 1), datetime(int(args['--year']), 12, 31)
+
+    index = DocumentIndex(path)
+    started = time.perf_counter()
+    try:
+        results = index.search(
+            args.get('<query>') or [],
+            accounts=split_list(args.get('--accounts')),
+            types=split_list(args.get('--types')),
+            start_date=start_date,
+            end_date=end_date,
+            invalid=args.get('--invalid', False),
+            limit=int(args.get('--max-results') or 20),
+        )
+    finally:
+        index.close()
+    elapsed = (time.perf_counter() - started) * 1000
+    for result in results:
+        flag = "" if result['valid'] else f"  INVALID: {result['error']}"
+        print(f"{result['date']}  {result['account']}  {result['type'] or '-'}  {result['file_name']}{flag}")
+        if result['snippet']:
+            print(f"    {' '.join(result['snippet'].split())}")
+    print(f"{len(results)} documents in {elapsed:.1f} ms")
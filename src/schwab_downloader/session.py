@@ -0,0 +1,60 @@
+# SPDX-FileCopyrightText: 2023-present David C Wang <dcwangmit01@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+
+"""Encrypted on-disk storage of the authenticated browser context's storage state."""
+
+import base64
+import hashlib
+import json
+import os
+
+SALT_SIZE = 16
+KDF_ITERATIONS = 600_000
+
+
+class SessionStore:
+    """Saves and loads a Playwright storage state (cookies and local storage) encrypted with a secret.
+
+    The file holds a random salt followed by a Fernet token; the key is derived from the secret with PBKDF2.
+    """
+
+    def __init__(self, path, secret):
+        self.path = path
+        self.secret = secret
+
+    def _fernet(self, salt):
+        from cryptography.fernet import Fernet
+
+        key = hashlib.pbkdf2_hmac('sha256', self.secret.encode(), salt, KDF_ITERATIONS)
+        return Fernet(base64.urlsafe_b64encode(key))
+
+    def load(self):
+        """Return the saved storage state, or None if there is none or it can't be decrypted."""
+        if not os.path.exists(self.path):
+            return None
+        from cryptography.fernet import InvalidToken
+
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+            salt, token = data[:SALT_SIZE], data[SALT_SIZE:]
+            return json.loads(self._fernet(salt).decrypt(token))
+        except (InvalidToken, ValueError, IOError) as e:
+            print(f"Ignoring saved session {self.path}: {str(e) or 'cannot decrypt'}")
+            return None
+
+    def save(self, storage_state):
+        salt = os.urandom(SALT_SIZE)
+        token = self._fernet(salt).encrypt(json.dumps(storage_state).encode())
+
+        # Only the current user may read the session, also when it replaces a file created otherwise
+        fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        os.fchmod(fd, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(salt + token)
+        print(f"Saved session to {self.path}")
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
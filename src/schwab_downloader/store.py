@@ -0,0 +1,166 @@
+# SPDX-FileCopyrightText: 2023-present David C Wang <dcwangmit01@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+
+"""Content-addressed document store: atomic writes, a SHA-256 index and one copy of each distinct document."""
+
+import hashlib
+import os
+import shutil
+import threading
+
+OBJECTS_DIR = '.objects'
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def is_complete_pdf(path):
+    """Whether the file starts like a PDF and ends with an end-of-file marker, i.e. wasn't cut short."""
+    with open(path, 'rb') as f:
+        if f.read(5) != b'%PDF-':
+            return False
+        f.seek(max(0, os.path.getsize(path) - 1024))
+        return b'%%EOF' in f.read()
+
+
+def fsync_dir(path):
+    """Make a rename in the directory durable; not supported everywhere (e.g. Windows), so best effort."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class DocumentStore:
+    """Stores every document through a temp file that is fsynced, checksummed and renamed into place.
+
+    Each distinct content is kept once, as .objects/<sha256[:2]>/<sha256>.pdf under the target directory, and
+    every descriptive file name is a hardlink to it (a copy where hardlinks aren't supported).  The checksums
+    are indexed in the manifest, with the URL a document came from, so a document seen before under another
+    account is linked instead of downloaded again.
+    """
+
+    def __init__(self, target_dir, manifest):
+        self.objects_dir = os.path.join(target_dir, OBJECTS_DIR)
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self.manifest = manifest
+        self.lock = threading.Lock()
+        self.checksums = {}  # File name -> checksum of the documents stored in this run, until recorded
+        self.stored = 0
+        self.linked = 0
+        self.linked_bytes = 0
+
+    def object_path(self, checksum):
+        return os.path.join(self.objects_dir, checksum[:2], checksum + '.pdf')
+
+    def has(self, file_name):
+        """Whether file_name holds a complete document.
+
+        Files stored here are checked against their indexed size; older ones, written straight to their name,
+        must at least be an intact PDF, since a killed run could have left them truncated.
+        """
+        if not os.path.isfile(file_name):
+            return False
+        size = self.manifest.stored_size(file_name)
+        if size is not None:
+            return os.path.getsize(file_name) == size
+        return is_complete_pdf(file_name)
+
+    def save(self, file_name, write, source=None):
+        """Store the document that write(path) writes, under file_name; returns its checksum."""
+        part = file_name + '.part'
+        try:
+            write(part)
+            return self.commit(part, file_name, source)
+        finally:
+            if os.path.exists(part):
+                os.remove(part)
+
+    async def save_async(self, file_name, write, source=None):
+        """save() for a coroutine function write(path); the fsync and checksum run on a thread."""
+        import asyncio
+
+        part = file_name + '.part'
+        try:
+            await write(part)
+            return await asyncio.to_thread(self.commit, part, file_name, source)
+        finally:
+            if os.path.exists(part):
+                os.remove(part)
+
+    def commit(self, part, file_name, source=None):
+        """Move a fully written temp file into the store and link file_name to it."""
+        digest = hashlib.sha256()
+        with open(part, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+            os.fsync(f.fileno())
+        checksum = digest.hexdigest()
+        size = os.path.getsize(part)
+        path = self.object_path(checksum)
+        with self.lock:
+            if os.path.exists(path):
+                os.remove(part)  # Same content as a document already stored
+                self.linked += 1
+                self.linked_bytes += size
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(part, path)
+                fsync_dir(os.path.dirname(path))
+                self.stored += 1
+            self.link(path, file_name)
+            self.checksums[file_name] = checksum
+        self.manifest.record_object(checksum, size, source if self.is_url(source) else None)
+        return checksum
+
+    def link(self, path, file_name):
+        """Point file_name at a stored object, replacing whatever was there in one rename."""
+        temp = file_name + '.link'
+        if os.path.exists(temp):
+            os.remove(temp)
+        try:
+            os.link(path, temp)
+        except OSError:
+            shutil.copyfile(path, temp)
+        os.replace(temp, file_name)
+        fsync_dir(os.path.dirname(os.path.abspath(file_name)))
+
+    def link_source(self, source, file_name):
+        """Link file_name to the document already downloaded from source, if any; returns whether it was."""
+        if not self.is_url(source):
+            return False
+        checksum = self.manifest.source_checksum(source)
+        if not checksum:
+            return False
+        path = self.object_path(checksum)
+        with self.lock:
+            if not os.path.isfile(path):
+                return False
+            self.link(path, file_name)
+            self.checksums[file_name] = checksum
+            self.linked += 1
+            self.linked_bytes += os.path.getsize(path)
+        return True
+
+    @staticmethod
+    def is_url(source):
+        return bool(source) and source.startswith(('http://', 'https://'))
+
+    def pop_checksum(self, file_name):
+        """The checksum of a document stored in this run, once, for the manifest to record."""
+        with self.lock:
+            return self.checksums.pop(file_name, None)
+
+    def report(self):
+        if not (self.stored or self.linked):
+            return
+        print(
+            f"Document store: {self.stored} new documents, {self.linked} duplicates linked"
+            f" (~{self.linked_bytes / 1_000_000:.1f} MB not stored twice)"
+        )
@@ -0,0 +1,141 @@
+# SPDX-FileCopyrightText: 2023-present David C Wang <dcwangmit01@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+
+"""Span tracing of a run, exported as JSON lines or Chrome trace events, with a slowest-steps summary."""
+
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+# Attributes (account, phase, page) that spans started in the current thread or task inherit
+_context = contextvars.ContextVar('trace_context', default={})
+
+
+def lane():
+    """Name of what a span runs on: the asyncio task if there is one, else the thread."""
+    # Only the async engine imports asyncio; without it there is no task to name
+    asyncio = sys.modules.get('asyncio')
+    try:
+        task = asyncio.current_task() if asyncio else None
+    except RuntimeError:
+        task = None
+    return task.get_name() if task else threading.current_thread().name
+
+
+def outcome_of(future):
+    if future.cancelled():
+        return "cancelled"
+    error = future.exception()
+    return f"error: {type(error).__name__}: {error}" if error else "ok"
+
+
+class Tracer:
+    """Records spans: a step's name, start, duration, account, result page and outcome.
+
+    Spans may be recorded from any thread or task, and inherit the attributes set with context() around them.
+    Start times are seconds since the tracer was created.  Only running totals per account and step are kept for
+    the summary, so memory stays flat however long the run; the spans themselves are kept only with keep, for
+    writing them out at the end.
+    """
+
+    def __init__(self, keep=False):
+        self.lock = threading.Lock()
+        self.keep = keep
+        self.spans = []
+        self.totals = defaultdict(lambda: defaultdict(lambda: [0, 0.0, 0.0]))  # Count, total and max duration
+        self.origin = time.perf_counter()
+
+    def record(self, span, start, end):
+        span.update(start=start - self.origin, duration=end - start, lane=span.get('lane') or lane())
+        with self.lock:
+            total = self.totals[span['account'] or '(run)'][span['name']]
+            total[0] += 1
+            total[1] += span['duration']
+            total[2] = max(total[2], span['duration'])
+            if self.keep:
+                self.spans.append(span)
+
+    @contextmanager
+    def context(self, **attrs):
+        """Set attributes, e.g. the account, of the spans started within the body."""
+        token = _context.set({**_context.get(), **attrs})
+        try:
+            yield
+        finally:
+            _context.reset(token)
+
+    def new_span(self, name, attrs):
+        return {'name': name, 'account': None, 'page': None, **_context.get(), **attrs}
+
+    @contextmanager
+    def span(self, name, **attrs):
+        """Time the body as a span.  The body may set the outcome (default "ok") on the yielded dict."""
+        span = self.new_span(name, attrs)
+        start = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            span['outcome'] = f"error: {type(e).__name__}: {e}"
+            raise
+        finally:
+            span.setdefault('outcome', "ok")
+            self.record(span, start, time.perf_counter())
+
+    def track(self, name, future, **attrs):
+        """Record a span from now until a background future or task is done."""
+        span = self.new_span(name, dict(attrs, lane=f"{lane()} (background)"))
+        start = time.perf_counter()
+        future.add_done_callback(
+            lambda future: self.record(dict(span, outcome=outcome_of(future)), start, time.perf_counter())
+        )
+
+    def write_jsonl(self, path):
+        with open(path, 'w') as f:
+            for span in self.spans:
+                f.write(json.dumps(span) + "\n")
+        print(f"Wrote {len(self.spans)} spans to {path}")
+
+    def write_chrome_trace(self, path):
+        """Write a trace-event file for chrome://tracing or https://ui.perfetto.dev, one row per lane."""
+        lanes = {}
+        events = []
+        for span in self.spans:
+            tid = lanes.setdefault(span['lane'], len(lanes) + 1)
+            args = {key: value for key, value in span.items() if key not in ('name', 'start', 'duration', 'lane')}
+            events.append(
+                {
+                    'name': span['name'],
+                    'cat': span['account'] or 'run',
+                    'ph': 'X',
+                    'ts': span['start'] * 1e6,
+                    'dur': span['duration'] * 1e6,
+                    'pid': os.getpid(),
+                    'tid': tid,
+                    'args': args,
+                }
+            )
+        for name, tid in lanes.items():
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': tid, 'args': {'name': name}})
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+        print(f"Wrote Chrome trace of {len(self.spans)} spans to {path}")
+
+    def summary(self, top=5):
+        """Print the steps that took the most time in total, per account."""
+        if not self.totals:
+            return
+        print("Slowest steps per account:")
+        for account, steps in self.totals.items():
+            print(f"  {account}")
+            slowest = sorted(steps.items(), key=lambda item: -item[1][1])[:top]
+            for name, (count, total, longest) in slowest:
+                print(
+                    f"    {name:<20} {count:>5} x  avg {total / count:6.2f}s"
+                    f"  max {longest:6.2f}s  total {total:7.1f}s"
+                )
@@ -0,0 +1,257 @@
+# SPDX-FileCopyrightText: 2023-present David C Wang <dcwangmit01@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+
+"""Readiness-based waits with an optional human jitter floor and per-step timing."""
+
+import random
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager, contextmanager
+
+# Returns a cheap signature of the result table: the row count plus the text of the first row
+TABLE_SIGNATURE_JS = """
+selector => {
+    const rows = document.querySelectorAll(selector);
+    return rows.length + ':' + (rows.length ? rows[0].innerText : '');
+}
+"""
+
+TABLE_CHANGED_JS = f"""
+([selector, previous]) => ({TABLE_SIGNATURE_JS})(selector) !== previous
+"""
+
+
+class Waiter:
+    """Wait on concrete page conditions instead of fixed sleeps.
+
+    Every wait is tagged with a step name.  Once the condition is met, the elapsed time is
+    topped up to the step's floor (plus random jitter) so a human-like minimum pause can be
+    kept where the site needs one.  The real duration of every wait is recorded per step.
+
+    With a rate governor, each step is also paced to the rate the governor has learned for it, and
+    reports back how fast the step went or that it timed out.
+    """
+
+    def __init__(
+        self, floors=None, jitter=0.0, timeout=30000, idle_timeout=1500, response_timeout=10000, governor=None
+    ):
+        self.governor = governor
+        self.floors = floors or {}
+        self.jitter = jitter
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout  # Network idle is only a fallback: the site's analytics never go quiet
+        self.response_timeout = response_timeout
+        self.timings = defaultdict(list)
+
+    @staticmethod
+    def parse_floors(spec):
+        """Parse "0.5,login-form=2,pagination=1" into {step: seconds}; a bare number sets the default ("*")."""
+        floors = {}
+        for part in (spec or "").split(","):
+            part = part.strip()
+            if not part:
+                continue
+            if "=" in part:
+                step, seconds = part.split("=", 1)
+                floors[step.strip()] = float(seconds)
+            else:
+                floors["*"] = float(part)
+        return floors
+
+    def floor_for(self, step):
+        return self.floors.get(step, self.floors.get("*", 0.0))
+
+    def _remaining(self, step, started):
+        """Seconds still needed to reach the step's floor (plus jitter)."""
+        floor = self.floor_for(step)
+        if self.jitter:
+            floor += random.uniform(0, self.jitter)
+        return floor - (time.monotonic() - started)
+
+    def _failed(self, step, started, error):
+        # Record failed waits too, but don't pile the floor on top of a timeout
+        self.timings[step].append(time.monotonic() - started)
+        if self.governor and type(error).__name__ == 'TimeoutError':
+            self.governor.congestion(step, "timeout")
+
+    def _finish(self, step, started):
+        if self.governor:
+            self.governor.success(step, time.monotonic() - started)
+        remaining = self._remaining(step, started)
+        if remaining > 0:
+            time.sleep(remaining)
+        self.timings[step].append(time.monotonic() - started)
+
+    @contextmanager
+    def _timed(self, step):
+        if self.governor:
+            self.governor.acquire(step)
+        started = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            self._failed(step, started, e)
+            raise
+        self._finish(step, started)
+
+    def pause(self, step):
+        """Wait for nothing but the step's floor, e.g. between filling a form and submitting it."""
+        with self._timed(step):
+            pass
+
+    def for_selector(self, step, page, selector, state="visible", timeout=None):
+        with self._timed(step):
+            return page.wait_for_selector(selector, state=state, timeout=self.timeout if timeout is None else timeout)
+
+    def for_url(self, step, page, url, timeout=None):
+        with self._timed(step):
+            page.wait_for_url(url, timeout=self.timeout if timeout is None else timeout)
+
+    def for_function(self, step, page, expression, arg=None, timeout=None):
+        with self._timed(step):
+            return page.wait_for_function(expression, arg=arg, timeout=self.timeout if timeout is None else timeout)
+
+    def for_network_idle(self, step, page, timeout=None):
+        """Wait until the page has had no network traffic for 500ms, for at most idle_timeout.
+
+        The SPA keeps some analytics connections open, so idle is best effort: on timeout we continue.
+        """
+        with self._timed(step):
+            self._network_idle(page, timeout)
+
+    def _network_idle(self, page, timeout=None):
+        try:
+            page.wait_for_load_state("networkidle", timeout=self.idle_timeout if timeout is None else timeout)
+        except Exception:
+            pass
+
+    def for_response(self, step, page, predicate, action, timeout=None):
+        """Run action() (e.g. a click) and wait for the first response matching predicate.
+
+        If none comes within response_timeout, e.g. because the site answered from its cache, fall back to a
+        short network idle wait.
+        """
+        acted = False
+        with self._timed(step):
+            try:
+                with page.expect_response(predicate, timeout=self.response_timeout if timeout is None else timeout):
+                    action()
+                    acted = True
+            except Exception as e:
+                if not acted or type(e).__name__ != 'TimeoutError':
+                    raise
+                self._network_idle(page)
+
+    def table_signature(self, page, selector="tbody > tr"):
+        return page.evaluate(TABLE_SIGNATURE_JS, selector)
+
+    def for_table_change(self, step, page, previous, selector="tbody > tr", timeout=None):
+        """Wait until the table's row count or first row differs from a previous table_signature()."""
+        return self.for_function(step, page, TABLE_CHANGED_JS, arg=[selector, previous], timeout=timeout)
+
+    @contextmanager
+    def for_download(self, step, page, timeout=None):
+        """Context manager around page.expect_download(); the wait ends when the download starts."""
+        with self._timed(step):
+            with page.expect_download(timeout=self.timeout if timeout is None else timeout) as download_info:
+                yield download_info
+
+    def merge(self, other):
+        """Fold another waiter's timings into this one, e.g. from a worker."""
+        for step, times in other.timings.items():
+            self.timings[step].extend(times)
+
+    def report(self):
+        """Print how long each step actually waited, so floors can be tuned per step."""
+        if not self.timings:
+            return
+        print("Wait summary (seconds):")
+        print(f"  {'step':<24} {'count':>6} {'total':>9} {'avg':>7} {'max':>7} {'floor':>6}")
+        for step, times in sorted(self.timings.items(), key=lambda item: -sum(item[1])):
+            print(
+                f"  {step:<24} {len(times):>6} {sum(times):>9.2f} {sum(times) / len(times):>7.2f}"
+                f" {max(times):>7.2f} {self.floor_for(step):>6.2f}"
+            )
+
+
+class AsyncWaiter(Waiter):
+    """Waiter for playwright.async_api pages, with the same steps, floors and report."""
+
+    async def _finish(self, step, started):
+        if self.governor:
+            self.governor.success(step, time.monotonic() - started)
+        remaining = self._remaining(step, started)
+        if remaining > 0:
+            import asyncio
+
+            await asyncio.sleep(remaining)
+        self.timings[step].append(time.monotonic() - started)
+
+    @asynccontextmanager
+    async def _timed(self, step):
+        if self.governor:
+            await self.governor.acquire_async(step)
+        started = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            self._failed(step, started, e)
+            raise
+        await self._finish(step, started)
+
+    async def pause(self, step):
+        async with self._timed(step):
+            pass
+
+    async def for_selector(self, step, page, selector, state="visible", timeout=None):
+        async with self._timed(step):
+            return await page.wait_for_selector(
+                selector, state=state, timeout=self.timeout if timeout is None else timeout
+            )
+
+    async def for_url(self, step, page, url, timeout=None):
+        async with self._timed(step):
+            await page.wait_for_url(url, timeout=self.timeout if timeout is None else timeout)
+
+    async def for_function(self, step, page, expression, arg=None, timeout=None):
+        async with self._timed(step):
+            return await page.wait_for_function(
+                expression, arg=arg, timeout=self.timeout if timeout is None else timeout
+            )
+
+    async def for_network_idle(self, step, page, timeout=None):
+        async with self._timed(step):
+            await self._network_idle(page, timeout)
+
+    async def _network_idle(self, page, timeout=None):
+        try:
+            await page.wait_for_load_state("networkidle", timeout=self.idle_timeout if timeout is None else timeout)
+        except Exception:
+            pass
+
+    async def for_response(self, step, page, predicate, action, timeout=None):
+        acted = False
+        async with self._timed(step):
+            try:
+                async with page.expect_response(
+                    predicate, timeout=self.response_timeout if timeout is None else timeout
+                ):
+                    await action()
+                    acted = True
+            except Exception as e:
+                if not acted or type(e).__name__ != 'TimeoutError':
+                    raise
+                await self._network_idle(page)
+
+    async def table_signature(self, page, selector="tbody > tr"):
+        return await page.evaluate(TABLE_SIGNATURE_JS, selector)
+
+    async def for_table_change(self, step, page, previous, selector="tbody > tr", timeout=None):
+        return await self.for_function(step, page, TABLE_CHANGED_JS, arg=[selector, previous], timeout=timeout)
+
+    @asynccontextmanager
+    async def for_download(self, step, page, timeout=None):
+        async with self._timed(step):
+            async with page.expect_download(timeout=self.timeout if timeout is None else timeout) as download_info:
+                yield download_info
@@ -0,0 +1,45 @@
+# SPDX-FileCopyrightText: 2023-present David C Wang <dcwangmit01@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+
+from datetime import datetime
+
+import pytest
+
+from schwab_downloader.cli import SchwabDownloader
+from schwab_downloader.manifest import Manifest
+from schwab_downloader.store import DocumentStore
+
+PDF = b'%PDF-1.4\n1 0 obj <<>> endobj\ntrailer <<>>\n%%EOF\n'
+
+ACCOUNT = {'number': '1234-5678', 'name': 'My Account', 'type': 'brokerage'}
+
+
+def write_pdf(path, body=b''):
+    """Write a small but complete PDF, made distinct by body."""
+    with open(path, 'wb') as f:
+        f.write(PDF[:-6] + body + PDF[-6:])
+
+
+@pytest.fixture
+def manifest(tmp_path):
+    manifest = Manifest(str(tmp_path / 'manifest.sqlite'))
+    yield manifest
+    manifest.close()
+
+
+@pytest.fixture
+def store(tmp_path, manifest):
+    return DocumentStore(str(tmp_path), manifest)
+
+
+@pytest.fixture
+def downloader(tmp_path, manifest, store):
+    """A downloader without a browser, over a temporary target directory, for 2024."""
+    downloader = SchwabDownloader(None, {})
+    downloader.target_dir = str(tmp_path)
+    downloader.manifest = manifest
+    downloader.store = store
+    downloader.start_date = datetime(2024, 1, 1)
+    downloader.end_date = datetime(2024, 12, 31)
+    return downloader
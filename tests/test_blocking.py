@@ -0,0 +1,94 @@
+# SPDX-FileCopyrightText: 2023-present David C Wang <dcwangmit01@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+
+import pytest
+
+from schwab_downloader.blocking import ResourceBlocker
+
+LOGO = 'https://client.schwab.com/static/logo.png'
+CHECK_IMAGE = 'https://client.schwab.com/app/checkimage?id=123&side=front'
+TRACKER = 'https://www.googletagmanager.com/gtm.js'
+THIRD_PARTY = 'https://cdn.example.com/widget.js'
+
+
+def test_unknown_profile_is_an_error():
+    with pytest.raises(ValueError, match="Unknown --block-resources profile"):
+        ResourceBlocker('everything')
+
+
+@pytest.mark.parametrize(
+    'profile, url, resource_type, blocked',
+    [
+        ('media', LOGO, 'image', True),
+        ('media', 'https://client.schwab.com/fonts/a.woff2', 'font', True),
+        ('media', TRACKER, 'script', False),
+        ('trackers', TRACKER, 'script', True),
+        ('trackers', THIRD_PARTY, 'script', False),
+        ('strict', THIRD_PARTY, 'script', True),
+        ('strict', 'https://client.schwab.com/app.js', 'script', False),
+        ('strict', TRACKER, 'document', False),
+        ('strict', 'https://client.schwab.com/statement.pdf', 'image', False),
+    ],
+)
+def test_profiles(profile, url, resource_type, blocked):
+    assert ResourceBlocker(profile).should_block(url, resource_type) == blocked
+
+
+@pytest.mark.parametrize('profile', ['media', 'trackers', 'strict'])
+def test_check_images_are_never_blocked(profile):
+    assert not ResourceBlocker(profile).should_block(CHECK_IMAGE, 'image')
+
+
+def test_images_load_while_a_details_modal_is_saved():
+    blocker = ResourceBlocker('strict')
+    with blocker.saving_document():
+        with blocker.saving_document():
+            assert not blocker.should_block(LOGO, 'image')
+        assert not blocker.should_block(LOGO, 'image')
+        assert blocker.should_block(TRACKER, 'script')
+    assert blocker.should_block(LOGO, 'image')
+
+
+def test_render_pages_load_images_but_not_trackers():
+    blocker = ResourceBlocker('strict')
+    assert not blocker.should_block(LOGO, 'image', media=False)
+    assert blocker.should_block(TRACKER, 'script', media=False)
+
+
+class Request:
+    def __init__(self, url, resource_type):
+        self.url = url
+        self.resource_type = resource_type
+
+
+class Route:
+    def __init__(self, url, resource_type):
+        self.request = Request(url, resource_type)
+        self.outcome = None
+
+    def abort(self, reason):
+        self.outcome = reason
+
+    def continue_(self):
+        self.outcome = 'continued'
+
+
+def test_route_handlers_count_what_they_block():
+    blocker = ResourceBlocker('media')
+    routes = [Route(LOGO, 'image'), Route(CHECK_IMAGE, 'image'), Route(TRACKER, 'script')]
+    for route in routes:
+        blocker.handle(route)
+    render = Route(LOGO, 'image')
+    blocker.handle_render(render)
+    assert [route.outcome for route in routes + [render]] == ['blockedbyclient', 'continued', 'continued', 'continued']
+    assert blocker.blocked == {'image': 1}
+    assert blocker.allowed == {'image': 2, 'script': 1}
+
+
+def test_blocked_bytes_are_estimated_from_allowed_traffic():
+    blocker = ResourceBlocker('media')
+    assert blocker.estimated_bytes('image') == 30_000
+    blocker.allowed['image'] = 2
+    blocker.allowed_bytes['image'] = 10_000
+    assert blocker.estimated_bytes('image') == 5_000
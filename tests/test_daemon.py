@@ -0,0 +1,81 @@
+# SPDX-FileCopyrightText: 2023-present David C Wang <dcwangmit01@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+
+import json
+import os
+import stat
+import threading
+import urllib.error
+
+import pytest
+
+from schwab_downloader import daemon
+from schwab_downloader.daemon import STATE_FILE, DaemonClient, DaemonServer, JobQueue, job_args, local_options
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    """A daemon's HTTP server, writing its state file to a temporary directory."""
+    monkeypatch.chdir(tmp_path)
+    with open(STATE_FILE, 'w') as f:
+        f.write('{}')  # A stale state file, as a killed daemon leaves
+    os.chmod(STATE_FILE, 0o644)
+    server = DaemonServer(0, JobQueue())
+    server.start()
+    yield server
+    server.stop()
+
+
+def test_state_file_is_readable_by_its_user_only(server):
+    assert stat.S_IMODE(os.stat(STATE_FILE).st_mode) == 0o600
+    with open(STATE_FILE) as f:
+        state = json.load(f)
+    assert state['port'] == server.server_address[1] and state['token'] == server.token
+
+
+def test_requests_need_the_token(server):
+    assert DaemonClient.connect().request('GET', '/health') == {'ok': True}
+    for token in ('wrong', ''):
+        with pytest.raises(urllib.error.HTTPError) as refused:
+            DaemonClient(server.server_address[1], token).request('POST', '/jobs', {'--year': '2024'})
+        assert refused.value.code == 401
+    assert server.jobs.get(1) is None
+
+
+def test_stopped_daemon_leaves_no_state_file(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    server = DaemonServer(0, JobQueue())
+    server.start()
+    server.stop()
+    assert not os.path.exists(STATE_FILE)
+    assert DaemonClient.connect() is None
+
+
+def test_job_is_run_and_reported(server, monkeypatch, capsys):
+    monkeypatch.setattr(daemon, 'POLL', 0.01)
+
+    def work():
+        job = server.jobs.next(timeout=5)
+        server.jobs.update(job['id'], state='done')
+
+    worker = threading.Thread(target=work)
+    worker.start()
+    assert DaemonClient.connect().run({'--year': '2024', '--headless': True})
+    worker.join()
+    assert server.jobs.get(1)['args'] == job_args({'--year': '2024'})
+    assert "Job 1 done" in capsys.readouterr().out
+
+
+def test_job_with_options_it_cant_set_is_refused(server):
+    client = DaemonClient.connect()
+    with pytest.raises(urllib.error.HTTPError) as refused:
+        client.request('POST', '/jobs', {'--headless': True})
+    assert refused.value.code == 400
+    assert json.load(refused.value) == {'error': "Options a job can't set: --headless"}
+
+
+def test_local_options_are_the_non_default_ones_a_job_cant_carry():
+    defaults = {'--year': '<CUR_YEAR>', '--headless': False, '--workers': '1', '--no-daemon': False}
+    args = dict(defaults, **{'--year': '2024', '--headless': True, '--no-daemon': True})
+    assert local_options(args, defaults) == ['--headless']
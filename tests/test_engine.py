@@ -0,0 +1,272 @@
+# SPDX-FileCopyrightText: 2023-present David C Wang <dcwangmit01@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+
+import concurrent.futures
+from datetime import datetime, timedelta
+
+import pytest
+
+from schwab_downloader.cli import SchwabDownloader
+from schwab_downloader.export import CsvExporter, row_key
+from schwab_downloader.filters import WorkFilter
+from schwab_downloader.manifest import INCREMENTAL_LOOKBACK_DAYS
+from schwab_downloader.waits import Waiter
+
+from .conftest import ACCOUNT, write_pdf
+
+# Result pages of a history table, newest first: (date, type) per row
+PAGES = [
+    [('01/05/2025', 'Buy'), ('01/05/2024', 'Buy'), ('01/04/2024', 'Dividend'), ('01/04/2024', 'Dividend')],
+    [('01/04/2024', 'Dividend'), ('01/03/2024', 'Sell')],
+    [('12/01/2023', 'Buy')],
+]
+
+
+class Link:
+    def __init__(self, present):
+        self.present = present
+
+    def count(self):
+        return int(self.present)
+
+
+class Locator:
+    def __init__(self, present=True):
+        self.first = Link(present)
+
+    def locator(self, selector):
+        return Locator()
+
+
+class Table(SchwabDownloader):
+    """A downloader paging through PAGES instead of a browser's result table."""
+
+    def __init__(self, downloader):
+        self.__dict__.update(downloader.__dict__)
+        self.current = 0
+        self.page = self
+
+    def locator(self, selector):
+        return Locator(self.current + 1 < len(PAGES))
+
+    def extract_table_rows(self):
+        return [{'index': index, 'cells': cells} for index, cells in enumerate(PAGES[self.current])]
+
+    def row_locator(self, index):
+        return Locator()
+
+    def seek_end_date(self, account, fn_process_row):
+        self.current = 0
+        return 1
+
+    def restore_page(self, number):
+        self.current = number - 1
+        return number
+
+    def turn_page(self, link):
+        self.current += 1
+
+
+@pytest.fixture
+def table(downloader):
+    return Table(downloader)
+
+
+class Saver:
+    """fn_click_save of a pass: saves a document to the store, or fails in the background for the names in fail."""
+
+    def __init__(self, store, fail=()):
+        self.store = store
+        self.fail = set(fail)
+        self.saved = []
+
+    def __call__(self, file_name, details_link, row):
+        name = file_name.rsplit('/', 1)[-1]
+        if name in self.fail:
+            saving = concurrent.futures.Future()
+            saving.set_exception(OSError("connection reset"))
+            return saving
+        self.store.save(file_name, write_pdf)
+        self.saved.append(name)
+        return None
+
+
+def process_row(table):
+    def parse(row, account):
+        date_text, type_text = row['cells']
+        date = datetime.strptime(date_text, "%m/%d/%Y")
+        file_name = f"{table.target_dir}/{date:%Y%m%d}_{type_text}.pdf"
+        return file_name, 'button', date, {'date': date, 'type': type_text}
+
+    return parse
+
+
+def test_pass_numbers_repeats_and_stops_at_start_date(table, manifest):
+    saver = Saver(table.store)
+    table.process_page(ACCOUNT, process_row(table), saver, 'history')
+    assert saver.saved == [
+        '20240105_Buy.pdf',
+        '20240104_Dividend.pdf',
+        '20240104_Dividend_2.pdf',
+        '20240104_Dividend_3.pdf',
+        '20240103_Sell.pdf',
+    ]
+    assert table.checkpoint(ACCOUNT, 'history')['done']
+    assert manifest.synced_range(ACCOUNT['number'], 'history') == (table.start_date, table.end_date)
+
+
+def test_failed_save_resumes_its_page_with_the_same_names(table, manifest):
+    saver = Saver(table.store, fail={'20240104_Dividend_3.pdf'})
+    table.process_page(ACCOUNT, process_row(table), saver, 'history')
+    checkpoint = table.checkpoint(ACCOUNT, 'history')
+    assert (checkpoint['page'], checkpoint['row'], checkpoint['done']) == (1, 3, False)
+    assert checkpoint['repeats'] == {'date': '20240104', 'names': {f'{table.target_dir}/20240104_Dividend.pdf': 2}}
+    assert manifest.synced_range(ACCOUNT['number'], 'history') is None
+
+    saver = Saver(table.store)
+    table.process_page(ACCOUNT, process_row(table), saver, 'history')
+    assert saver.saved == ['20240104_Dividend_3.pdf', '20240103_Sell.pdf']
+    assert table.checkpoint(ACCOUNT, 'history')['done']
+
+
+def test_filtered_pass_is_not_marked_synced(table, manifest):
+    table.filters = WorkFilter(transaction_types=['dividend'])
+    saver = Saver(table.store)
+    table.process_page(ACCOUNT, process_row(table), saver, 'history')
+    assert saver.saved == ['20240104_Dividend.pdf', '20240104_Dividend_2.pdf', '20240104_Dividend_3.pdf']
+    assert manifest.synced_range(ACCOUNT['number'], 'history') is None
+
+
+def test_incremental_pass_stops_at_high_water_mark(table, manifest):
+    table.incremental = True
+    # Synced through a lookback after January 5th
+    synced_through = datetime(2024, 1, 5) + timedelta(days=INCREMENTAL_LOOKBACK_DAYS)
+    manifest.mark_synced(ACCOUNT['number'], 'history', table.start_date, synced_through)
+    saver = Saver(table.store)
+    table.process_page(ACCOUNT, process_row(table), saver, 'history')
+    assert saver.saved == ['20240105_Buy.pdf']
+
+
+def transaction(date, action, amount):
+    return {'transactionDate': date, 'action': action, 'description': 'VTI', 'quantity': 1, 'amount': amount}
+
+
+PAYLOAD = {
+    'transactions': [
+        transaction('2024-03-01', 'Buy', -100),
+        transaction('2024-02-01', 'Buy', -100),
+        transaction('2024-02-01', 'Buy', -100),
+        transaction('2023-12-01', 'Buy', -100),
+    ]
+}
+
+
+def test_api_transactions_are_named_like_table_rows(downloader):
+    names = [t['file_name'].rsplit('/', 1)[-1] for t in downloader.history_transactions(ACCOUNT, [PAYLOAD])]
+    assert names == [
+        'schwab_brokerage_5678_MyAccount_20240301_Buy_100.00_Vti.pdf',
+        'schwab_brokerage_5678_MyAccount_20240201_Buy_100.00_Vti.pdf',
+        'schwab_brokerage_5678_MyAccount_20240201_Buy_100.00_Vti_2.pdf',
+        'schwab_brokerage_5678_MyAccount_20231201_Buy_100.00_Vti.pdf',
+    ]
+
+
+@pytest.mark.parametrize(
+    'payloads, table_rows',
+    [
+        ([], 0),
+        ([dict(PAYLOAD, hasMore=True)], 0),
+        ([PAYLOAD], 10),
+    ],
+)
+def test_incomplete_api_history_scrapes_the_table(downloader, payloads, table_rows):
+    assert downloader.history_start_date(ACCOUNT, downloader.start_date, payloads, table_rows) == downloader.start_date
+
+
+def test_api_history_pages_back_to_oldest_missing_document(downloader):
+    transactions = downloader.history_transactions(ACCOUNT, [PAYLOAD])
+    write_pdf(transactions[0]['file_name'])
+    start_date = downloader.history_start_date(ACCOUNT, downloader.start_date, [PAYLOAD], 3)
+    assert start_date == datetime(2024, 2, 1)
+
+
+def test_api_history_without_missing_documents_is_synced(downloader, manifest):
+    for transaction in downloader.history_transactions(ACCOUNT, [PAYLOAD]):
+        write_pdf(transaction['file_name'])
+    assert downloader.history_start_date(ACCOUNT, downloader.start_date, [PAYLOAD], 3) is None
+    assert downloader.checkpoint(ACCOUNT, 'history')['done']
+    assert manifest.synced_range(ACCOUNT['number'], 'history') == (downloader.start_date, downloader.end_date)
+    assert manifest.document_count(ACCOUNT['number'], 'history', downloader.start_date, downloader.end_date) == 3
+
+
+def test_export_key_is_the_same_from_table_or_api(downloader, tmp_path):
+    path = str(tmp_path / 'rows.csv')
+    downloader.exporter = CsvExporter(path)
+    downloader.history_start_date(ACCOUNT, downloader.start_date, [PAYLOAD], 3)
+    assert len(downloader.exporter.keys) == 3
+    renamed = dict(ACCOUNT, name='Renamed Account')
+    for transaction in downloader.history_transactions(renamed, [PAYLOAD])[:3]:
+        downloader.export_row(renamed, 'history', transaction, transaction['file_name'], transaction['repeat'])
+    assert len(downloader.exporter.keys) == 3
+    downloader.export_row(ACCOUNT, 'statements', downloader.history_transactions(ACCOUNT, [PAYLOAD])[0], 'a.pdf')
+    assert len(downloader.exporter.keys) == 4
+    downloader.exporter.close()
+
+
+class DialogPage:
+    """Answers the account details script like a summary whose second dialog has no close button."""
+
+    def __init__(self):
+        self.keyboard = self
+        self.actions = []
+
+    def evaluate(self, script, args):
+        start = args[2]
+        self.actions.append(('evaluate', start))
+        if start == 0:
+            return {'accounts': [{'Name': 'A'}, {'Name': 'B'}], 'next': 2}
+        return {'accounts': [{'Name': 'C'}], 'next': None}
+
+    def press(self, key):
+        self.actions.append(('press', key))
+
+    def wait_for_selector(self, selector, state, timeout):
+        self.actions.append(('wait', state))
+
+
+def test_dialog_without_close_button_is_closed_with_a_key_press(downloader):
+    downloader.page = DialogPage()
+    downloader.waiter = Waiter()
+    assert downloader.evaluate_account_dialogs() == [{'Name': 'A'}, {'Name': 'B'}, {'Name': 'C'}]
+    assert downloader.page.actions == [('evaluate', 0), ('press', 'Escape'), ('wait', 'hidden'), ('evaluate', 2)]
+
+
+def test_table_row_is_keyed_like_its_api_transaction(downloader):
+    cells = ['03/01/2024', 'Buy', 'VTI', '1', '$100.00', '', '-$100.00']
+    _, _, _, record = downloader.process_history_row({'cells': cells, 'buttons': []}, ACCOUNT)
+    api = downloader.history_transactions(ACCOUNT, [PAYLOAD])[0]
+    assert row_key(ACCOUNT['number'], 'history', record) == row_key(ACCOUNT['number'], 'history', api, api['repeat'])
+
+
+def test_options_with_an_unknown_phase_are_rejected_before_launch():
+    with pytest.raises(ValueError, match="Unknown phases"):
+        SchwabDownloader.check_options({'--phases': 'history,trades'})
+
+
+class Run(SchwabDownloader):
+    """A run whose login loads the accounts, and whose finish only records that it ran."""
+
+    def start(self):
+        self.all_accounts = {ACCOUNT['number']: ACCOUNT}
+
+    def finish(self):
+        self.finished = True
+
+
+def test_run_selecting_no_account_still_finishes():
+    run = Run(None, {'--date-range': None, '--year': '2024', '--accounts': 'nomatch', '--resume': True})
+    run.finished = False
+    with pytest.raises(ValueError, match="--accounts selects none"):
+        run.run()
+    assert run.finished
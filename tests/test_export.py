@@ -0,0 +1,88 @@
+# SPDX-FileCopyrightText: 2023-present David C Wang <dcwangmit01@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+
+import csv
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+from schwab_downloader.export import CsvExporter, Exporter, SqliteExporter, open_exporter, row_key
+
+
+def row(key, amount='-12.50'):
+    return {
+        'key': key,
+        'phase': 'history',
+        'account': '1234-5678',
+        'account_name': 'My Account',
+        'date': datetime(2024, 1, 31),
+        'type': 'Buy',
+        'description': 'VTI',
+        'quantity': '1',
+        'price': '12.50',
+        'fees': '',
+        'amount': amount,
+        'check_number': '',
+        'file_name': 'a.pdf',
+    }
+
+
+def test_open_exporter_by_extension(tmp_path):
+    assert isinstance(open_exporter(str(tmp_path / 'rows.csv')), CsvExporter)
+    assert isinstance(open_exporter(str(tmp_path / 'rows.sqlite')), SqliteExporter)
+    with pytest.raises(ValueError, match="Unknown export format"):
+        open_exporter(str(tmp_path / 'rows.xlsx'))
+
+
+def test_exporter_needs_a_write(tmp_path):
+    with pytest.raises(TypeError):
+        Exporter(str(tmp_path / 'rows'))
+
+
+def test_row_key_ignores_case_and_whitespace_and_numbers_repeats():
+    record = row('')
+    assert row_key('1234-5678', 'history', record) == row_key('1234-5678', 'history', dict(record, type=' BUY '))
+    assert row_key('1234-5678', 'history', record) != row_key('1234-5678', 'history', record, 2)
+    assert row_key('1234-5678', 'history', record) != row_key('1234-5678', 'history', dict(record, amount='-12.51'))
+
+
+def test_csv_appends_only_new_rows(tmp_path):
+    path = str(tmp_path / 'rows.csv')
+    exporter = CsvExporter(path)
+    exporter.add(row('a'))
+    exporter.add(row('a'))
+    exporter.add(row('b'))
+    exporter.close()
+
+    exporter = CsvExporter(path)
+    exporter.add(row('b'))
+    exporter.add(row('c'))
+    exporter.close()
+
+    with open(path, newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert [r['key'] for r in rows] == ['a', 'b', 'c']
+    assert rows[0]['date'] == '2024-01-31'
+    assert rows[0]['amount'] == '-12.50'
+
+
+def test_sqlite_appends_only_new_rows(tmp_path):
+    path = str(tmp_path / 'rows.sqlite')
+    exporter = SqliteExporter(path)
+    exporter.add(row('a'))
+    exporter.add(row('a'))
+    exporter.flush()
+    exporter.close()
+
+    exporter = SqliteExporter(path)
+    exporter.add(row('a'))
+    exporter.add(row('b', amount=''))
+    exporter.close()
+    assert exporter.added == 1
+
+    conn = sqlite3.connect(path)
+    rows = conn.execute("SELECT key, date, amount FROM transactions ORDER BY key").fetchall()
+    conn.close()
+    assert rows == [('a', '2024-01-31', -12.5), ('b', '2024-01-31', None)]
@@ -0,0 +1,132 @@
+# SPDX-FileCopyrightText: 2023-present David C Wang <dcwangmit01@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+
+import os
+import threading
+import urllib.error
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from schwab_downloader.fetch import DocumentFetcher, check_pdf, session_headers, stream_document
+
+from .conftest import PDF
+
+
+class Governor:
+    def __init__(self):
+        self.signals = []
+
+    def acquire(self, endpoint):
+        pass
+
+    def success(self, endpoint, seconds):
+        self.signals.append('success')
+
+    def congestion(self, endpoint, reason):
+        self.signals.append(reason)
+
+
+class Handler(BaseHTTPRequestHandler):
+    failures = {}  # path: responses to fail with a 503 before serving it
+
+    def do_GET(self):
+        self.server.requests.append((self.path, self.headers.get('Cookie')))
+        if self.failures.get(self.path):
+            self.failures[self.path] -= 1
+            self.send_error(503)
+            return
+        if self.path == '/missing.pdf':
+            self.send_error(404)
+            return
+        body = PDF if self.path.endswith('.pdf') else b'<html>Log in</html>'
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def site():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, args=(0.01,), daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    Handler.failures.clear()
+
+
+def url(site, path):
+    return f"http://127.0.0.1:{site.server_address[1]}{path}"
+
+
+HEADERS = session_headers([{'name': 'sid', 'value': '1'}, {'name': 'csrf', 'value': '2'}], 'Agent', 'https://x/')
+
+
+def test_session_headers():
+    assert HEADERS == {
+        'Cookie': 'sid=1; csrf=2',
+        'User-Agent': 'Agent',
+        'Referer': 'https://x/',
+        'Accept': 'application/pdf,*/*',
+    }
+
+
+def test_check_pdf(tmp_path):
+    path = tmp_path / 'a.pdf'
+    path.write_bytes(PDF)
+    check_pdf(str(path), 'url')
+    path.write_bytes(b'<html>')
+    with pytest.raises(ValueError, match="Not a PDF"):
+        check_pdf(str(path), 'url')
+
+
+def test_stream_document_with_the_session_cookies(site, tmp_path):
+    governor = Governor()
+    path = str(tmp_path / 'a.pdf')
+    stream_document(url(site, '/a.pdf'), path, HEADERS, governor)
+    assert open(path, 'rb').read() == PDF
+    assert site.requests == [('/a.pdf', 'sid=1; csrf=2')]
+    assert governor.signals == ['success']
+
+
+def test_login_page_instead_of_a_document_fails(site, tmp_path):
+    with pytest.raises(ValueError, match="Not a PDF"):
+        stream_document(url(site, '/statement'), str(tmp_path / 'a.pdf'), HEADERS, Governor())
+
+
+def test_congestion_is_reported_to_the_governor(site, tmp_path):
+    Handler.failures['/a.pdf'] = 1
+    governor = Governor()
+    with pytest.raises(urllib.error.HTTPError):
+        stream_document(url(site, '/a.pdf'), str(tmp_path / 'a.pdf'), HEADERS, governor)
+    assert governor.signals == ["HTTP 503"]
+
+    with pytest.raises(urllib.error.HTTPError):
+        stream_document(url(site, '/missing.pdf'), str(tmp_path / 'a.pdf'), HEADERS, governor)
+    assert governor.signals == ["HTTP 503"]
+
+
+def test_fetcher_retries_into_the_store(site, tmp_path, store):
+    Handler.failures['/a.pdf'] = 1
+    fetcher = DocumentFetcher(2, store, 4, Governor(), retries=1, log=lambda *args: None)
+    file_name = str(tmp_path / 'a.pdf')
+    fetcher.submit(url(site, '/a.pdf'), file_name, HEADERS).result()
+    fetcher.shutdown()
+    assert store.has(file_name)
+    assert len(site.requests) == 2
+
+
+def test_fetcher_fails_once_out_of_retries(site, tmp_path, store):
+    fetcher = DocumentFetcher(2, store, 4, Governor(), log=lambda *args: None)
+    file_name = str(tmp_path / 'a.pdf')
+    with pytest.raises(urllib.error.HTTPError):
+        fetcher.submit(url(site, '/missing.pdf'), file_name, HEADERS).result()
+    fetcher.shutdown()
+    assert not os.path.exists(file_name)
@@ -0,0 +1,94 @@
+# SPDX-FileCopyrightText: 2023-present David C Wang <dcwangmit01@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+
+import pytest
+
+from schwab_downloader.filters import WorkFilter, normalize, split_list
+
+ACCOUNTS = {
+    '1234-5678': {'number': '1234-5678', 'name': 'Joint Brokerage', 'type': 'brokerage'},
+    '9876-4321': {'number': '9876-4321', 'name': 'Roth Contributory IRA', 'type': 'IRA'},
+    '5555-0001': {'number': '5555-0001', 'name': 'Checking', 'type': 'bank'},
+}
+
+
+def test_normalize():
+    assert normalize("Tax Forms") == normalize("tax form") == 'taxform'
+    assert normalize("1234-5678") == '12345678'
+
+
+def test_split_list():
+    assert split_list(None) is None
+    assert split_list("a, b,,c") == ['a', 'b', 'c']
+    assert split_list(['a', ' ']) == ['a']
+
+
+def test_no_filters_want_everything():
+    work = WorkFilter()
+    assert work.select_accounts(ACCOUNTS) == ACCOUNTS
+    assert work.phases == ('history', 'statements')
+    assert work.wants_row('history', {'type': 'Buy'})
+    assert not work.narrows('history') and not work.narrows('statements')
+
+
+@pytest.mark.parametrize(
+    'pattern, selected',
+    [
+        ('5678', ['1234-5678']),
+        ('1234-5678', ['1234-5678']),
+        ('roth', ['9876-4321']),
+        ('IRA', ['9876-4321']),
+        ('check', ['5555-0001']),
+        ('brokerage', ['1234-5678']),
+    ],
+)
+def test_accounts_by_number_suffix_name_or_type(pattern, selected):
+    assert list(WorkFilter(accounts=[pattern]).select_accounts(ACCOUNTS)) == selected
+
+
+def test_account_number_matches_its_end_only():
+    assert not WorkFilter(accounts=['1234']).wants_account(ACCOUNTS['1234-5678'])
+
+
+def test_accounts_selecting_none_is_an_error():
+    with pytest.raises(ValueError, match="selects none"):
+        WorkFilter(accounts=['nosuch']).select_accounts(ACCOUNTS)
+
+
+def test_unknown_phase_is_an_error():
+    with pytest.raises(ValueError, match="Unknown phases"):
+        WorkFilter(phases=['history', 'checks'])
+
+
+def test_phases_keep_their_order():
+    assert WorkFilter(phases=['statements', 'history']).phases == ('history', 'statements')
+
+
+def test_transaction_types_filter_history_rows():
+    work = WorkFilter(transaction_types=['dividend'])
+    assert work.wants_row('history', {'type': 'Qualified Dividend'})
+    assert not work.wants_row('history', {'type': 'Buy'})
+    assert work.wants_row('statements', {'type': 'Statement'})
+    assert work.narrows('history') and not work.narrows('statements')
+
+
+def test_doc_types_match_type_or_description():
+    work = WorkFilter(doc_types=['1099'])
+    assert work.wants_row('statements', {'type': 'Tax Form', 'description': '1099 Composite'})
+    assert not work.wants_row('statements', {'type': 'Statement', 'description': 'Brokerage Statement'})
+
+
+def test_doc_type_buttons():
+    labels = ['Statements', 'Tax Forms', 'Letters']
+    assert WorkFilter(doc_types=['tax form']).doc_type_buttons(labels) == [False, True, False]
+    # Nothing matches a document name such as 1099, so every type is searched and rows are filtered instead
+    assert WorkFilter(doc_types=['1099']).doc_type_buttons(labels) == [True, True, True]
+
+
+def test_from_args_prefers_cli_over_config(tmp_path):
+    config = tmp_path / 'config.toml'
+    config.write_text('[filters]\naccounts = ["roth"]\nphases = "statements"\n')
+    work = WorkFilter.from_args({'--config': str(config), '--accounts': '5678'})
+    assert list(work.select_accounts(ACCOUNTS)) == ['1234-5678']
+    assert work.phases == ('statements',)
@@ -0,0 +1,89 @@
+# SPDX-FileCopyrightText: 2023-present David C Wang <dcwangmit01@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+
+import re
+
+import pytest
+
+from schwab_downloader import governor
+from schwab_downloader.governor import DEFAULT_RATE, INCREASE, MIN_RATE, RateGovernor
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(governor.time, 'monotonic', clock)
+    return clock
+
+
+@pytest.fixture
+def pacer(clock):
+    return RateGovernor(20, re.compile(r'schwab\.com'))
+
+
+def test_unseen_endpoint_starts_at_default_rate(pacer):
+    assert pacer.rate('fetch') == DEFAULT_RATE
+    assert RateGovernor(2, re.compile('')).rate('fetch') == 2
+
+
+def test_fast_actions_increase_rate_additively(pacer):
+    pacer.success('fetch', 0.1)
+    pacer.success('fetch', 0.1)
+    assert pacer.rate('fetch') == DEFAULT_RATE + 2 * INCREASE
+
+
+def test_rate_is_capped_at_max_rate(pacer):
+    for _ in range(30):
+        pacer.success('fetch', 0.1)
+    assert pacer.rate('fetch') == 20
+
+
+def test_slow_action_does_not_increase_rate(pacer):
+    pacer.success('fetch', 0.1)
+    pacer.success('fetch', 1.0)
+    assert pacer.rate('fetch') == DEFAULT_RATE + INCREASE
+
+
+def test_congestion_halves_rate_once_per_cooldown(pacer, clock):
+    pacer.congestion('fetch', "HTTP 429")
+    pacer.congestion('fetch', "HTTP 503")
+    assert pacer.rate('fetch') == DEFAULT_RATE / 2
+    pacer.success('fetch', 0.1)
+    assert pacer.rate('fetch') == DEFAULT_RATE / 2
+    clock.now += governor.COOLDOWN
+    pacer.congestion('fetch', "timeout")
+    assert pacer.rate('fetch') == DEFAULT_RATE / 4
+    assert pacer.backoffs['fetch'] == 2
+
+
+def test_rate_never_drops_below_min_rate(pacer, clock):
+    for _ in range(20):
+        pacer.congestion('fetch', "timeout")
+        clock.now += governor.COOLDOWN
+    assert pacer.rate('fetch') == MIN_RATE
+
+
+def test_congestion_all_backs_off_every_endpoint(pacer):
+    pacer.load({'fetch': DEFAULT_RATE, 'pagination': DEFAULT_RATE})
+    pacer.congestion_all("HTTP 429")
+    assert pacer.rates == {'fetch': DEFAULT_RATE / 2, 'pagination': DEFAULT_RATE / 2}
+
+
+def test_load_clamps_learned_rates(pacer):
+    pacer.load({'fetch': 100, 'pagination': 0, 'login': 3})
+    assert pacer.rates == {'fetch': 20, 'pagination': MIN_RATE, 'login': 3}
+
+
+def test_reserve_spaces_actions_at_the_rate(pacer):
+    pacer.load({'fetch': 4})
+    assert [pacer.reserve('fetch') for _ in range(3)] == [0, 0.25, 0.5]
+    assert pacer.reserve('pagination') == 0
@@ -0,0 +1,95 @@
+# SPDX-FileCopyrightText: 2023-present David C Wang <dcwangmit01@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+
+from datetime import datetime
+
+import pytest
+
+from schwab_downloader.history_api import (
+    find_records,
+    parse_date,
+    transaction_from_record,
+    transactions_from_payloads,
+    truncation,
+)
+
+TRADE = {
+    'transactionDate': '2024-01-31T00:00:00',
+    'action': 'Buy',
+    'description': 'VANGUARD TOTAL STOCK MARKET ETF',
+    'quantity': 10,
+    'price': 250.5,
+    'fees': None,
+    'amount': -2505,
+}
+
+CHECK = {
+    'transactionDate': '01/15/2024',
+    'type': 'Check',
+    'checkNumber': '1001',
+    'description': 'CHECK PAID',
+    'withdrawal': '$1,250.00',
+    'deposit': None,
+}
+
+
+def test_parse_date():
+    assert parse_date('2024-01-31T00:00:00') == datetime(2024, 1, 31)
+    assert parse_date('01/31/2024') == datetime(2024, 1, 31)
+    with pytest.raises(ValueError):
+        parse_date('31.01.2024')
+
+
+def test_find_records_picks_the_largest_transaction_list():
+    payload = {'summary': [{'date': '2024-01-01'}], 'data': {'transactions': [TRADE, CHECK, {'note': 'x'}]}}
+    assert find_records(payload) == [TRADE, CHECK]
+
+
+def test_trade_record():
+    assert transaction_from_record(TRADE) == {
+        'date': datetime(2024, 1, 31),
+        'type': 'Buy',
+        'description': 'VANGUARD TOTAL STOCK MARKET ETF',
+        'quantity': '10',
+        'total': '2505.00',
+        'price': '250.50',
+        'fees': '',
+        'amount': '-2505.00',
+        'check_number': '',
+    }
+
+
+def test_bank_record_takes_amount_from_withdrawal_or_deposit():
+    check = transaction_from_record(CHECK)
+    assert (check['total'], check['amount'], check['check_number']) == ('1250.00', '-1250.00', '1001')
+    deposit = transaction_from_record(dict(CHECK, type='Deposit', withdrawal=None, deposit=99.5))
+    assert (deposit['total'], deposit['amount']) == ('99.50', '99.50')
+
+
+def test_transactions_newest_first_skipping_bad_records():
+    payload = {'transactions': [CHECK, TRADE, dict(TRADE, transactionDate='someday')]}
+    transactions = transactions_from_payloads([payload])
+    assert [transaction['date'] for transaction in transactions] == [datetime(2024, 1, 31), datetime(2024, 1, 15)]
+
+
+def test_payload_captured_twice_counts_once():
+    payload = {'transactions': [TRADE, CHECK]}
+    assert len(transactions_from_payloads([payload, payload])) == 2
+
+
+def test_complete_payload_is_not_truncated():
+    assert truncation({'transactions': [TRADE, CHECK]}) is None
+    assert truncation({'transactions': [TRADE, CHECK], 'totalCount': 2, 'hasMore': False}) is None
+
+
+@pytest.mark.parametrize(
+    'paging',
+    [
+        {'totalCount': 3},
+        {'hasMore': True},
+        {'paging': {'nextPageToken': 'abc'}},
+    ],
+)
+def test_paged_payload_is_truncated(paging):
+    assert truncation(dict({'transactions': [TRADE, CHECK]}, **paging))
@@ -0,0 +1,110 @@
+# SPDX-FileCopyrightText: 2023-present David C Wang <dcwangmit01@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+
+import sqlite3
+from datetime import datetime, timedelta
+
+from schwab_downloader.manifest import INCREMENTAL_LOOKBACK_DAYS, Manifest
+
+START = datetime(2024, 1, 1)
+END = datetime(2024, 12, 31)
+
+
+def test_incremental_start_without_sync_is_start_date(manifest):
+    assert manifest.incremental_start('1234', 'history', START, END) == START
+
+
+def test_incremental_start_is_high_water_mark_less_lookback(manifest):
+    manifest.mark_synced('1234', 'history', START, datetime(2024, 6, 30))
+    expected = datetime(2024, 6, 30) - timedelta(days=INCREMENTAL_LOOKBACK_DAYS)
+    assert manifest.incremental_start('1234', 'history', START, END) == expected
+
+
+def test_incremental_start_needs_synced_range_to_cover_start_date(manifest):
+    manifest.mark_synced('1234', 'history', datetime(2024, 3, 1), datetime(2024, 6, 30))
+    assert manifest.incremental_start('1234', 'history', START, END) == START
+
+
+def test_incremental_start_is_per_account_and_phase(manifest):
+    manifest.mark_synced('1234', 'history', START, datetime(2024, 6, 30))
+    assert manifest.incremental_start('1234', 'statements', START, END) == START
+    assert manifest.incremental_start('9999', 'history', START, END) == START
+
+
+def test_incremental_start_stays_within_range(manifest):
+    manifest.mark_synced('1234', 'history', datetime(2023, 1, 1), datetime(2024, 6, 30))
+    assert manifest.incremental_start('1234', 'history', START, datetime(2024, 2, 1)) == datetime(2024, 2, 1)
+    assert manifest.incremental_start('1234', 'history', datetime(2024, 6, 1), END) == datetime(2024, 6, 1)
+
+
+def test_mark_synced_merges_overlapping_ranges(manifest):
+    manifest.mark_synced('1234', 'history', datetime(2024, 1, 1), datetime(2024, 3, 31))
+    manifest.mark_synced('1234', 'history', datetime(2024, 3, 1), datetime(2024, 6, 30))
+    assert manifest.synced_range('1234', 'history') == (datetime(2024, 1, 1), datetime(2024, 6, 30))
+
+
+def test_mark_synced_replaces_disjoint_range(manifest):
+    manifest.mark_synced('1234', 'history', datetime(2023, 1, 1), datetime(2023, 3, 31))
+    manifest.mark_synced('1234', 'history', datetime(2024, 1, 1), datetime(2024, 6, 30))
+    assert manifest.synced_range('1234', 'history') == (datetime(2024, 1, 1), datetime(2024, 6, 30))
+
+
+def test_mark_synced_caps_at_today(manifest):
+    manifest.mark_synced('1234', 'history', START, datetime.now() + timedelta(days=30))
+    _, synced_through = manifest.synced_range('1234', 'history')
+    assert synced_through.date() == datetime.now().date()
+
+
+def test_checkpoint_round_trip(manifest):
+    repeats = {'date': '20240104', 'names': {'a.pdf': 2}}
+    manifest.save_checkpoint('1234', 'history', START, END, 3, 7, repeats=repeats)
+    assert manifest.checkpoint('1234', 'history', START, END) == {
+        'page': 3,
+        'row': 7,
+        'done': False,
+        'repeats': repeats,
+    }
+
+
+def test_checkpoint_is_per_date_range(manifest):
+    manifest.save_checkpoint('1234', 'history', START, END, 3, 7)
+    assert manifest.checkpoint('1234', 'history', START, datetime(2024, 6, 30)) is None
+    assert manifest.checkpoint('1234', 'statements', START, END) is None
+
+
+def test_checkpoint_done_and_cleared(manifest):
+    manifest.save_checkpoint('1234', 'history', START, END, 5, 2, done=True)
+    assert manifest.checkpoint('1234', 'history', START, END)['done']
+    manifest.clear_checkpoints()
+    assert manifest.checkpoint('1234', 'history', START, END) is None
+
+
+def test_checkpoints_table_without_repeats_is_migrated(tmp_path):
+    path = str(tmp_path / 'old.sqlite')
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE checkpoints (account TEXT NOT NULL, phase TEXT NOT NULL, start_date TEXT NOT NULL,"
+        " end_date TEXT NOT NULL, page INTEGER NOT NULL, row INTEGER NOT NULL, done INTEGER NOT NULL,"
+        " updated_at TEXT NOT NULL, PRIMARY KEY (account, phase))"
+    )
+    conn.execute("INSERT INTO checkpoints VALUES ('1234', 'history', '20240101', '20241231', 2, 4, 0, 'now')")
+    conn.commit()
+    conn.close()
+
+    manifest = Manifest(path)
+    try:
+        assert manifest.checkpoint('1234', 'history', START, END) == {'page': 2, 'row': 4, 'done': False, 'repeats': {}}
+        manifest.save_checkpoint('1234', 'history', START, END, 3, 1, repeats={'date': '20240101', 'names': {}})
+        assert manifest.checkpoint('1234', 'history', START, END)['page'] == 3
+    finally:
+        manifest.close()
+
+
+def test_document_count_within_range(tmp_path, manifest):
+    for day in (1, 15, 31):
+        path = tmp_path / f'doc{day}.pdf'
+        path.write_bytes(b'%PDF-')
+        manifest.record('1234', 'statements', datetime(2024, 1, day), str(path))
+    assert manifest.document_count('1234', 'statements', datetime(2024, 1, 10), datetime(2024, 1, 31)) == 2
+    assert manifest.has(str(tmp_path / 'doc1.pdf'))
@@ -0,0 +1,63 @@
+# SPDX-FileCopyrightText: 2023-present David C Wang <dcwangmit01@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+from schwab_downloader import memory
+from schwab_downloader.cli import SchwabDownloader
+from schwab_downloader.memory import MIN_OPERATIONS, MemoryMonitor, RecycleNeeded, browser_switch, process_tree_rss
+
+
+@pytest.fixture
+def child():
+    """A child process launched with a browser switch, as a scraping browser is."""
+    switch = browser_switch()
+    process = subprocess.Popen([sys.executable, '-c', 'import sys; sys.stdin.read()', switch], stdin=subprocess.PIPE)
+    yield process.pid, switch
+    process.stdin.close()
+    process.wait()
+
+
+@pytest.mark.skipif(not os.path.isdir('/proc'), reason="needs /proc")
+def test_proc_and_ps_agree_on_the_process_tree(child, monkeypatch):
+    pid, switch = child
+    from_proc = memory.proc_processes(switch)
+    monkeypatch.setattr(memory, 'proc_processes', lambda switch=None: None)
+    from_ps = memory.ps_processes(switch)
+    assert from_proc[pid][:1] == from_ps[pid][:1] == (os.getpid(),)
+    assert from_proc[pid][2] and from_ps[pid][2]
+    assert process_tree_rss() > process_tree_rss(switch=switch) > 0
+
+
+def test_not_measured_without_proc_or_ps(monkeypatch, capsys):
+    monkeypatch.setattr(memory, 'proc_processes', lambda switch=None: None)
+    monkeypatch.setattr(memory, 'ps_processes', lambda switch=None: None)
+    assert process_tree_rss() is None
+    with pytest.raises(ValueError, match="--max-rss"):
+        SchwabDownloader.check_options({'--max-rss': '2000'})
+    SchwabDownloader.check_options({'--max-rss': '0'})
+    MemoryMonitor(0, 0).report()
+    assert "not measured" in capsys.readouterr().out
+
+
+def test_page_is_recycled_after_its_operations():
+    monitor = MemoryMonitor(100, 0)
+    monitor.check(99)
+    with pytest.raises(RecycleNeeded) as recycle:
+        monitor.check(100)
+    assert recycle.value.kind == 'page'
+
+
+def test_context_is_recycled_above_max_rss(monkeypatch):
+    monitor = MemoryMonitor(0, 1000)
+    monkeypatch.setattr(memory, 'process_tree_rss', lambda pid=None, switch=None: 2_000_000_000)
+    monitor.check(MIN_OPERATIONS - 1, 'switch')  # Too fresh to recycle again
+    with pytest.raises(RecycleNeeded) as recycle:
+        monitor.check(MIN_OPERATIONS, 'switch')
+    assert recycle.value.kind == 'context'
+    assert monitor.peak == 2_000_000_000
@@ -0,0 +1,75 @@
+# SPDX-FileCopyrightText: 2023-present David C Wang <dcwangmit01@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+
+import pytest
+
+from schwab_downloader.paging import largest_page_size, restore_steps, seek_steps
+
+
+class Pager:
+    """A result table whose first too_new pages are after end_date, with a pager linking the pages within window."""
+
+    def __init__(self, pages, too_new, window=2):
+        self.pages = pages
+        self.too_new = too_new
+        self.window = window
+        self.current = 1
+        self.visited = []
+
+    def follow(self, steps):
+        """Carry out a paging decision's steps, as the engines do."""
+        actions = {'too-new': self.is_too_new, 'numbers': self.numbers, 'go': self.go, 'turn': self.turn}
+        answer = None
+        try:
+            while True:
+                action, *arg = steps.send(answer)
+                answer = actions[action](*arg)
+        except StopIteration as stop:
+            assert stop.value == self.current
+            return stop.value
+
+    def is_too_new(self):
+        return self.current <= self.too_new
+
+    def numbers(self):
+        return [n for n in range(1, self.pages + 1) if abs(n - self.current) <= self.window]
+
+    def go(self, number):
+        if number not in self.numbers():
+            return False
+        self.current = number
+        self.visited.append(number)
+        return True
+
+    def turn(self, label):
+        number = self.current + (1 if label == 'Next' else -1)
+        if not 1 <= number <= self.pages:
+            return False
+        self.current = number
+        self.visited.append(number)
+        return True
+
+
+@pytest.mark.parametrize('too_new', [0, 1, 3, 7, 19, 20])
+def test_seek_ends_on_the_last_page_after_end_date(too_new):
+    pager = Pager(20, too_new, window=3)
+    assert pager.follow(seek_steps()) == max(too_new, 1)
+
+
+def test_seek_gallops_instead_of_paging_through():
+    pager = Pager(50, 37, window=5)
+    assert pager.follow(seek_steps()) == 37
+    assert len(pager.visited) < 37
+
+
+@pytest.mark.parametrize('number, pages, reached', [(1, 5, 1), (4, 5, 4), (12, 20, 12), (9, 5, 5)])
+def test_restore_pages_forward_to_the_checkpointed_page(number, pages, reached):
+    pager = Pager(pages, 0)
+    assert pager.follow(restore_steps(number)) == reached
+
+
+def test_largest_page_size():
+    assert largest_page_size(['25', '50', '100', 'all'], '25') == '100'
+    assert largest_page_size(['25', '50', '100'], '100') is None
+    assert largest_page_size(['all'], 'all') is None
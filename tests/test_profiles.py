@@ -0,0 +1,73 @@
+# SPDX-FileCopyrightText: 2023-present David C Wang <dcwangmit01@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+
+import pytest
+
+from schwab_downloader.cli import SchwabDownloader
+from schwab_downloader.profiles import load_profiles, profile_args, suffixed
+
+CONFIG = '''
+[profiles.personal]
+id-env = "SCHWAB_ID_PERSONAL"
+password-env = "SCHWAB_PASSWORD_PERSONAL"
+
+[profiles.trust]
+id = "trustee-login"
+manifest = "trust.sqlite"
+'''
+
+
+@pytest.fixture
+def config(tmp_path):
+    path = tmp_path / 'config.toml'
+    path.write_text(CONFIG)
+    return str(path)
+
+
+def test_suffixed():
+    assert suffixed('run.jsonl', 'personal') == 'run.personal.jsonl'
+    assert suffixed('.schwab_manifest.sqlite', 'trust') == '.schwab_manifest.trust.sqlite'
+
+
+def test_load_profiles_by_name_or_all(config):
+    assert list(load_profiles(config, 'all')) == ['personal', 'trust']
+    assert list(load_profiles(config, 'trust')) == ['trust']
+    with pytest.raises(ValueError, match="Unknown profiles joint"):
+        load_profiles(config, 'trust,joint')
+
+
+def test_load_profiles_needs_profile_tables(tmp_path):
+    with pytest.raises(ValueError, match="doesn't exist"):
+        load_profiles(str(tmp_path / 'missing.toml'), 'all')
+    empty = tmp_path / 'empty.toml'
+    empty.write_text('[filters]\nphases = "history"\n')
+    with pytest.raises(ValueError, match="No \\[profiles"):
+        load_profiles(str(empty), 'all')
+
+
+def test_profile_args_give_each_login_its_own_files(config, monkeypatch):
+    monkeypatch.setenv('SCHWAB_ID_PERSONAL', 'me')
+    monkeypatch.setenv('SCHWAB_PASSWORD_PERSONAL', 'secret')
+    args = {'--id': 'run-id', '--export': 'rows.csv', '--trace': 'run.jsonl', '--headless': True}
+    profiles = load_profiles(config, 'all')
+    personal = profile_args(args, 'personal', profiles['personal'])
+    assert personal['--id'] == 'me' and personal['--password'] == 'secret'
+    assert personal['--manifest'] == '.schwab_manifest.personal.sqlite'
+    assert personal['--export'] == 'rows.personal.csv'
+    assert personal['--trace'] == 'run.personal.jsonl'
+    assert personal['--headless']
+    trust = profile_args(args, 'trust', profiles['trust'])
+    assert trust['--id'] == 'trustee-login' and trust['--password'] is None
+    assert trust['--manifest'] == 'trust.sqlite'
+
+
+def test_profile_with_unknown_keys_is_rejected():
+    with pytest.raises(ValueError, match="Unknown keys in \\[profiles.trust\\]: password"):
+        profile_args({}, 'trust', {'id': 'trustee-login', 'password': 'secret'})
+
+
+def test_remote_debug_is_rejected_with_profiles():
+    with pytest.raises(ValueError, match="--remote-debug"):
+        SchwabDownloader.check_options({'--profiles': 'all', '--remote-debug': True})
+    SchwabDownloader.check_options({'--profiles': 'all'})
@@ -0,0 +1,159 @@
+# SPDX-FileCopyrightText: 2023-present David C Wang <dcwangmit01@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+
+import threading
+from contextlib import contextmanager
+
+import playwright.sync_api
+import pytest
+
+from schwab_downloader.blocking import ResourceBlocker
+from schwab_downloader.render import RenderPool, render_to_file, snapshot_document
+
+from .conftest import PDF
+
+SNAPSHOT = {
+    'html': '<div role="dialog"><img src="/checkimage/1"><a class="print">Print</a></div>',
+    'css': '.modal { color: black; }',
+    'links': ['https://cdn.example.com/site.css'],
+    'baseUrl': 'https://client.schwab.com/app/history',
+}
+
+
+class Response:
+    def __init__(self, status, url):
+        self.status = status
+        self.url = url
+
+
+class Page:
+    """A render page whose documents load with the given response statuses."""
+
+    def __init__(self, statuses=(200,)):
+        self.statuses = list(statuses)
+        self.listeners = []
+        self.documents = []
+
+    def on(self, event, listener):
+        self.listeners.append(listener)
+
+    def remove_listener(self, event, listener):
+        self.listeners.remove(listener)
+
+    def set_content(self, document, wait_until):
+        self.documents.append(document)
+        status = self.statuses.pop(0) if len(self.statuses) > 1 else self.statuses[0]
+        for listener in self.listeners:
+            listener(Response(status, 'https://client.schwab.com/checkimage/1'))
+
+    def pdf(self, path, **options):
+        with open(path, 'wb') as f:
+            f.write(PDF)
+
+
+class Playwright:
+    """sync_playwright() launching browsers of Pages, recording the contexts they open."""
+
+    def __init__(self, statuses=(200,), fail=False):
+        self.statuses = statuses
+        self.fail = fail
+        self.contexts = []
+        self.chromium = self
+
+    def __call__(self):
+        @contextmanager
+        def playwright():
+            yield self
+
+        return playwright()
+
+    def launch(self, headless):
+        if self.fail:
+            raise RuntimeError("no chromium")
+        return self
+
+    def new_context(self, storage_state):
+        self.contexts.append({'storage_state': storage_state, 'routed': False})
+        return self
+
+    def route(self, pattern, handler):
+        self.contexts[-1]['routed'] = True
+
+    def new_page(self):
+        return Page(self.statuses)
+
+    def close(self):
+        pass
+
+
+def session():
+    assert threading.current_thread() is threading.main_thread()
+    return {'cookies': [{'name': 'sid', 'value': '1'}], 'origins': []}
+
+
+def test_snapshot_document_keeps_base_url_and_stylesheets_and_hides_print_links():
+    document = snapshot_document(SNAPSHOT, '.print')
+    assert '<base href="https://client.schwab.com/app/history">' in document
+    assert '<link rel="stylesheet" href="https://cdn.example.com/site.css">' in document
+    assert '.print { display: none !important; }' in document
+    assert SNAPSHOT['html'] in document
+
+
+def test_render_to_file(tmp_path):
+    path = str(tmp_path / 'a.pdf')
+    page = Page()
+    render_to_file(page, 'document', path)
+    assert open(path, 'rb').read() == PDF
+    assert page.listeners == []
+
+
+@pytest.mark.parametrize('status', [401, 403])
+def test_render_denied_a_resource_fails(tmp_path, status):
+    path = tmp_path / 'a.pdf'
+    page = Page([status])
+    with pytest.raises(RuntimeError, match=f"HTTP {status}"):
+        render_to_file(page, 'document', str(path))
+    assert not path.exists()
+    assert page.listeners == []
+
+
+def test_pool_renders_in_a_context_with_the_session_and_blocker(tmp_path, store, monkeypatch):
+    fake = Playwright()
+    monkeypatch.setattr(playwright.sync_api, 'sync_playwright', fake)
+    pool = RenderPool(2, store, 4, blocker=ResourceBlocker('media'))
+    futures = [pool.submit('document', str(tmp_path / f'{n}.pdf'), session) for n in range(3)]
+    assert [future.result() for future in futures] == [str(tmp_path / f'{n}.pdf') for n in range(3)]
+    pool.shutdown()
+    assert fake.contexts == [{'storage_state': session(), 'routed': True}] * 2
+    assert all(store.has(str(tmp_path / f'{n}.pdf')) for n in range(3))
+
+
+def test_pool_retries_a_denied_render(tmp_path, store, monkeypatch):
+    monkeypatch.setattr(playwright.sync_api, 'sync_playwright', Playwright([403, 200]))
+    pool = RenderPool(1, store, 4, retries=1, log=lambda *args: None)
+    file_name = str(tmp_path / 'a.pdf')
+    assert pool.submit('document', file_name, session).result() == file_name
+    pool.shutdown()
+
+
+def test_pool_fails_its_jobs_when_out_of_retries(tmp_path, store, monkeypatch):
+    monkeypatch.setattr(playwright.sync_api, 'sync_playwright', Playwright([403]))
+    pool = RenderPool(1, store, 4, retries=1, log=lambda *args: None)
+    with pytest.raises(RuntimeError, match="HTTP 403"):
+        pool.submit('document', str(tmp_path / 'a.pdf'), session).result()
+    pool.shutdown()
+    assert pool.alive
+
+
+def test_pool_that_cannot_launch_is_dead(tmp_path, store, monkeypatch):
+    monkeypatch.setattr(playwright.sync_api, 'sync_playwright', Playwright(fail=True))
+    pool = RenderPool(2, store, 4)
+    future = pool.submit('document', str(tmp_path / 'a.pdf'), session)
+    with pytest.raises(RuntimeError, match="render pool failed"):
+        future.result(timeout=5)
+    for thread in pool.threads:
+        thread.join()
+    assert not pool.alive
+    with pytest.raises(RuntimeError, match="render pool failed"):
+        pool.submit('document', str(tmp_path / 'b.pdf'), session).result()
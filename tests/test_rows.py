@@ -0,0 +1,108 @@
+# SPDX-FileCopyrightText: 2023-present David C Wang <dcwangmit01@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+
+from datetime import datetime
+
+from schwab_downloader.filters import WorkFilter
+from schwab_downloader.rows import PageScan, RepeatCounter, table_row_floor
+
+JAN_4 = datetime(2024, 1, 4)
+JAN_5 = datetime(2024, 1, 5)
+
+
+def test_repeat_counter_numbers_from_the_second():
+    repeats = RepeatCounter()
+    assert repeats.distinct('a.pdf', JAN_5) == ('a.pdf', 1)
+    assert repeats.distinct('a.pdf', JAN_5) == ('a_2.pdf', 2)
+    assert repeats.distinct('b.pdf', JAN_5) == ('b.pdf', 1)
+    assert repeats.distinct('a.pdf', JAN_5) == ('a_3.pdf', 3)
+
+
+def test_repeat_counter_keeps_only_the_current_date():
+    repeats = RepeatCounter()
+    repeats.distinct('a.pdf', JAN_5)
+    repeats.distinct('b.pdf', JAN_4)
+    assert repeats.state() == {'date': '20240104', 'names': {'b.pdf': 1}}
+
+
+def test_repeat_counter_goes_on_from_its_state():
+    repeats = RepeatCounter()
+    repeats.distinct('a.pdf', JAN_5)
+    restored = RepeatCounter(repeats.state())
+    assert restored.distinct('a.pdf', JAN_5) == ('a_2.pdf', 2)
+
+
+def test_table_row_floor():
+    assert table_row_floor(25, []) == 25
+    assert table_row_floor(25, [1]) == 25
+    assert table_row_floor(25, [1, 2, 3]) == 51
+
+
+def parse(row):
+    date, type_text = row['cells']
+    if not type_text:
+        return None, None, date, {}
+    return f"{date:%Y%m%d}_{type_text}.pdf", 'button', date, {'type': type_text}
+
+
+def rows(*cells):
+    return [{'index': index, 'cells': cell} for index, cell in enumerate(cells)]
+
+
+def names(taken):
+    return [file_name for _, file_name, _, _, _, _ in taken]
+
+
+def new_scan(filters=None, resume_row=-1, repeats=None):
+    return PageScan('history', datetime(2024, 1, 1), JAN_5, filters or WorkFilter(), resume_row, repeats)
+
+
+def test_scan_skips_rows_after_end_date_and_stops_before_start_date():
+    scan = new_scan()
+    page = rows(
+        (datetime(2024, 1, 6), 'Buy'),
+        (JAN_5, 'Buy'),
+        (JAN_4, ''),
+        (datetime(2023, 12, 31), 'Buy'),
+        (JAN_4, 'Buy'),
+    )
+    assert names(scan.rows(page, parse)) == ['20240105_Buy.pdf']
+    assert scan.done and scan.last_row == 3
+
+
+def test_scan_numbers_repeats_across_pages():
+    scan = new_scan()
+    assert names(scan.rows(rows((JAN_4, 'Buy'), (JAN_4, 'Buy')), parse)) == ['20240104_Buy.pdf', '20240104_Buy_2.pdf']
+    scan.end_page(1, [])
+    assert names(scan.rows(rows((JAN_4, 'Buy')), parse)) == ['20240104_Buy_3.pdf']
+    assert not scan.done
+
+
+def test_scan_resumes_after_the_checkpointed_row():
+    page = rows((JAN_4, 'Buy'), (JAN_4, 'Buy'), (JAN_4, 'Buy'))
+    first = new_scan()
+    list(first.rows(page[:2], parse))
+    first.end_page(1, [])
+    page_number, row, repeats = first.position
+    assert (page_number, row) == (1, 1)
+
+    resumed = new_scan(resume_row=row, repeats=RepeatCounter(repeats))
+    assert names(resumed.rows(page, parse)) == ['20240104_Buy_3.pdf']
+    resumed.end_page(1, [])
+    assert names(resumed.rows(page, parse)) == ['20240104_Buy_4.pdf', '20240104_Buy_5.pdf', '20240104_Buy_6.pdf']
+
+
+def test_scan_filters_rows_but_numbers_them_all():
+    scan = new_scan(WorkFilter(transaction_types=['dividend']))
+    page = rows((JAN_4, 'Dividend'), (JAN_4, 'Buy'), (JAN_4, 'Dividend'))
+    assert names(scan.rows(page, parse)) == ['20240104_Dividend.pdf', '20240104_Dividend_2.pdf']
+
+
+def test_end_page_journals_the_page_and_its_saves():
+    scan = new_scan()
+    list(scan.rows(rows((JAN_4, 'Buy')), parse))
+    scan.end_page(2, ['saving'])
+    assert scan.journal == [(2, 0, ['saving'], {'date': '20240104', 'names': {'20240104_Buy.pdf': 1}})]
+    assert scan.pending == ['saving']
+    assert scan.resume_row == -1
@@ -0,0 +1,102 @@
+# SPDX-FileCopyrightText: 2023-present David C Wang <dcwangmit01@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+
+from datetime import datetime
+
+import pytest
+
+from schwab_downloader.search import DocumentIndex, extract_document, fts_query
+
+from .conftest import PDF
+
+
+def document(file_name, account, date, type, description):
+    return {
+        'file_name': file_name,
+        'account': account,
+        'phase': 'statements',
+        'date': date,
+        'type': type,
+        'description': description,
+        'size': 100,
+        'mtime_ns': 1,
+    }
+
+
+def result(body, valid=True):
+    return {'body': body, 'pages': 1, 'valid': valid, 'error': None if valid else "not a complete PDF"}
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = DocumentIndex(str(tmp_path / 'index.sqlite'))
+    index.add(
+        document('a.pdf', '1234-5678', datetime(2024, 2, 15), 'Tax Form', '1099 Composite'),
+        result("Form 1099-DIV ordinary dividends"),
+    )
+    index.add(
+        document('b.pdf', '9876-4321', datetime(2024, 3, 31), 'Statement', 'Brokerage Statement'),
+        result("Quarterly dividends reinvested"),
+    )
+    index.add(
+        document('c.pdf', '1234-5678', datetime(2024, 4, 30), 'Statement', 'Brokerage Statement'),
+        result('', valid=False),
+    )
+    yield index
+    index.close()
+
+
+def test_fts_query_quotes_terms_but_not_operators_or_prefixes():
+    assert fts_query(['1099-DIV', 'OR', 'divid*']) == '"1099-DIV" OR divid*'
+    assert fts_query(['say "hi"']) == '"say ""hi"""'
+
+
+def files(rows):
+    return [row['file_name'] for row in rows]
+
+
+def test_search_words(index):
+    assert files(index.search(['1099-DIV'])) == ['a.pdf']
+    assert sorted(files(index.search(['dividends']))) == ['a.pdf', 'b.pdf']
+    assert files(index.search(['reinvest*'])) == ['b.pdf']
+    assert '[dividends]' in index.search(['reinvested', 'dividends'])[0]['snippet']
+
+
+def test_search_without_words_is_newest_first(index):
+    assert files(index.search([])) == ['c.pdf', 'b.pdf', 'a.pdf']
+
+
+def test_search_filters(index):
+    assert files(index.search([], accounts=['5678'])) == ['c.pdf', 'a.pdf']
+    assert files(index.search([], types=['tax forms'])) == ['a.pdf']
+    assert files(index.search([], start_date=datetime(2024, 3, 1), end_date=datetime(2024, 3, 31))) == ['b.pdf']
+    assert files(index.search([], invalid=True)) == ['c.pdf']
+
+
+def test_readding_a_document_replaces_it(index):
+    index.add(
+        document('a.pdf', '1234-5678', datetime(2024, 2, 15), 'Tax Form', '1099 Composite'),
+        {'body': None, 'pages': None, 'valid': True, 'error': None},
+    )
+    assert files(index.search([])) == ['c.pdf', 'b.pdf', 'a.pdf']
+    assert files(index.search(['1099-DIV'])) == ['a.pdf']
+
+
+def test_is_current(index):
+    assert index.is_current('a.pdf', 100, 1)
+    assert not index.is_current('a.pdf', 101, 1)
+
+
+def test_bad_query_is_an_error(index):
+    with pytest.raises(ValueError, match="Bad search query"):
+        index.search(['AND'])
+
+
+def test_extract_document(tmp_path):
+    html = tmp_path / 'a.html'
+    html.write_text('<html></html>')
+    assert extract_document(str(html)) == {'valid': True, 'error': None, 'pages': None, 'body': ''}
+    truncated = tmp_path / 'b.pdf'
+    truncated.write_bytes(PDF[:20])
+    assert not extract_document(str(truncated))['valid']
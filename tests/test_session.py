@@ -0,0 +1,56 @@
+# SPDX-FileCopyrightText: 2023-present David C Wang <dcwangmit01@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+
+import os
+import stat
+
+import pytest
+
+from schwab_downloader import session
+from schwab_downloader.session import SessionStore
+
+STATE = {'cookies': [{'name': 'sid', 'value': 'secret-cookie', 'domain': '.schwab.com'}], 'origins': []}
+
+
+@pytest.fixture(autouse=True)
+def fast_kdf(monkeypatch):
+    monkeypatch.setattr(session, 'KDF_ITERATIONS', 1000)
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / 'session.enc')
+    SessionStore(path, 'key').save(STATE)
+    assert SessionStore(path, 'key').load() == STATE
+
+
+def test_saved_session_is_encrypted_and_private(tmp_path):
+    path = tmp_path / 'session.enc'
+    path.write_text('{}')
+    path.chmod(0o644)
+    SessionStore(str(path), 'key').save(STATE)
+    assert b'secret-cookie' not in path.read_bytes()
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+
+
+def test_wrong_secret_is_ignored(tmp_path, capsys):
+    path = str(tmp_path / 'session.enc')
+    SessionStore(path, 'key').save(STATE)
+    assert SessionStore(path, 'other key').load() is None
+    assert "Ignoring saved session" in capsys.readouterr().out
+
+
+def test_damaged_or_missing_session_is_ignored(tmp_path):
+    path = tmp_path / 'session.enc'
+    assert SessionStore(str(path), 'key').load() is None
+    path.write_bytes(b'not a session')
+    assert SessionStore(str(path), 'key').load() is None
+
+
+def test_clear(tmp_path):
+    path = str(tmp_path / 'session.enc')
+    store = SessionStore(path, 'key')
+    store.save(STATE)
+    store.clear()
+    store.clear()
+    assert not os.path.exists(path)
@@ -0,0 +1,85 @@
+# SPDX-FileCopyrightText: 2023-present David C Wang <dcwangmit01@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+
+import os
+from datetime import datetime
+
+import pytest
+
+from schwab_downloader.store import OBJECTS_DIR, is_complete_pdf
+
+from .conftest import PDF, write_pdf
+
+
+def objects(tmp_path):
+    return [name for _, _, names in os.walk(tmp_path / OBJECTS_DIR) for name in names]
+
+
+def test_save_stores_and_links(tmp_path, store):
+    file_name = str(tmp_path / 'a.pdf')
+    checksum = store.save(file_name, write_pdf)
+    assert store.has(file_name)
+    assert os.path.samefile(file_name, store.object_path(checksum))
+    assert not os.path.exists(file_name + '.part')
+
+
+def test_same_content_is_stored_once(tmp_path, store):
+    first, second = str(tmp_path / 'a.pdf'), str(tmp_path / 'b.pdf')
+    assert store.save(first, write_pdf) == store.save(second, write_pdf)
+    assert len(objects(tmp_path)) == 1
+    assert (store.stored, store.linked) == (1, 1)
+    assert open(second, 'rb').read() == PDF
+
+
+def test_distinct_content_is_stored_apart(tmp_path, store):
+    store.save(str(tmp_path / 'a.pdf'), write_pdf)
+    store.save(str(tmp_path / 'b.pdf'), lambda path: write_pdf(path, b'other'))
+    assert len(objects(tmp_path)) == 2
+
+
+def test_failed_write_leaves_nothing(tmp_path, store):
+    file_name = str(tmp_path / 'a.pdf')
+
+    def write(path):
+        with open(path, 'wb') as f:
+            f.write(PDF[:10])
+        raise OSError("connection reset")
+
+    with pytest.raises(OSError):
+        store.save(file_name, write)
+    assert not os.path.exists(file_name)
+    assert not os.path.exists(file_name + '.part')
+
+
+def test_truncated_legacy_file_is_not_had(tmp_path, store):
+    file_name = tmp_path / 'old.pdf'
+    file_name.write_bytes(PDF[:20])
+    assert not is_complete_pdf(str(file_name))
+    assert not store.has(str(file_name))
+
+
+def test_complete_legacy_file_is_had(tmp_path, store):
+    file_name = tmp_path / 'old.pdf'
+    write_pdf(file_name)
+    assert store.has(str(file_name))
+
+
+def test_stored_file_changed_in_size_is_not_had(tmp_path, store, manifest):
+    file_name = str(tmp_path / 'a.pdf')
+    checksum = store.save(file_name, write_pdf)
+    manifest.record('1234', 'statements', datetime(2024, 1, 1), file_name, checksum)
+    assert store.has(file_name)
+    os.remove(file_name)
+    with open(file_name, 'wb') as f:
+        f.write(PDF + b'appended')
+    assert not store.has(file_name)
+
+
+def test_link_source_reuses_a_download(tmp_path, store):
+    url = 'https://example.com/statement.pdf'
+    store.save(str(tmp_path / 'a.pdf'), write_pdf, url)
+    assert store.link_source(url, str(tmp_path / 'b.pdf'))
+    assert open(tmp_path / 'b.pdf', 'rb').read() == PDF
+    assert not store.link_source('https://example.com/other.pdf', str(tmp_path / 'c.pdf'))
+    assert not store.link_source(None, str(tmp_path / 'c.pdf'))
@@ -0,0 +1,100 @@
+# SPDX-FileCopyrightText: 2023-present David C Wang <dcwangmit01@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+
+import json
+import threading
+from concurrent.futures import Future
+
+import pytest
+
+from schwab_downloader.trace import Tracer
+
+
+def test_spans_are_only_kept_for_an_export():
+    tracer = Tracer()
+    for _ in range(1000):
+        with tracer.span('parse-row'):
+            pass
+    assert tracer.spans == []
+    count, total, longest = tracer.totals['(run)']['parse-row']
+    assert count == 1000 and 0 <= longest <= total
+
+
+def test_spans_inherit_the_context():
+    tracer = Tracer(keep=True)
+    with tracer.context(account='1234', phase='history'):
+        with tracer.context(page=2):
+            with tracer.span('save', file='a.pdf') as span:
+                span['outcome'] = "background"
+        with tracer.span('paginate'):
+            pass
+    save, paginate = tracer.spans
+    assert {key: save[key] for key in ('account', 'phase', 'page', 'file', 'outcome')} == {
+        'account': '1234',
+        'phase': 'history',
+        'page': 2,
+        'file': 'a.pdf',
+        'outcome': "background",
+    }
+    assert (paginate['page'], paginate['outcome']) == (None, "ok")
+    assert save['lane'] == threading.current_thread().name
+    assert set(tracer.totals) == {'1234'}
+
+
+def test_failed_span_records_the_error():
+    tracer = Tracer(keep=True)
+    with pytest.raises(TimeoutError):
+        with tracer.span('search'):
+            raise TimeoutError("no table")
+    assert tracer.spans[0]['outcome'] == "error: TimeoutError: no table"
+
+
+def test_track_records_a_background_save_when_it_is_done():
+    tracer = Tracer(keep=True)
+    done, failed = Future(), Future()
+    tracer.track('save-background', done, file='a.pdf')
+    tracer.track('save-background', failed, file='b.pdf')
+    assert tracer.spans == []
+    done.set_result(None)
+    failed.set_exception(OSError("disk full"))
+    assert [span['outcome'] for span in tracer.spans] == ["ok", "error: OSError: disk full"]
+    assert tracer.spans[0]['lane'].endswith("(background)")
+
+
+def test_exports(tmp_path):
+    tracer = Tracer(keep=True)
+    with tracer.context(account='1234'):
+        with tracer.span('select-account'):
+            pass
+    with tracer.span('login'):
+        pass
+    jsonl = tmp_path / 'run.jsonl'
+    tracer.write_jsonl(str(jsonl))
+    assert [json.loads(line)['name'] for line in jsonl.read_text().splitlines()] == ['select-account', 'login']
+    chrome = tmp_path / 'run.trace.json'
+    tracer.write_chrome_trace(str(chrome))
+    events = json.loads(chrome.read_text())['traceEvents']
+    assert [(event['name'], event['ph']) for event in events] == [
+        ('select-account', 'X'),
+        ('login', 'X'),
+        ('thread_name', 'M'),
+    ]
+    assert events[0]['cat'] == '1234' and events[1]['cat'] == 'run'
+
+
+def test_summary_lists_the_slowest_steps_per_account(capsys):
+    tracer = Tracer()
+    tracer.record({'name': 'save', 'account': '1234'}, 0, 3)
+    tracer.record({'name': 'save', 'account': '1234'}, 0, 1)
+    tracer.record({'name': 'parse-row', 'account': '1234'}, 0, 0.5)
+    tracer.record({'name': 'login', 'account': None}, 0, 2)
+    tracer.summary(top=1)
+    out = capsys.readouterr().out.splitlines()
+    assert out[0] == "Slowest steps per account:"
+    assert out[1:] == [
+        "  1234",
+        "    save                     2 x  avg   2.00s  max   3.00s  total     4.0s",
+        "  (run)",
+        "    login                    1 x  avg   2.00s  max   2.00s  total     2.0s",
+    ]
@@ -0,0 +1,176 @@
+# SPDX-FileCopyrightText: 2023-present David C Wang <dcwangmit01@gmail.com>
+#
+# SPDX-License-Identifier: MIT
+
+import asyncio
+from contextlib import asynccontextmanager, contextmanager
+
+import pytest
+
+from schwab_downloader import waits
+from schwab_downloader.waits import AsyncWaiter, Waiter
+
+
+class Clock:
+    """time.monotonic and time.sleep of the waits module, where sleeping advances the clock."""
+
+    def __init__(self):
+        self.now = 100.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(waits.time, 'monotonic', clock.monotonic)
+    monkeypatch.setattr(waits.time, 'sleep', clock.sleep)
+    return clock
+
+
+class Governor:
+    def __init__(self):
+        self.signals = []
+
+    def acquire(self, step):
+        self.signals.append(('acquire', step))
+
+    def success(self, step, seconds):
+        self.signals.append(('success', step))
+
+    def congestion(self, step, reason):
+        self.signals.append(('congestion', step, reason))
+
+
+class Page:
+    def __init__(self, clock, takes=0.0, error=None, response_error=None):
+        self.clock = clock
+        self.takes = takes
+        self.error = error
+        self.response_error = response_error
+        self.idle_waits = []
+
+    def wait_for_selector(self, selector, state, timeout):
+        self.clock.now += self.takes
+        if self.error:
+            raise self.error
+        return selector
+
+    def wait_for_load_state(self, state, timeout):
+        self.idle_waits.append(timeout)
+
+    @contextmanager
+    def expect_response(self, predicate, timeout):
+        yield
+        if self.response_error:
+            raise self.response_error
+
+
+def test_parse_floors():
+    assert Waiter.parse_floors("0.5, login-form=2,pagination=1") == {'*': 0.5, 'login-form': 2, 'pagination': 1}
+    assert Waiter.parse_floors(None) == {}
+
+
+def test_floor_falls_back_to_default():
+    waiter = Waiter(floors={'*': 0.5, 'login-form': 2})
+    assert waiter.floor_for('login-form') == 2
+    assert waiter.floor_for('pagination') == 0.5
+    assert Waiter().floor_for('pagination') == 0
+
+
+def test_fast_wait_is_topped_up_to_its_floor(clock):
+    waiter = Waiter(floors={'pagination': 1.0})
+    assert waiter.for_selector('pagination', Page(clock, takes=0.25), 'tbody') == 'tbody'
+    assert clock.slept == [0.75]
+    assert waiter.timings['pagination'] == [1.0]
+
+
+def test_slow_wait_is_not_topped_up(clock):
+    waiter = Waiter(floors={'pagination': 1.0})
+    waiter.for_selector('pagination', Page(clock, takes=2), 'tbody')
+    assert clock.slept == []
+    assert waiter.timings['pagination'] == [2]
+
+
+def test_failed_wait_is_timed_without_its_floor_and_reported_to_the_governor(clock):
+    governor = Governor()
+    waiter = Waiter(floors={'*': 1.0}, governor=governor)
+    with pytest.raises(TimeoutError):
+        waiter.for_selector('login-form', Page(clock, takes=3, error=TimeoutError()), 'form')
+    assert clock.slept == []
+    assert waiter.timings['login-form'] == [3]
+    assert governor.signals == [('acquire', 'login-form'), ('congestion', 'login-form', "timeout")]
+
+
+def test_successful_wait_is_reported_to_the_governor(clock):
+    governor = Governor()
+    Waiter(governor=governor).pause('submit')
+    assert governor.signals == [('acquire', 'submit'), ('success', 'submit')]
+
+
+def test_response_timeout_after_the_action_falls_back_to_network_idle(clock):
+    waiter = Waiter(idle_timeout=1500)
+    page = Page(clock, response_error=TimeoutError())
+    actions = []
+    waiter.for_response('search', page, lambda response: True, lambda: actions.append('click'))
+    assert actions == ['click']
+    assert page.idle_waits == [1500]
+
+
+def test_response_wait_raises_other_errors(clock):
+    page = Page(clock, response_error=RuntimeError("page closed"))
+    with pytest.raises(RuntimeError):
+        Waiter().for_response('search', page, lambda response: True, lambda: None)
+    assert page.idle_waits == []
+
+
+def test_merge_folds_in_a_workers_timings():
+    waiter, worker = Waiter(), Waiter()
+    waiter.timings['pagination'].append(1.0)
+    worker.timings['pagination'].append(2.0)
+    worker.timings['login-form'].append(3.0)
+    waiter.merge(worker)
+    assert waiter.timings == {'pagination': [1.0, 2.0], 'login-form': [3.0]}
+
+
+class AsyncPage(Page):
+    async def wait_for_selector(self, selector, state, timeout):
+        return super().wait_for_selector(selector, state, timeout)
+
+    async def wait_for_load_state(self, state, timeout):
+        self.idle_waits.append(timeout)
+
+    @asynccontextmanager
+    async def expect_response(self, predicate, timeout):
+        yield
+        if self.response_error:
+            raise self.response_error
+
+
+def test_async_waiter_keeps_floors_and_fallbacks(clock, monkeypatch):
+    async def sleep(seconds):
+        clock.sleep(seconds)
+
+    monkeypatch.setattr(asyncio, 'sleep', sleep)
+    waiter = AsyncWaiter(floors={'pagination': 1.0}, idle_timeout=1500)
+
+    async def actions():
+        await waiter.for_selector('pagination', AsyncPage(clock, takes=0.5), 'tbody')
+        page = AsyncPage(clock, response_error=TimeoutError())
+
+        async def click():
+            pass
+
+        await waiter.for_response('search', page, lambda response: True, click)
+        return page
+
+    page = asyncio.run(actions())
+    assert clock.slept == [0.5]
+    assert waiter.timings['pagination'] == [1.0]
+    assert page.idle_waits == [1500]